@@ -0,0 +1,461 @@
+"""データ取得〜統合の各処理のベンチマーク
+
+取得元（HeartRails・SUUMO・警察CSV・zipcloud）の応答を、リポジトリのデータ（stations_raw.json,
+rent_by_station.json, crime_by_city.json, stations.json）から作ったフィクスチャで再現し、
+ローカルの HTTP サーバーから返す。各処理を 1×・10×・100× のデータ規模で計測し、
+経過時間・最大RSS・メモリ割り当て（tracemalloc のピーク）を表示する。
+
+- 1× は現在のデータ規模（908駅、SUUMO 834駅、犯罪 44,331件）。N× は駅・家賃・犯罪の行を N 倍にする
+  （複製した駅は座標をずらし、名前に番号を付ける）
+- 計測は (処理, 規模) ごとに別プロセスで行う（最大RSSが他の計測の影響を受けないように）。
+  経過時間は tracemalloc なしで1回、割り当ては tracemalloc ありでもう1回実行して測る
+- 取得系の処理は計測ごとに空の http_cache を使い、ローカルホストへのレート制限は外す
+- --save で結果を bench_baseline.json に保存し、以降の実行ではそれとの比を表示する
+  （REGRESSION_RATIO を超えて遅く・大きくなったものに「!」を付ける）
+
+使い方:
+    python3 bench.py                          # 全処理を 1×/10×/100× で計測し、基準値と比較
+    python3 bench.py --scales 1,10            # 規模を指定
+    python3 bench.py count_by_city merge      # 処理を指定
+    python3 bench.py --save                   # 結果を基準値として保存
+"""
+import argparse
+import functools
+import http.server
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import zlib
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(ROOT, "bench_baseline.json")
+
+SCALES = (1, 10, 100)
+REGRESSION_RATIO = 1.2
+
+# 複製した駅をずらす量（度）。10列ずつ並べる
+COPY_OFFSET_DEG = 0.5
+
+CSV_HEADER = ["罪名", "手口", "管轄警察署（発生地）", "都道府県（発生地）", "市区町村（発生地）",
+              "町丁目（発生地）", "発生年月日（始期）", "発生時（始期）", "被害者の性別", "被害者の年齢"]
+OFFENCE_FILES = [
+    ("hittakuri", "ひったくり"),
+    ("syazyounerai", "車上ねらい"),
+    ("buhinnerai", "部品ねらい"),
+    ("zidouhanbaikinerai", "自販機ねらい"),
+    ("zidousyatou", "自動車盗"),
+    ("ootobaitou", "オートバイ盗"),
+    ("zitensyatou", "自転車盗"),
+]
+CSV_CHUNK_ROWS = 2000
+# station_query で計測する問い合わせ点の数（k 近傍と半径検索を1回ずつ）
+QUERY_POINTS = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def _load(name):
+    """リポジトリのデータを読む（共有するので書き換えないこと）"""
+    with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- フィクスチャ（規模 scale のデータ） ---
+def _copy_name(name, k):
+    return name if k == 0 else f"{name}{k}"
+
+
+def scaled_stations(scale, base=None):
+    """駅（省略時は stations_raw.json）を scale 倍に複製する（複製は座標をずらし、名前に番号を付ける）"""
+    if base is None:
+        base = _load("stations_raw.json")
+    stations = []
+    for k in range(scale):
+        dlat, dlng = (k % 10) * COPY_OFFSET_DEG, (k // 10) * COPY_OFFSET_DEG
+        for s in base:
+            stations.append(dict(s, name=_copy_name(s["name"], k),
+                                 lat=round(s["lat"] + dlat, 6), lng=round(s["lng"] + dlng, 6)))
+    return stations
+
+
+def scaled_rent(scale):
+    return {_copy_name(name, k): rent for k in range(scale) for name, rent in _load("rent_by_station.json").items()}
+
+
+@functools.lru_cache(maxsize=None)
+def city_prefectures():
+    return {s["city"]: s["prefecture"] for s in _load("stations.json") if s.get("city")}
+
+
+@functools.lru_cache(maxsize=None)
+def stations_by_line(scale):
+    by_line = {}
+    for s in scaled_stations(scale):
+        for line in s["lines"]:
+            by_line.setdefault(line, []).append(s)
+    return by_line
+
+
+def station_cities(scale):
+    """駅ごとの市区町村（stations.json の判定結果を複製した駅にも使う）"""
+    return [s.get("city") for s in _load("stations.json")] * scale
+
+
+@functools.lru_cache(maxsize=None)
+def route_names():
+    """SUUMO の路線ページごとの駅名（家賃データの駅を路線に振り分ける）"""
+    import regions
+    paths = [p for r in regions.enabled() for p in r.suumo_routes]
+    pages = {p: [] for p in paths}
+    for name, rent in _load("rent_by_station.json").items():
+        pages[paths[zlib.crc32(name.encode()) % len(paths)]].append((name, rent))
+    return pages
+
+
+def suumo_page(names, scale):
+    plans = ["ワンルーム", "1K", "1DK", "1LDK/2K/2DK", "2LDK/3K/3DK"]
+    rows = []
+    for k in range(scale):
+        for name, rent in names:
+            cells = "".join(
+                f'<td class="graphpanel_matrix-td"><span class="graphpanel_matrix-td_graphinfo-strong">'
+                f'{rent * (1 + 0.3 * j):.1f}</span>万円<br><span>({(j + 1) * 7}件)</span></td>'
+                for j in range(len(plans))
+            )
+            rows.append(f'<tr><td class="graphpanel_matrix-td-title"><a href="/chintai/soba/ek_{k}/">'
+                        f'{_copy_name(name, k)}</a></td>{cells}</tr>')
+    head = "".join(f"<th>{p}</th>" for p in plans)
+    nav = "".join(f'<li><a href="/chintai/{i}/">メニュー{i}</a></li>' for i in range(200))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>家賃相場</title>'
+            f'<script>var x = "<tr>";</script></head><body><ul class="nav">{nav}</ul>'
+            f'<table class="graphpanel_matrix"><tr><th>駅名</th>{head}</tr>{"".join(rows)}</table>'
+            f'<footer>{"・" * 2000}</footer></body></html>').encode("utf-8")
+
+
+def crime_rows(scale):
+    """crime_by_city.json の件数に合わせた犯罪CSVの行を scale 倍で返す（手口・町丁目は行ごとに振り分ける）"""
+    j = 0
+    for _ in range(scale):
+        for city, count in _load("crime_by_city.json").items():
+            pref = city_prefectures().get(city, "大阪府")
+            for _ in range(count):
+                offence = OFFENCE_FILES[j % len(OFFENCE_FILES)][1]
+                yield offence, ["窃盗", offence, "中央", pref, city, f"{j % 50 + 1}丁目",
+                                f"2024/{j % 12 + 1:02d}/{j % 28 + 1:02d}", str(j % 24), "男", "20歳代"]
+                j += 1
+
+
+def heartrails_response(line, scale):
+    stations = stations_by_line(scale).get(line, [])
+    return json.dumps({"response": {"station": [
+        {"name": s["name"], "prefecture": s["prefecture"], "line": line,
+         "x": s["lng"], "y": s["lat"], "postal": s["postal"]} for s in stations
+    ]}}, ensure_ascii=False).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def _postal_cities():
+    return {s["postal"]: (s["prefecture"], s["city"]) for s in _load("stations.json") if s.get("city")}
+
+
+def zipcloud_response(zipcode):
+    by_postal = _postal_cities()
+    found = by_postal.get(zipcode)
+    if found is None:
+        cities = sorted(set(by_postal.values()))
+        found = cities[zlib.crc32(zipcode.encode()) % len(cities)]
+    return json.dumps({"status": 200, "results": [
+        {"zipcode": zipcode, "address1": found[0], "address2": found[1], "address3": ""}
+    ]}, ensure_ascii=False).encode("utf-8")
+
+
+# --- ローカルの HTTP サーバー ---
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    """/{規模}/{取得元}/... のリクエストにフィクスチャを返す"""
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        _, scale, source, rest = url.path.split("/", 3)
+        scale = int(scale)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if source == "heartrails":
+            self._send(heartrails_response(query["line"], scale), "application/json")
+        elif source == "suumo":
+            self._send(suumo_page(route_names()["/" + rest], scale), "text/html; charset=utf-8")
+        elif source == "zipcloud":
+            self._send(zipcloud_response(query["zipcode"]), "application/json")
+        elif source == "police":
+            self._send_csv(rest, scale)
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_csv(self, name, scale):
+        """警察CSV（Shift-JIS）を生成しながら返す"""
+        offence = next(o for key, o in OFFENCE_FILES if key in name)
+        rows = (r for o, r in crime_rows(scale) if o == offence)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.end_headers()
+        self.wfile.write((",".join(CSV_HEADER) + "\r\n").encode("cp932"))
+        while True:
+            chunk = list(itertools.islice(rows, CSV_CHUNK_ROWS))
+            if not chunk:
+                break
+            self.wfile.write("".join(",".join(r) + "\r\n" for r in chunk).encode("cp932"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- 計測する処理（別プロセスで実行する） ---
+# 各関数は準備をしてから計測対象の関数を返す（準備は計測に含めない）
+def bench_download_csv(scale, base_url):
+    import fetch_crime
+    urls = [f"{base_url}/{scale}/police/hyogo_2024{key}.csv" for key, _ in OFFENCE_FILES]
+    return lambda: sum(1 for url in urls for _ in fetch_crime.download_csv(url))
+
+
+def bench_count_by_city(scale, base_url):
+    import fetch_crime
+    rows = [r for _, r in crime_rows(1)]
+    return lambda: fetch_crime.count_by_city(
+        itertools.chain([CSV_HEADER], itertools.chain.from_iterable(itertools.repeat(rows, scale))))
+
+
+def bench_fetch_region(scale, base_url):
+    import concurrent.futures
+    import multiprocessing
+    import fetch_rent
+    import regions
+    fetch_rent.SUUMO_BASE = f"{base_url}/{scale}/suumo"
+    # fetch_rent.py と同じく、受信中のページをチャンクごとにプロセスプールの抽出器に渡す
+    region = regions.Region()
+    region.code, region.prefecture, region.suumo_routes = "bench", "ベンチ", list(route_names())
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=fetch_rent.PARSE_WORKERS)
+    manager = multiprocessing.Manager()
+    pool.submit(int).result()  # ワーカーの起動は計測に含めない
+    return lambda: fetch_rent.fetch_region(region, pool, manager)
+
+
+def bench_get_stations(scale, base_url):
+    import fetch_stations
+    fetch_stations.API_BASE = f"{base_url}/{scale}/heartrails/api/json"
+    lines = sorted({l for s in _load("stations_raw.json") for l in s["lines"]})
+    return lambda: [fetch_stations.get_stations(l) for l in lines]
+
+
+def bench_zipcloud_lookup(scale, base_url):
+    import merge_data
+    merge_data.ZIPCLOUD_URL = f"{base_url}/{scale}/zipcloud/api/search"
+    # 複製した駅は郵便番号もずらし、規模に比例して引く件数を増やす
+    postals = sorted({f"{(int(s['postal']) + k) % 10_000_000:07d}"
+                      for s in _load("stations_raw.json") if s["postal"] for k in range(scale)})
+    return lambda: [merge_data.zipcloud_lookup(p) for p in postals]
+
+
+def bench_city_stats(scale, base_url):
+    import city_stats
+    # 複製した市区町村は名前に番号を付け、駅も複製した市区町村を参照させる
+    crime = {_copy_name(c, k): n for k in range(scale) for c, n in _load("crime_by_city.json").items()}
+    population = {_copy_name(c, k): n for k in range(scale) for c, n in _load("population_by_city.json").items()}
+    base = station_cities(1)
+    stations = [{"city": _copy_name(c, k) if c else None} for k in range(scale) for c in base]
+
+    def run():
+        table = city_stats.CityStats.from_dicts(crime, population).table()
+        table["station_stats"] = city_stats.station_stats(stations, table)
+        return table
+    return run
+
+
+def bench_match_all(scale, base_url):
+    import station_names
+    stations, rent = scaled_stations(scale), scaled_rent(scale)
+    return lambda: station_names.match_all(stations, rent)
+
+
+def bench_merge(scale, base_url):
+    import merge_data
+    import station_names
+    stations, rent = scaled_stations(scale), scaled_rent(scale)
+    matches = station_names.match_all(stations, rent)
+    cities = station_cities(scale)
+    return lambda: merge_data.merge_stations(
+        [dict(s) for s in stations], cities, rent, matches)
+
+
+def bench_station_query(scale, base_url):
+    import city_stats
+    import station_query
+    stations = scaled_stations(scale, city_stats.attach(_load("stations.json"), _load("city_stats.json")))
+    index = station_query.StationIndex(stations)
+    # 駅のある範囲に一様に散らした問い合わせ点（毎回同じ点）
+    lats, lngs = [s["lat"] for s in stations], [s["lng"] for s in stations]
+    points = [(min(lats) + (max(lats) - min(lats)) * (i * 0.618034 % 1),
+               min(lngs) + (max(lngs) - min(lngs)) * (i * 0.414214 % 1)) for i in range(QUERY_POINTS)]
+
+    def run():
+        for lat, lng in points:
+            index.nearest(lat, lng, 5)
+            index.within(lat, lng, 2, safety=["良好", "普通"], rent_max=7)
+    return run
+
+
+BENCHMARKS = {
+    "download_csv": bench_download_csv,
+    "count_by_city": bench_count_by_city,
+    "fetch_region": bench_fetch_region,
+    "get_stations": bench_get_stations,
+    "zipcloud_lookup": bench_zipcloud_lookup,
+    "city_stats": bench_city_stats,
+    "match_all": bench_match_all,
+    "merge": bench_merge,
+    "station_query": bench_station_query,
+}
+
+
+def _max_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux は KiB 単位
+
+
+def measure(name, scale, base_url):
+    """処理を2回（時間用・割り当て用）実行し、計測結果を返す"""
+    import fetcher
+    import http_cache
+    fetcher.HOST_INTERVALS["127.0.0.1"] = 1e-6
+
+    func = BENCHMARKS[name](scale, base_url)
+    results = {}
+    for traced in (False, True):
+        cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+        http_cache.CACHE_DIR = cache_dir
+        try:
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            if traced:
+                results["alloc"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                results["wall"] = elapsed
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    results["rss"] = _max_rss()
+    return results
+
+
+def run_child(name, scale, base_url):
+    """別プロセスで1件計測する"""
+    env = dict(os.environ)
+    env.pop("HTTP_CACHE_OFFLINE", None)
+    # フィクスチャへのリクエストを計測イベントのファイルに混ぜない（記録しない場合の処理時間を計測する）
+    env["TELEMETRY_PATH"] = ""
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, str(scale), base_url],
+        cwd=ROOT, capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "失敗")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# --- 表示・基準値との比較 ---
+def _mib(n):
+    return f"{n / 1024 / 1024:,.1f}MiB"
+
+
+def _ratio(value, base):
+    if not base:
+        return ""
+    r = value / base
+    return f"{r:.2f}x{'!' if r > REGRESSION_RATIO else ' '}"
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["results"]
+    except FileNotFoundError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="データ取得〜統合の各処理のベンチマーク")
+    parser.add_argument("benchmarks", nargs="*", help=f"計測する処理（省略時はすべて: {', '.join(BENCHMARKS)}）")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="データ規模（カンマ区切り）")
+    parser.add_argument("--save", action="store_true", help="結果を基準値として保存する")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基準値のファイル")
+    parser.add_argument("--child", nargs=3, metavar=("NAME", "SCALE", "URL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        name, scale, base_url = args.child
+        print(json.dumps(measure(name, int(scale), base_url)))
+        return
+
+    unknown = [b for b in args.benchmarks if b not in BENCHMARKS]
+    if unknown:
+        parser.error(f"不明な処理: {', '.join(unknown)}（{', '.join(BENCHMARKS)}）")
+    names = args.benchmarks or list(BENCHMARKS)
+    scales = [int(s) for s in args.scales.split(",")]
+    baseline = load_baseline(args.baseline)
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{'処理':<18}{'規模':>6}{'時間':>10}{'最大RSS':>12}{'割り当て':>12}{'時間比':>9}{'割当比':>9}")
+    results = {}
+    try:
+        for name in names:
+            for scale in scales:
+                key = f"{name}@{scale}"
+                try:
+                    r = results[key] = run_child(name, scale, base_url)
+                except RuntimeError as e:
+                    print(f"{name:<18}{scale:>5}x  失敗: {e}")
+                    continue
+                base = baseline.get(key, {})
+                print(f"{name:<18}{scale:>5}x{r['wall']:>9.3f}s{_mib(r['rss']):>12}{_mib(r['alloc']):>12}"
+                      f"{_ratio(r['wall'], base.get('wall')):>9}{_ratio(r['alloc'], base.get('alloc')):>9}")
+    finally:
+        server.shutdown()
+
+    if args.save:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                saved = json.load(f)["results"]
+        else:
+            saved = {}
+        saved.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": dict(sorted(saved.items()))}, f, indent=2)
+        print(f"\n{args.baseline} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""統合済みの駅データを z/x/y のタイルに分割して tiles/ に保存する
+
+対象エリアが広がって駅数が増えても、地図ページが表示範囲のタイルだけを読み込めるようにする。
+
+- DETAIL_ZOOM のタイル: タイル内の駅（ポップアップ・色分けに必要な属性）
+- MIN_ZOOM〜DETAIL_ZOOM-1 のタイル: タイルを 8×8 に区切ったセルごとの集約点
+  （駅数・平均家賃・平均犯罪率・重心）
+- tiles/meta.json: ズーム範囲・駅数・範囲、色分けとフィルターに使う全体の統計値
+
+駅の治安の値は city_stats.json を市区町村名で引いて付ける（タイルだけで表示できるように）。
+
+ページは DETAIL_ZOOM 以上では DETAIL_ZOOM のタイルを、それ未満ではそのズームの集約タイルを読む。
+"""
+import json
+import math
+import os
+import shutil
+import statistics
+
+from city_stats import attach, load_city_stats
+from crime_density import attach_density, load_density
+
+STATIONS_PATH = "stations.json"
+OUTPUT_DIR = "tiles"
+
+MIN_ZOOM = 8
+DETAIL_ZOOM = 12
+CELL_BITS = 3  # 集約タイルは 2^3 × 2^3 = 8×8 セルに区切る
+
+# タイルに含める駅の属性
+STATION_FIELDS = ("name", "lat", "lng", "lines", "city", "rent_avg",
+                  "crime_count", "crime_rate", "crime_rate_ci", "crime_yoy", "crime_density", "safety",
+                  "safety_class", "rent_plans")
+
+
+def tile_xy(lat, lng, zoom):
+    """緯度経度を含むタイル番号 (x, y) を返す（Web メルカトル）"""
+    n = 2 ** zoom
+    x = int((lng + 180) / 360 * n)
+    phi = math.radians(lat)
+    y = int((1 - math.log(math.tan(phi) + 1 / math.cos(phi)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _stats(values):
+    """平均・標準偏差（母標準偏差。index.html の calcStats と同じ）・最小・最大"""
+    if not values:
+        return None
+    return {
+        "mean": statistics.fmean(values),
+        "stddev": statistics.pstdev(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def _mean(values):
+    return round(statistics.fmean(values), 2) if values else None
+
+
+def summarize(stations, zoom):
+    """ズーム zoom の集約タイル {(x, y): [集約点, ...]} を作る"""
+    cells = {}
+    for s in stations:
+        cell = tile_xy(s["lat"], s["lng"], zoom + CELL_BITS)
+        cells.setdefault(cell, []).append(s)
+
+    tiles = {}
+    for (cx, cy), members in sorted(cells.items()):
+        rents = [s["rent_avg"] for s in members if s.get("rent_avg")]
+        crimes = [s["crime_rate"] for s in members if s.get("crime_rate") is not None]
+        point = {
+            "lat": round(statistics.fmean(s["lat"] for s in members), 6),
+            "lng": round(statistics.fmean(s["lng"] for s in members), 6),
+            "count": len(members),
+            "rent_avg": _mean(rents),
+            "crime_rate": _mean(crimes),
+        }
+        tiles.setdefault((cx >> CELL_BITS, cy >> CELL_BITS), []).append(point)
+    return tiles
+
+
+def detail(stations):
+    """DETAIL_ZOOM のタイル {(x, y): [駅, ...]} を作る"""
+    tiles = {}
+    for s in stations:
+        xy = tile_xy(s["lat"], s["lng"], DETAIL_ZOOM)
+        tiles.setdefault(xy, []).append({k: s.get(k) for k in STATION_FIELDS})
+    return tiles
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def build(stations, out_dir=OUTPUT_DIR, crime_stats=None):
+    """タイル一式を書き出し、書き出したタイル数を返す（stations は治安の値を付けたもの）
+
+    crime_stats を省略すると、駅の犯罪率から全体の統計値を求める。
+    """
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+
+    written = 0
+    levels = {z: summarize(stations, z) for z in range(MIN_ZOOM, DETAIL_ZOOM)}
+    levels[DETAIL_ZOOM] = detail(stations)
+    for z, tiles in levels.items():
+        key = "stations" if z == DETAIL_ZOOM else "summary"
+        for (x, y), items in tiles.items():
+            _write(os.path.join(out_dir, str(z), str(x), f"{y}.json"), {key: items})
+            written += 1
+
+    _write(os.path.join(out_dir, "meta.json"), {
+        "min_zoom": MIN_ZOOM,
+        "detail_zoom": DETAIL_ZOOM,
+        "count": len(stations),
+        "bounds": [
+            [min(s["lat"] for s in stations), min(s["lng"] for s in stations)],
+            [max(s["lat"] for s in stations), max(s["lng"] for s in stations)],
+        ],
+        "crime_stats": crime_stats or _stats([s["crime_rate"] for s in stations if s.get("crime_rate") is not None]),
+        "rent_stats": _stats([s["rent_avg"] for s in stations if s.get("rent_avg")]),
+        # 各ズームでタイルが存在する範囲（ページが空タイルを取りに行かないように）
+        "tiles": {str(z): sorted(f"{x}/{y}" for x, y in tiles) for z, tiles in levels.items()},
+    })
+    return written
+
+
+if __name__ == "__main__":
+    with open(STATIONS_PATH, encoding="utf-8") as f:
+        stations = json.load(f)
+    city_stats = load_city_stats()
+    if city_stats is None:
+        print("city_stats.json がないため治安はデータなしになります（city_stats.py を実行してください）")
+    if not attach_density(stations, load_density()):
+        print("crime_density.json がないか駅の並びが違うため、犯罪密度は含めません（crime_density.py を実行してください）")
+    n = build(attach(stations, city_stats), crime_stats=city_stats and city_stats["station_stats"])
+    print(f"{OUTPUT_DIR}/ に保存しました（{len(stations)}駅, {n}タイル）")
@@ -0,0 +1,117 @@
+"""国土数値情報 行政区域データ（N03）のポリゴンから、緯度経度→市区町村を判定する
+
+boundaries/ に置いた N03 の GeoJSON（例: N03-20240101_27.geojson, N03-20240101_28.geojson）を読み込み、
+ポリゴンの外接矩形を格子状のセルに登録しておく。判定時は点が属するセルの候補だけを
+外接矩形→点の内外判定（レイキャスティング）の順に調べる。
+
+政令指定都市の区は「大阪市北区」のように市名と区名をつなげた名前にする（犯罪データのキーと同じ形式）。
+"""
+import array
+import glob
+import json
+import math
+
+BOUNDARY_GLOB = "boundaries/N03*.geojson"
+GRID_DEG = 0.01  # 格子セルの大きさ（度）。約1km
+
+
+def city_name(props):
+    """N03 の属性から市区町村名を返す（郡名は付けない）"""
+    pref = props.get("N03_001") or ""
+    # 2023年版以降: N03_004 に政令市名、N03_005 に区名
+    ward = props.get("N03_005")
+    if ward:
+        return pref, (props.get("N03_004") or "") + ward
+    # 2022年版以前: N03_003 に郡・政令市名、N03_004 に市区町村名（政令市の場合は区名）
+    upper = props.get("N03_003") or ""
+    name = props.get("N03_004") or ""
+    if upper.endswith("市"):
+        return pref, upper + name
+    return pref, name
+
+
+def _ring(coords):
+    """座標リストを [lng0, lat0, lng1, lat1, ...] の配列にする"""
+    flat = array.array("d")
+    for lng, lat in coords:
+        flat.append(lng)
+        flat.append(lat)
+    return flat
+
+
+def _in_ring(ring, x, y):
+    inside = False
+    n = len(ring) // 2
+    j = n - 1
+    for i in range(n):
+        xi, yi = ring[2 * i], ring[2 * i + 1]
+        xj, yj = ring[2 * j], ring[2 * j + 1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+class CityIndex:
+    """市区町村ポリゴンの格子インデックス"""
+
+    def __init__(self):
+        self.names = []     # ポリゴン番号 → (都道府県, 市区町村)
+        self.polygons = []  # ポリゴン番号 → [外周, 穴, 穴...]
+        self.bboxes = []    # ポリゴン番号 → (最小経度, 最小緯度, 最大経度, 最大緯度)
+        self.grid = {}      # (セルx, セルy) → [ポリゴン番号]
+
+    def add(self, name, rings):
+        pid = len(self.polygons)
+        outer = rings[0]
+        xs, ys = outer[0::2], outer[1::2]
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.names.append(name)
+        self.polygons.append(rings)
+        self.bboxes.append(bbox)
+        for cx in range(math.floor(bbox[0] / GRID_DEG), math.floor(bbox[2] / GRID_DEG) + 1):
+            for cy in range(math.floor(bbox[1] / GRID_DEG), math.floor(bbox[3] / GRID_DEG) + 1):
+                self.grid.setdefault((cx, cy), []).append(pid)
+
+    def add_geojson(self, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for feature in data["features"]:
+            geom = feature.get("geometry")
+            if not geom:
+                continue
+            name = city_name(feature["properties"])
+            if geom["type"] == "Polygon":
+                parts = [geom["coordinates"]]
+            elif geom["type"] == "MultiPolygon":
+                parts = geom["coordinates"]
+            else:
+                continue
+            for part in parts:
+                self.add(name, [_ring(r) for r in part])
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def lookup(self, lat, lng):
+        """緯度経度を含む市区町村の (都道府県, 市区町村) を返す。どこにも含まれなければ None"""
+        cell = (math.floor(lng / GRID_DEG), math.floor(lat / GRID_DEG))
+        for pid in self.grid.get(cell, ()):
+            x0, y0, x1, y1 = self.bboxes[pid]
+            if not (x0 <= lng <= x1 and y0 <= lat <= y1):
+                continue
+            outer, *holes = self.polygons[pid]
+            if _in_ring(outer, lng, lat) and not any(_in_ring(h, lng, lat) for h in holes):
+                return self.names[pid]
+        return None
+
+
+def load_boundaries(pattern=BOUNDARY_GLOB):
+    """N03 の GeoJSON を読み込んでインデックスを作る。ファイルがなければ None を返す"""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        return None
+    index = CityIndex()
+    for path in paths:
+        index.add_geojson(path)
+    return index
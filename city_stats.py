@@ -0,0 +1,260 @@
+"""市区町村ごとの犯罪率・治安の分類・信頼区間をまとめて計算し、city_stats.json に保存する
+
+犯罪件数（crime_by_city.json）と人口（population_by_city.json）から、市区町村ごとに1回だけ
+  - 犯罪率（人口千人あたり）と 95% 信頼区間（件数をポアソン分布とみなした Byar の近似）
+  - 全市区町村の平均・標準偏差に対する z 値
+  - 治安の分類（CLASSIFICATION: 三分位 / 五分位 / z 値の閾値）
+を計算する。crime_years/（fetch_crime.py が年ごとに保存、crime_store.py）に複数の年があれば、
+  - 前年比（crime_yoy）と直近 ROLLING_YEARS 年の平均犯罪率（crime_rolling_rate、人口は同じ国勢調査の値）
+も付ける。WEIGHT_BY_POPULATION を有効にすると、分位数・平均・標準偏差を人口で重み付けする
+（「人口の1/3が住む市区町村」で区切る）。
+
+駅データ（stations.json）は市区町村名（city）だけを持ち、治安の値はこの表を引いて使う（attach）。
+地図の色分けに使う駅単位の平均・標準偏差（station_stats）も、ページで計算し直さないようにここで求める。
+
+    python3 city_stats.py   # stations.json・crime_by_city.json・population_by_city.json から city_stats.json を作る
+"""
+import array
+import bisect
+import json
+import math
+
+import telemetry
+from crime_cube import load_cube
+from crime_store import load_store
+
+STATIONS_PATH = "stations.json"
+CRIME_PATH = "crime_by_city.json"
+POPULATION_PATH = "population_by_city.json"
+OUTPUT_PATH = "city_stats.json"
+
+# 手口・月・時間帯で絞り込んで治安を評価する場合に指定する（空なら全件）
+# 例: {"offence": ["自転車盗"]}, {"hour_band": ["夜", "深夜"]}
+CRIME_FILTER = {}
+
+# 治安の分類方法: "tertile"（三分位）/ "quintile"（五分位）/ "zscore"（Z_CUTS の z 値で区切る）
+CLASSIFICATION = "tertile"
+# 分位数・平均・標準偏差を人口で重み付けするか
+WEIGHT_BY_POPULATION = False
+
+QUANTILES = {
+    "tertile": (1 / 3, 2 / 3),
+    "quintile": (0.2, 0.4, 0.6, 0.8),
+}
+Z_CUTS = (-0.5, 0.5)
+CONFIDENCE_Z = 1.96  # 95% 信頼区間
+ROLLING_YEARS = 3    # 平均犯罪率を求める年数
+
+# 区分の数 → 犯罪率の低い順のラベルと CSS クラス
+LEVELS = {
+    3: [("良好", "good"), ("普通", "normal"), ("注意", "caution")],
+    5: [("とても良好", "very-good"), ("良好", "good"), ("普通", "normal"),
+        ("注意", "caution"), ("要注意", "high-caution")],
+}
+NO_SAFETY = {"crime_count": None, "crime_rate": None, "crime_rate_ci": None, "crime_z": None,
+             "crime_yoy": None, "crime_rolling_rate": None, "safety": "データなし", "safety_class": "unknown"}
+
+
+def quantile(values, q, weights=None):
+    """values の q 分位数（累積の重みが q を超える最初の値。weights=None なら各値の重みは1）
+
+    重みなしの場合は sorted(values)[int(n * q)] と同じ値になる。
+    """
+    order = sorted(range(len(values)), key=values.__getitem__)
+    if weights is None:
+        return values[order[min(len(order) - 1, int(len(order) * q))]]
+    target = q * math.fsum(weights)
+    total = 0.0
+    for i in order:
+        total += weights[i]
+        if total > target:
+            return values[i]
+    return values[order[-1]]
+
+
+def mean_stddev(values, weights=None):
+    """平均と母標準偏差（weights を指定すると重み付き）"""
+    if weights is None:
+        weights = array.array("d", [1.0]) * len(values)
+    total = math.fsum(weights)
+    mean = math.fsum(w * v for v, w in zip(values, weights)) / total
+    variance = math.fsum(w * (v - mean) ** 2 for v, w in zip(values, weights)) / total
+    return mean, math.sqrt(variance)
+
+
+def poisson_interval(count, z=CONFIDENCE_Z):
+    """件数 count の信頼区間（Byar の近似）"""
+    if count <= 0:
+        low = 0.0
+    else:
+        low = count * (1 - 1 / (9 * count) - z / (3 * math.sqrt(count))) ** 3
+    c = count + 1
+    high = c * (1 - 1 / (9 * c) + z / (3 * math.sqrt(c))) ** 3
+    return low, high
+
+
+def trend(history, city, year, rolling=ROLLING_YEARS):
+    """{年: {市区町村: 件数}} から city の (前年比, 直近 rolling 年の平均件数) を返す
+
+    件数のない年（その府県のCSVがない年）は除く。前年がなければ前年比は None。
+    """
+    counts = {y: row[city] for y, row in history.items() if city in row}
+    cur, prev = counts.get(year), counts.get(year - 1)
+    yoy = (cur - prev) / prev if cur is not None and prev else None
+    window = [counts[y] for y in range(year - rolling + 1, year + 1) if y in counts]
+    return yoy, (math.fsum(window) / len(window) if window else None)
+
+
+class CityStats:
+    """市区町村ごとの犯罪件数・人口・犯罪率の列（犯罪件数があり人口が分かる市区町村のみ）"""
+
+    def __init__(self, cities, counts, population):
+        self.cities = cities
+        self.counts = counts          # array("d")
+        self.population = population  # array("d")
+        self.rates = array.array("d", (c / p * 1000 for c, p in zip(counts, population)))
+
+    @classmethod
+    def from_dicts(cls, crime, population):
+        """{市区町村: 犯罪件数} と {市区町村: 人口} から作る"""
+        cities = [c for c in crime if population.get(c)]
+        return cls(
+            cities,
+            array.array("d", (crime[c] for c in cities)),
+            array.array("d", (population[c] for c in cities)),
+        )
+
+    def __len__(self):
+        return len(self.cities)
+
+    def _weights(self, weighted):
+        return self.population if weighted else None
+
+    def cuts(self, method=CLASSIFICATION, weighted=WEIGHT_BY_POPULATION):
+        """分類の閾値（犯罪率、昇順）。犯罪率が cuts[i] 以下なら区分 i"""
+        if method == "zscore":
+            mean, stddev = mean_stddev(self.rates, self._weights(weighted))
+            return [mean + z * stddev for z in Z_CUTS]
+        if method not in QUANTILES:
+            raise ValueError(f"不明な分類方法: {method}（tertile / quintile / zscore）")
+        return [quantile(self.rates, q, self._weights(weighted)) for q in QUANTILES[method]]
+
+    def table(self, method=CLASSIFICATION, weighted=WEIGHT_BY_POPULATION, z=CONFIDENCE_Z,
+              history=None, year=None):
+        """city_stats.json の内容（station_stats を除く）を返す
+
+        history: {年: {市区町村: 件数}}（shards/<コード>/crime_years/ の年ごとの件数）, year: 件数の年
+        """
+        cuts = self.cuts(method, weighted)
+        levels = LEVELS.get(len(cuts) + 1)
+        if levels is None:
+            raise ValueError(f"{len(cuts) + 1}区分のラベルがありません（LEVELS に追加してください）")
+        mean, stddev = mean_stddev(self.rates, self._weights(weighted))
+        classes = [bisect.bisect_left(cuts, r) for r in self.rates]
+        z_scores = [(r - mean) / stddev if stddev else 0.0 for r in self.rates]
+        intervals = [poisson_interval(c, z) for c in self.counts]
+
+        cities = {}
+        for i, city in enumerate(self.cities):
+            low, high = intervals[i]
+            scale = 1000 / self.population[i]
+            label, cls = levels[classes[i]]
+            yoy, rolling = trend(history, city, year) if history and year else (None, None)
+            cities[city] = {
+                "crime_count": int(self.counts[i]),
+                "population": int(self.population[i]),
+                "crime_rate": round(self.rates[i], 2),
+                "crime_rate_ci": [round(low * scale, 2), round(high * scale, 2)],
+                "crime_z": round(z_scores[i], 3),
+                "crime_yoy": round(yoy, 3) if yoy is not None else None,
+                "crime_rolling_rate": round(rolling * scale, 2) if rolling is not None else None,
+                "crime_history": {str(y): row[city] for y, row in sorted((history or {}).items()) if city in row},
+                "safety": label,
+                "safety_class": cls,
+            }
+        return {
+            "year": year,
+            "rolling_years": ROLLING_YEARS,
+            "classification": method,
+            "weighted": weighted,
+            "cuts": [round(c, 4) for c in cuts],
+            "levels": [list(level) for level in levels],
+            "city_stats": {"mean": mean, "stddev": stddev},
+            "cities": cities,
+        }
+
+
+def station_stats(stations, table):
+    """駅単位の犯罪率の平均・母標準偏差・最小・最大（地図の色分けとフィルターの範囲に使う）"""
+    rates = array.array("d", (
+        table["cities"][s["city"]]["crime_rate"]
+        for s in stations if s.get("city") in table["cities"]
+    ))
+    if not rates:
+        return None
+    mean, stddev = mean_stddev(rates)
+    return {"mean": mean, "stddev": stddev, "min": min(rates), "max": max(rates)}
+
+
+def attach(stations, table):
+    """駅データに市区町村の治安の値を付けたコピーを返す（table がなければすべてデータなし）"""
+    rows = table["cities"] if table else {}
+    result = []
+    for s in stations:
+        row = rows.get(s.get("city"))
+        info = NO_SAFETY if row is None else {k: row[k] for k in NO_SAFETY}
+        result.append({**s, **info})
+    return result
+
+
+def load_city_stats(path=OUTPUT_PATH):
+    """city_stats.json を読み込む。ファイルがなければ None を返す"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    with open(STATIONS_PATH, encoding="utf-8") as f:
+        stations = json.load(f)
+    with open(CRIME_PATH, encoding="utf-8") as f:
+        crime = json.load(f)
+    with open(POPULATION_PATH, encoding="utf-8") as f:
+        population = json.load(f)
+
+    if CRIME_FILTER:
+        cube = load_cube()
+        if cube is None:
+            print("crime_cube.bin がないため絞り込みなしで集計します（fetch_crime.py を実行してください）")
+        else:
+            crime = cube.sum_by("city", **CRIME_FILTER)
+            print(f"犯罪件数を絞り込み: {CRIME_FILTER}")
+
+    # 年ごとの件数（前年比・平均犯罪率）。crime_by_city.json は最新の年の件数
+    store = load_store()
+    history = year = None
+    if store is None:
+        print("shards/<コード>/crime_years/ がないため前年比は計算しません（fetch_crime.py を実行してください）")
+    else:
+        year = store.latest_year()
+        history = store.city_history(**CRIME_FILTER)
+        print(f"年ごとの件数: {', '.join(map(str, history))}年（{year}年との前年比・直近{ROLLING_YEARS}年の平均）")
+
+    stats = CityStats.from_dicts(crime, population)
+    table = stats.table(history=history, year=year)
+    table["station_stats"] = station_stats(stations, table)
+
+    weighted = "（人口で重み付け）" if WEIGHT_BY_POPULATION else ""
+    print(f"犯罪率（人口千人あたり）: {len(stats)}市区町村, 分類 {CLASSIFICATION}{weighted}")
+    print(f"  閾値: {', '.join(f'{c:.2f}' for c in table['cuts'])}")
+    print(f"  平均 {table['city_stats']['mean']:.2f}, 標準偏差 {table['city_stats']['stddev']:.2f}")
+    matched = sum(1 for s in stations if s.get("city") in table["cities"])
+    print(f"  治安マッチ: {matched}/{len(stations)}駅")
+    telemetry.join("治安マッチ", matched, len(stations))
+    telemetry.join("人口マッチ", len(stats), len(crime))
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, indent=2)
+    print(f"{OUTPUT_PATH} に保存しました")
@@ -0,0 +1,161 @@
+"""府県ごとの取得結果（shards/<コード>/）をまとめて、統合・集計スクリプトが読む最上位のファイルを作る
+
+    shards/<コード>/stations_raw.json        → stations_raw.json（駅名順。府県をまたぐ重複は路線をまとめる）
+    shards/<コード>/line_routes.json         → line_routes.json（対象の府県の駅だけに絞った路線の並び）
+    shards/<コード>/rent_matrix.bin          → rent_matrix.bin, rent_by_station.json
+                                              （府県をまたいで同じ駅があれば掲載件数で重み付けした平均）
+    shards/<コード>/crime_years/             → crime_cube.bin, crime_by_city.json, crime_by_town.json
+                                              （全府県がそろう最新の年）
+    shards/<コード>/population_by_city.json  → population_by_city.json
+
+まとめるのはローカルのファイルだけなので、府県を追加しても取得し直すのはその府県の分だけで済む。
+いずれかの府県の取得結果がない種類のファイルは書き換えない（府県が欠けたまま上書きしない）。
+
+    python3 combine_shards.py
+"""
+import json
+
+import crime_cube
+import regions
+import telemetry
+from crime_store import load_store
+from rent_matrix import ALL, MATRIX_PATH, RentMatrix, load_matrix
+
+
+def _load_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_json(path, data, indent=2):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+
+
+def combine_stations(shards):
+    """府県ごとの駅のリストをまとめる（駅名+座標が同じ駅は1つにし、路線をまとめる）"""
+    stations = {}
+    for shard in shards:
+        for s in shard:
+            key = (s["name"], s["lat"], s["lng"])
+            if key in stations:
+                lines = stations[key]["lines"]
+                lines.extend(l for l in s["lines"] if l not in lines)
+            else:
+                stations[key] = dict(s, lines=list(s["lines"]))
+    return sorted(stations.values(), key=lambda s: s["name"])
+
+
+def combine_routes(shards, prefectures):
+    """{路線: [[駅名, 緯度, 経度, 都道府県], ...]} をまとめ、対象の府県の駅の [[駅名, 緯度, 経度], ...] にする
+
+    府県をまたぐ路線はどの府県のシャードにも同じ並び（APIの順）で入っているので、最初のものを使う。
+    """
+    routes = {}
+    for shard in shards:
+        for line, route in shard.items():
+            if line not in routes:
+                routes[line] = [[name, lat, lng] for name, lat, lng, pref in route if pref in prefectures]
+    return dict(sorted(routes.items()))
+
+
+def combine_rent(matrices):
+    """府県ごとの家賃行列をまとめる"""
+    rows = []
+    for m in matrices:
+        width = len(m.plans)
+        for i, station in enumerate(m.stations):
+            for j, plan in enumerate(m.plans):
+                rent = m.rent[i * width + j]
+                if rent == rent:
+                    rows.append((station, plan, rent, m.listings[i * width + j]))
+    return RentMatrix.from_rows(rows)
+
+
+def combine_population(shards):
+    """府県ごとの {市区町村: 人口} をまとめ、(人口, 複数の府県にある市区町村名) を返す"""
+    population, duplicates = {}, []
+    for shard in shards:
+        for city, n in shard.items():
+            if city in population:
+                duplicates.append(city)
+            population[city] = n
+    return dict(sorted(population.items())), duplicates
+
+
+if __name__ == "__main__":
+    targets = regions.enabled()
+    print(f"対象の府県: {', '.join(f'{r.prefecture}（{r.code}）' for r in targets)}")
+    missing = []
+
+    def shards(name, load=_load_json):
+        """府県ごとの name を読み込んだリスト（1つでも欠けていれば None）"""
+        found = [load(r.shard(name)) for r in targets]
+        lacking = [r.shard(name) for r, data in zip(targets, found) if data is None]
+        missing.extend(lacking)
+        return None if lacking else found
+
+    # --- 駅・路線 ---
+    found = shards("stations_raw.json")
+    if found is not None:
+        stations = combine_stations(found)
+        _save_json("stations_raw.json", stations)
+        print(f"駅: {len(stations)}駅")
+    found = shards("line_routes.json")
+    if found is not None:
+        routes = combine_routes(found, regions.prefectures())
+        _save_json("line_routes.json", routes, indent=1)
+        print(f"路線の並び: {len(routes)}路線")
+
+    # --- 家賃 ---
+    found = shards(MATRIX_PATH, load_matrix)
+    if found is not None:
+        matrix = combine_rent(found)
+        matrix.save()
+        rent = matrix.column(ALL)
+        _save_json("rent_by_station.json", rent)
+        print(f"家賃: {len(rent)}駅（間取り: {'・'.join(matrix.plans[1:]) or 'なし'}）")
+
+    # --- 犯罪（全府県がそろう最新の年） ---
+    store = load_store(targets)
+    crime = _load_json("crime_by_city.json") or {}
+    lacking = [r.code for r in targets if load_store([r]) is None]
+    if lacking:
+        print(f"犯罪: 集計のない府県があります: {', '.join(lacking)}（fetch_crime.py を実行してください）")
+    else:
+        year = store.latest_year()
+        cube = store.cube(year)
+        cube.save()
+        crime = dict(sorted(cube.sum_by("city").items(), key=lambda x: -x[1]))
+        _save_json("crime_by_city.json", crime)
+        by_town = store.towns(year)
+        _save_json("crime_by_town.json", by_town, indent=1)
+        print(f"犯罪: {year}年 {len(crime)}市区町村, {sum(crime.values())}件"
+              f"（保存済みの年: {', '.join(map(str, store.years()))}, 町丁目 {sum(len(t) for t in by_town.values())}件）")
+        print(f"  {crime_cube.CUBE_PATH} に保存しました（{' × '.join(str(n) for n in cube.shape)}）")
+
+    # --- 人口（犯罪データのキーと照合してカバー率を確認） ---
+    found = shards("population_by_city.json")
+    if found is not None:
+        population, duplicates = combine_population(found)
+        _save_json("population_by_city.json", population)
+        matched = sum(1 for c in crime if c in population)
+        print(f"人口: {len(population)}市区町村, 犯罪データとのマッチ {matched}/{len(crime)}")
+        telemetry.join("人口マッチ", matched, len(crime))
+        if duplicates:
+            print(f"  複数の府県にある市区町村名（後の府県の値を使う）: {'、'.join(duplicates)}")
+        unmatched = [c for c in crime if c not in population]
+        if unmatched:
+            print(f"  未マッチ ({len(unmatched)}件):")
+            for c in unmatched:
+                print(f"    {c}: {crime[c]}件")
+
+    for path in missing:
+        telemetry.event("error", op="combine", type="MissingShard", message="府県の取得結果がありません", path=path)
+    if missing:
+        print("\n府県の取得結果がないため、次のファイルを使うものは書き換えていません:")
+        for path in missing:
+            print(f"  {path}")
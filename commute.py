@@ -0,0 +1,272 @@
+"""路線から駅のグラフを作り、主要駅（HUBS）までの所要時間を commute_matrix.bin に保存する
+
+グラフの頂点は (駅, 路線) の組で、辺は次の3種類。
+  - 乗車: 同じ路線で隣り合う駅（STOP_MIN + 距離 / SPEED_KMH）
+  - 乗り換え: 同じ駅の別の路線（TRANSFER_MIN）
+  - 徒歩乗り換え: WALK_KM 以内の別の駅（「梅田」と「大阪梅田」など。TRANSFER_MIN + 距離 / WALK_KMH）
+
+路線上の駅の並びは line_routes.json（fetch_stations.py が API の順に保存）を使う。ない路線は
+駅の最小全域木（直線距離）で隣り合う駅を決める（環状線は1区間つながらないので、遠回りの時間になる）。
+line_routes.json でも、MAX_HOP_KM より離れた駅の並びは支線の切れ目とみなしてつながない。
+
+主要駅ごとに、その駅群（名前で指定）を始点とする多始点ダイクストラ法で全駅までの時間を求める
+（グラフは無向なので、駅から主要駅までの時間と同じ）。所要時間は各駅停車を想定した目安で、
+急行・乗り換えの待ち時間は考えない。
+
+ファイル形式: マジック "CMUT" + ヘッダ長(uint32) + JSONヘッダ（駅名・主要駅の名前）
+              + 所要時間（分）の uint16 配列（到達できない駅は 0xFFFF、リトルエンディアン、駅 × 主要駅のC順）
+駅の並びは stations.json と同じ。
+
+    python3 commute.py   # stations.json（と line_routes.json）から commute_matrix.bin を作る
+"""
+import array
+import heapq
+import json
+import math
+import struct
+import sys
+
+from station_names import distance_km, normalize
+
+STATIONS_PATH = "stations.json"
+ROUTES_PATH = "line_routes.json"
+MATRIX_PATH = "commute_matrix.bin"
+
+MAGIC = b"CMUT"
+HEADER = struct.Struct("<4sI")
+UNREACHABLE = 0xFFFF
+
+# 主要駅 → その駅とみなす駅名（乗り換えなしで着けば到着とする）
+HUBS = {
+    "梅田": ("梅田", "大阪梅田", "大阪", "東梅田", "西梅田", "北新地"),
+    "難波": ("難波", "なんば", "大阪難波", "JR難波"),
+    "三宮": ("三宮", "三ノ宮", "神戸三宮", "三宮・花時計前"),
+}
+
+SPEED_KMH = 45       # 駅間の走行速度
+STOP_MIN = 0.5       # 1駅あたりの停車時間
+TRANSFER_MIN = 5     # 乗り換え1回あたりの時間
+WALK_KM = 0.5        # 徒歩で乗り換えられる駅間の直線距離
+WALK_KMH = 4.8
+MAX_HOP_KM = 15      # line_routes.json の並びでも、これより離れた駅はつながない
+
+
+def load_routes(path=ROUTES_PATH):
+    """{路線: [[駅名, 緯度, 経度], ...]}（路線の順）を読み込む。ファイルがなければ None を返す"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _spanning_tree(stations, members):
+    """駅番号 members の最小全域木の辺 [(駅番号, 駅番号)] を返す（Prim 法）"""
+    if len(members) < 2:
+        return []
+    best = {j: (math.inf, None) for j in members[1:]}
+    current = members[0]
+    edges = []
+    while best:
+        a = stations[current]
+        for j, (d, _) in best.items():
+            b = stations[j]
+            dj = distance_km(a["lat"], a["lng"], b["lat"], b["lng"])
+            if dj < d:
+                best[j] = (dj, current)
+        current = min(best, key=lambda j: best[j][0])
+        edges.append((best.pop(current)[1], current))
+    return edges
+
+
+def line_edges(stations, routes=None):
+    """{路線: [(駅番号, 駅番号)]} の隣り合う駅の組を返す"""
+    members = {}
+    for i, s in enumerate(stations):
+        for line in s["lines"]:
+            members.setdefault(line, []).append(i)
+    by_key = {(s["name"], round(s["lat"], 6), round(s["lng"], 6)): i for i, s in enumerate(stations)}
+
+    edges = {}
+    for line, ids in members.items():
+        route = (routes or {}).get(line)
+        if not route:
+            edges[line] = _spanning_tree(stations, ids)
+            continue
+        order = [by_key.get((name, round(lat, 6), round(lng, 6))) for name, lat, lng in route]
+        pairs = []
+        for a, b in zip(order, order[1:]):
+            if a is None or b is None:
+                continue
+            sa, sb = stations[a], stations[b]
+            if distance_km(sa["lat"], sa["lng"], sb["lat"], sb["lng"]) <= MAX_HOP_KM:
+                pairs.append((a, b))
+        edges[line] = pairs
+    return edges
+
+
+def walk_pairs(stations):
+    """WALK_KM 以内の別の駅の組 [(距離km, 駅番号, 駅番号)] を返す（格子バケットの近傍探索）"""
+    # セルの大きさを WALK_KM 以上にすると、相手は周囲3×3セルにしかいない
+    max_lat = max((abs(s["lat"]) for s in stations), default=0)
+    cell = WALK_KM / (6371 * math.pi / 180 * math.cos(math.radians(max_lat)))
+    grid = {}
+    for i, s in enumerate(stations):
+        grid.setdefault((math.floor(s["lat"] / cell), math.floor(s["lng"] / cell)), []).append(i)
+
+    pairs = []
+    for (cy, cx), members in grid.items():
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for i in members:
+                    for j in grid.get((cy + dy, cx + dx), ()):
+                        if j <= i:
+                            continue
+                        a, b = stations[i], stations[j]
+                        d = distance_km(a["lat"], a["lng"], b["lat"], b["lng"])
+                        if d <= WALK_KM:
+                            pairs.append((d, i, j))
+    return pairs
+
+
+def build_graph(stations, routes=None):
+    """(頂点 (駅番号, 路線) のリスト, 頂点番号 → [(頂点番号, 分)] の隣接リスト) を返す"""
+    nodes = [(i, line) for i, s in enumerate(stations) for line in s["lines"]]
+    node_id = {n: k for k, n in enumerate(nodes)}
+    adjacency = [[] for _ in nodes]
+
+    def connect(a, b, minutes):
+        adjacency[a].append((b, minutes))
+        adjacency[b].append((a, minutes))
+
+    for line, pairs in line_edges(stations, routes).items():
+        for a, b in pairs:
+            sa, sb = stations[a], stations[b]
+            d = distance_km(sa["lat"], sa["lng"], sb["lat"], sb["lng"])
+            connect(node_id[(a, line)], node_id[(b, line)], STOP_MIN + d / SPEED_KMH * 60)
+
+    for i, s in enumerate(stations):
+        lines = s["lines"]
+        for x in range(len(lines)):
+            for y in range(x + 1, len(lines)):
+                connect(node_id[(i, lines[x])], node_id[(i, lines[y])], TRANSFER_MIN)
+
+    for d, i, j in walk_pairs(stations):
+        minutes = TRANSFER_MIN + d / WALK_KMH * 60
+        for la in stations[i]["lines"]:
+            for lb in stations[j]["lines"]:
+                connect(node_id[(i, la)], node_id[(j, lb)], minutes)
+    return nodes, adjacency
+
+
+def shortest_times(adjacency, sources):
+    """頂点番号 sources のいずれかからの最短時間（分）のリストを返す（多始点ダイクストラ法）"""
+    dist = [math.inf] * len(adjacency)
+    heap = []
+    for v in sources:
+        dist[v] = 0.0
+        heap.append((0.0, v))
+    heapq.heapify(heap)
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue
+        for w, minutes in adjacency[v]:
+            nd = d + minutes
+            if nd < dist[w]:
+                dist[w] = nd
+                heapq.heappush(heap, (nd, w))
+    return dist
+
+
+class CommuteMatrix:
+    """駅 × 主要駅の所要時間（分）"""
+
+    def __init__(self, names, hubs, minutes):
+        self.names = names
+        self.hubs = hubs
+        self.minutes = minutes  # array("H")、到達できなければ UNREACHABLE
+
+    @classmethod
+    def build(cls, stations, routes=None, hubs=HUBS):
+        nodes, adjacency = build_graph(stations, routes)
+        minutes = array.array("H", [UNREACHABLE]) * (len(stations) * len(hubs))
+        for h, names in enumerate(hubs.values()):
+            wanted = {normalize(n) for n in names}
+            sources = [k for k, (i, _) in enumerate(nodes) if normalize(stations[i]["name"]) in wanted]
+            dist = shortest_times(adjacency, sources)
+            for k, (i, _) in enumerate(nodes):
+                if dist[k] < math.inf:
+                    m = min(math.ceil(dist[k]), UNREACHABLE - 1)
+                    pos = i * len(hubs) + h
+                    minutes[pos] = min(minutes[pos], m)
+        return cls([s["name"] for s in stations], list(hubs), minutes)
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, i):
+        """駅番号 i の {主要駅: 分}（到達できない主要駅は除く）"""
+        width = len(self.hubs)
+        return {h: self.minutes[i * width + j] for j, h in enumerate(self.hubs)
+                if self.minutes[i * width + j] != UNREACHABLE}
+
+    def attach(self, stations):
+        """駅データ（stations.json と同じ並び）に "commute" {主要駅: 分} を付ける。並びが違えば False"""
+        if [s["name"] for s in stations] != self.names:
+            return False
+        for i, s in enumerate(stations):
+            s["commute"] = self.row(i)
+        return True
+
+    def save(self, path=MATRIX_PATH):
+        header = json.dumps({"stations": self.names, "hubs": self.hubs}, ensure_ascii=False).encode("utf-8")
+        minutes = array.array("H", self.minutes)
+        if sys.byteorder != "little":
+            minutes.byteswap()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(minutes.tobytes())
+
+    @classmethod
+    def load(cls, path=MATRIX_PATH):
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, header_len = HEADER.unpack_from(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{path} は所要時間の行列のファイルではありません")
+        pos = HEADER.size
+        header = json.loads(raw[pos:pos + header_len].decode("utf-8"))
+        minutes = array.array("H")
+        minutes.frombytes(raw[pos + header_len:pos + header_len + 2 * len(header["stations"]) * len(header["hubs"])])
+        if sys.byteorder != "little":
+            minutes.byteswap()
+        return cls(header["stations"], header["hubs"], minutes)
+
+
+def load_commute(path=MATRIX_PATH):
+    """所要時間の行列を読み込む。ファイルがなければ None を返す"""
+    try:
+        return CommuteMatrix.load(path)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    with open(STATIONS_PATH, encoding="utf-8") as f:
+        stations = json.load(f)
+    routes = load_routes()
+    if routes is None:
+        print("line_routes.json がないため、路線の駅の並びを最小全域木で推定します（fetch_stations.py で作成されます）")
+
+    matrix = CommuteMatrix.build(stations, routes)
+    matrix.save()
+
+    print(f"{len(stations)}駅 → 主要駅 {len(matrix.hubs)}か所")
+    for j, hub in enumerate(matrix.hubs):
+        times = sorted(m for m in matrix.minutes[j::len(matrix.hubs)] if m != UNREACHABLE)
+        if times:
+            print(f"  {hub}: 到達 {len(times)}駅, 30分以内 {sum(1 for m in times if m <= 30)}駅,"
+                  f" 中央値 {times[len(times) // 2]}分")
+    print(f"{MATRIX_PATH} に保存しました")
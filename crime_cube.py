@@ -0,0 +1,162 @@
+"""犯罪件数の集計キューブ（市区町村 × 手口 × 月 × 時間帯）
+
+fetch_crime.py がCSVを集計して crime_cube.bin に保存し、merge_data.py などが
+手口・月・時間帯で切り出して使う（生のCSVを再取得・再解析しなくてよい）。
+
+ファイル形式: マジック "CUBE" + ヘッダ長(uint32) + JSONヘッダ（次元名とラベル）
+              + 件数の uint32 配列（リトルエンディアン、C順）
+"""
+import array
+import json
+import re
+import struct
+import sys
+
+CUBE_PATH = "crime_cube.bin"
+
+MAGIC = b"CUBE"
+HEADER = struct.Struct("<4sI")
+
+DIMS = ("city", "offence", "month", "hour_band")
+UNKNOWN = "不明"
+MONTHS = [f"{m}月" for m in range(1, 13)] + [UNKNOWN]
+# 時間帯: (ラベル, 開始時, 終了時)
+HOUR_BANDS = [
+    ("深夜", 0, 6),
+    ("朝", 6, 10),
+    ("昼", 10, 16),
+    ("夕方", 16, 20),
+    ("夜", 20, 24),
+]
+HOUR_BAND_LABELS = [b[0] for b in HOUR_BANDS] + [UNKNOWN]
+
+
+def month_label(date_str):
+    """発生年月日（2024/01/05, 2024-1-5, 2024年1月5日 など）から月のラベルを返す"""
+    m = re.match(r"\s*\d{4}\D?(\d{1,2})", date_str or "")
+    if m and 1 <= int(m.group(1)) <= 12:
+        return MONTHS[int(m.group(1)) - 1]
+    return UNKNOWN
+
+
+def hour_band_label(hour_str):
+    """発生時（0〜23）から時間帯のラベルを返す"""
+    m = re.match(r"\s*(\d{1,2})", hour_str or "")
+    if m:
+        hour = int(m.group(1))
+        for label, start, end in HOUR_BANDS:
+            if start <= hour < end:
+                return label
+    return UNKNOWN
+
+
+class Cube:
+    """次元ごとのラベルと、件数の平坦な配列からなるキューブ"""
+
+    def __init__(self, labels, data):
+        self.labels = labels
+        self.data = data
+        self.shape = [len(labels[d]) for d in DIMS]
+        self._index = {d: {v: i for i, v in enumerate(labels[d])} for d in DIMS}
+
+    @classmethod
+    def from_counts(cls, counts):
+        """{(市区町村, 手口, 月, 時間帯): 件数} からキューブを作る"""
+        labels = {
+            "city": sorted({k[0] for k in counts}),
+            "offence": sorted({k[1] for k in counts}),
+            "month": MONTHS,
+            "hour_band": HOUR_BAND_LABELS,
+        }
+        cube = cls(labels, None)
+        cube.data = array.array("I", bytes(4 * cube.size))
+        for key, n in counts.items():
+            cube.data[cube._offset(key)] += n
+        return cube
+
+    def items(self):
+        """件数が0でないセルの ((市区町村, 手口, 月, 時間帯), 件数) を返す"""
+        c_size, o_size, m_size, h_size = self.shape
+        labels = [self.labels[d] for d in DIMS]
+        for pos, n in enumerate(self.data):
+            if n:
+                h = pos % h_size
+                m = pos // h_size % m_size
+                o = pos // (h_size * m_size) % o_size
+                c = pos // (h_size * m_size * o_size)
+                yield (labels[0][c], labels[1][o], labels[2][m], labels[3][h]), n
+
+    @property
+    def size(self):
+        n = 1
+        for s in self.shape:
+            n *= s
+        return n
+
+    def _offset(self, key):
+        offset = 0
+        for d, size, label in zip(DIMS, self.shape, key):
+            offset = offset * size + self._index[d][label]
+        return offset
+
+    def sum_by(self, dim, **filters):
+        """dim ごとの合計件数を返す。filters で他の次元をラベルのリストに絞り込める
+
+        例: cube.sum_by("city", offence=["自転車盗"], hour_band=["夜", "深夜"])
+        """
+        unknown = sorted(set(filters) - set(DIMS)) + ([dim] if dim not in DIMS else [])
+        if unknown:
+            raise ValueError(f"不明な次元: {', '.join(unknown)}（{' / '.join(DIMS)}）")
+        keep = []
+        for d in DIMS:
+            allowed = filters.get(d)
+            if allowed is None:
+                keep.append(range(len(self.labels[d])))
+            else:
+                keep.append([self._index[d][v] for v in allowed if v in self._index[d]])
+
+        axis = DIMS.index(dim)
+        totals = [0] * self.shape[axis]
+        c_size, o_size, m_size, h_size = self.shape
+        for c in keep[0]:
+            for o in keep[1]:
+                for m in keep[2]:
+                    base = ((c * o_size + o) * m_size + m) * h_size
+                    for h in keep[3]:
+                        n = self.data[base + h]
+                        if n:
+                            totals[(c, o, m, h)[axis]] += n
+        return {self.labels[dim][i]: n for i, n in enumerate(totals) if n}
+
+    def save(self, path=CUBE_PATH):
+        header = json.dumps({"dims": DIMS, "labels": self.labels}, ensure_ascii=False).encode("utf-8")
+        data = array.array("I", self.data)
+        if sys.byteorder != "little":
+            data.byteswap()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(data.tobytes())
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, header_len = HEADER.unpack_from(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{path} は集計キューブのファイルではありません")
+        pos = HEADER.size
+        header = json.loads(raw[pos:pos + header_len].decode("utf-8"))
+        data = array.array("I")
+        data.frombytes(raw[pos + header_len:])
+        if sys.byteorder != "little":
+            data.byteswap()
+        return cls(header["labels"], data)
+
+
+def load_cube(path=CUBE_PATH):
+    """キューブを読み込む。ファイルがなければ None を返す"""
+    try:
+        return Cube.load(path)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,222 @@
+"""町丁目別の犯罪件数から、駅の周辺の犯罪密度（カーネル密度推定）を求めて crime_density.json に保存する
+
+市区町村単位の犯罪率では、同じ市区町村の駅がすべて同じ値になる（東大阪市の駅はすべて 4.78 など）。
+ここでは fetch_crime.py が集計した町丁目別の件数（crime_by_town.json）を町丁目の代表点に置き、
+駅を中心とするガウスカーネル（標準偏差 BANDWIDTH_KM、3σ で打ち切り）で重み付けした件数の密度
+（件/km²）を駅ごとに求める。
+
+町丁目の代表点は国土交通省「位置参照情報（大字・町丁目レベル）」の CSV（town_points/ に置く）から引く。
+  - 町丁目名は全角・半角と漢数字の丁目（「梅田一丁目」「梅田１丁目」）を揃えて照合する
+  - 丁目まで一致しなければ、丁目を除いた町名の代表点（その町の丁目の平均）に置く
+
+件数はまず CELL_KM 四方の格子に集約するので、事件数が数十万件あっても計算量はセル数で決まる。
+駅ごとの密度は、駅の周囲のセルにあらかじめ計算したカーネルの重みを掛けて足し合わせる。
+
+ファイル形式（JSON）: {"bandwidth_km", "cell_km", "located", "names": [駅名], "density": [件/km²]}
+（駅の並びは stations.json と同じ。located は代表点に置けた件数の割合）
+
+    python3 crime_density.py   # stations.json・crime_by_town.json・town_points/ から crime_density.json を作る
+"""
+import csv
+import glob
+import json
+import math
+import re
+import unicodedata
+
+import telemetry
+
+STATIONS_PATH = "stations.json"
+TOWNS_PATH = "crime_by_town.json"
+TOWN_POINTS_GLOB = "town_points/*.csv"
+OUTPUT_PATH = "crime_density.json"
+ENCODING = "cp932"
+
+BANDWIDTH_KM = 0.5  # カーネルの標準偏差（駅から徒歩圏）
+CELL_KM = 0.1       # 件数を集約する格子の大きさ
+KM_PER_DEG = 6371 * math.pi / 180
+
+_KANJI_DIGITS = {c: i for i, c in enumerate("〇一二三四五六七八九")}
+_CHOME = re.compile(r"([〇一二三四五六七八九十]+|\d+)丁目$")
+
+
+def _kanji_number(text):
+    """「二十三」→ 23（十までの組み合わせのみ）"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_KANJI_DIGITS.get(tens, 1) if tens else 1) * 10 + (_KANJI_DIGITS.get(ones, 0) if ones else 0)
+    return int("".join(str(_KANJI_DIGITS[c]) for c in text))
+
+
+def town_key(name):
+    """照合用の町丁目名（全角・半角を揃え、丁目は算用数字にする）"""
+    name = re.sub(r"\s+", "", unicodedata.normalize("NFKC", name))
+    m = _CHOME.search(name)
+    if m:
+        name = f"{name[:m.start()]}{_kanji_number(m.group(1))}丁目"
+    return name
+
+
+def town_base(key):
+    """town_key から丁目を除いた町名"""
+    return _CHOME.sub("", key)
+
+
+class TownPoints:
+    """(市区町村, 町丁目) → 代表点 (緯度, 経度)"""
+
+    def __init__(self):
+        self.points = {}  # (市区町村, town_key) → (緯度, 経度)
+        self.bases = {}   # (市区町村, town_base) → (緯度, 経度)
+
+    def add_csv(self, path):
+        """位置参照情報（大字・町丁目レベル）の CSV を読み込む"""
+        with open(path, encoding=ENCODING, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            col = {name: header.index(name) for name in ("市区町村名", "大字町丁目名", "緯度", "経度")}
+            for r in reader:
+                key = town_key(r[col["大字町丁目名"]])
+                self.points[(r[col["市区町村名"]], key)] = (float(r[col["緯度"]]), float(r[col["経度"]]))
+
+    def finish(self):
+        """丁目を除いた町名の代表点（丁目の代表点の平均）を作る"""
+        groups = {}
+        for (city, key), point in self.points.items():
+            groups.setdefault((city, town_base(key)), []).append(point)
+        self.bases = {
+            k: (sum(p[0] for p in pts) / len(pts), sum(p[1] for p in pts) / len(pts))
+            for k, pts in groups.items()
+        }
+
+    def __len__(self):
+        return len(self.points)
+
+    def lookup(self, city, town):
+        key = town_key(town)
+        return self.points.get((city, key)) or self.bases.get((city, town_base(key)))
+
+
+def load_town_points(pattern=TOWN_POINTS_GLOB):
+    """town_points/ の CSV から代表点の索引を作る。CSV がなければ None を返す"""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        return None
+    index = TownPoints()
+    for path in paths:
+        index.add_csv(path)
+    index.finish()
+    return index
+
+
+class DensityGrid:
+    """件数を CELL_KM 四方の格子に集約し、ガウスカーネルで密度を求める"""
+
+    def __init__(self, ref_lat, bandwidth_km=BANDWIDTH_KM, cell_km=CELL_KM):
+        self.bandwidth_km = bandwidth_km
+        self.cell_km = cell_km
+        # 経度方向のセル幅は対象範囲の代表緯度で決める（数十kmの範囲なら誤差は小さい）
+        self.lat_deg = cell_km / KM_PER_DEG
+        self.lng_deg = cell_km / (KM_PER_DEG * math.cos(math.radians(ref_lat)))
+        self.cells = {}  # (セルx, セルy) → 件数
+        # 3σ 以内のセルのずれとカーネルの重み（件/km² に換算済み）
+        reach = math.ceil(3 * bandwidth_km / cell_km)
+        norm = 1 / (2 * math.pi * bandwidth_km ** 2)
+        self.kernel = [
+            (dx, dy, norm * math.exp(-((dx * cell_km) ** 2 + (dy * cell_km) ** 2) / (2 * bandwidth_km ** 2)))
+            for dx in range(-reach, reach + 1)
+            for dy in range(-reach, reach + 1)
+            if (dx * dx + dy * dy) * cell_km ** 2 <= (3 * bandwidth_km) ** 2
+        ]
+
+    def _cell(self, lat, lng):
+        return math.floor(lng / self.lng_deg), math.floor(lat / self.lat_deg)
+
+    def add(self, lat, lng, count=1):
+        cell = self._cell(lat, lng)
+        self.cells[cell] = self.cells.get(cell, 0) + count
+
+    def density(self, lat, lng):
+        """(lat, lng) の密度（件/km²）"""
+        cx, cy = self._cell(lat, lng)
+        cells = self.cells
+        total = 0.0
+        for dx, dy, w in self.kernel:
+            n = cells.get((cx + dx, cy + dy))
+            if n:
+                total += n * w
+        return total
+
+
+def station_density(stations, by_town, points):
+    """駅ごとの犯罪密度のリストと、代表点に置けた件数の割合を返す"""
+    ref_lat = sum(s["lat"] for s in stations) / len(stations)
+    grid = DensityGrid(ref_lat)
+    located = total = 0
+    for city, towns in by_town.items():
+        for town, count in towns.items():
+            total += count
+            point = points.lookup(city, town)
+            if point is not None:
+                grid.add(point[0], point[1], count)
+                located += count
+    densities = [round(grid.density(s["lat"], s["lng"]), 1) for s in stations]
+    return densities, (located / total if total else 0.0)
+
+
+def load_density(path=OUTPUT_PATH):
+    """crime_density.json を読み込む。ファイルがなければ None を返す"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def attach_density(stations, table):
+    """駅データ（stations.json と同じ並び）に "crime_density" を付ける。並びが違えば False"""
+    if table is None or [s["name"] for s in stations] != table["names"]:
+        return False
+    for s, d in zip(stations, table["density"]):
+        s["crime_density"] = d
+    return True
+
+
+def main():
+    with open(STATIONS_PATH, encoding="utf-8") as f:
+        stations = json.load(f)
+    try:
+        with open(TOWNS_PATH, encoding="utf-8") as f:
+            by_town = json.load(f)
+    except FileNotFoundError:
+        print(f"{TOWNS_PATH} がないため犯罪密度を計算しません（fetch_crime.py を実行してください）")
+        return
+    points = load_town_points()
+    if points is None:
+        print("town_points/ に位置参照情報（大字・町丁目レベル）の CSV がないため犯罪密度を計算しません")
+        return
+
+    densities, located = station_density(stations, by_town, points)
+    print(f"町丁目の代表点: {len(points)}件, 代表点に置けた犯罪: {located:.1%}")
+    total = sum(n for towns in by_town.values() for n in towns.values())
+    telemetry.join("町丁目の代表点", round(located * total), total)
+    ranked = sorted(zip(densities, (s["name"] for s in stations)), reverse=True)
+    print("犯罪密度の高い駅:")
+    for d, name in ranked[:10]:
+        print(f"  {name}: {d}件/km²")
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump({
+            "bandwidth_km": BANDWIDTH_KM,
+            "cell_km": CELL_KM,
+            "located": round(located, 4),
+            "names": [s["name"] for s in stations],
+            "density": densities,
+        }, f, ensure_ascii=False)
+    print(f"{OUTPUT_PATH} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
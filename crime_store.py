@@ -0,0 +1,160 @@
+"""年ごとの犯罪件数の集計を府県ごとに shards/<コード>/crime_years/ に追記して保存し、年の推移を引けるようにする
+
+警察のCSVは年（認知年）ごとのファイルで公開され、過去の年のファイルは基本的に変わらない。
+fetch_crime.py はCSVファイル（URL）ごとの集計を、内容のハッシュを名前にしたファイルとして追加し、
+manifest.json に URL → 年・取得元・内容のハッシュ・集計ファイル名 を記録する。
+  - 保存済みで、取得元の最新の年より前の年のURLは確定とみなし、取得も再検証もしない
+  - それ以外（新しいURL・最新の年）は条件付きリクエストで再検証し、内容が変わったURLだけを集計し直す
+  - 書いた集計ファイルは書き換えない（内容が変わったURLは新しいファイルを追加し、参照されなくなったものを消す）
+新しい年のCSVが公開されても、ダウンロードと集計はその年のファイルだけで済む。
+ページに載らなくなった過去の年のURLも残るので、年の推移を引ける。
+
+年の値は、その年のURLごとの集計を足し合わせて作る。load_store() は対象の府県（regions.py）の
+ストアをまとめて読み込む。
+
+ファイル構成（shards/<コード>/ の下）:
+    crime_years/manifest.json        {"sources": {URL: {"year", "group", "sha256", "rows", "cube", "towns"}}}
+    crime_years/<年>_<ハッシュ>.cube   URLごとの集計キューブ（crime_cube.py の形式）
+    crime_years/<年>_<ハッシュ>.towns.json  URLごとの町丁目別の件数 {市区町村: {町丁目: 件数}}
+"""
+import json
+import os
+import re
+
+import regions
+from crime_cube import Cube
+
+STORE_DIR = "crime_years"
+MANIFEST_NAME = "manifest.json"
+
+
+def year_from_url(url):
+    """ファイル名の年（2024、令和6・R6 など）を返す（なければ None）"""
+    fname = url.split("/")[-1]
+    m = re.search(r"(?<!\d)(20\d{2})(?!\d)", fname)
+    if m:
+        return int(m.group(1))
+    m = re.search(r"(?:令和|[Rr])0?(\d{1,2})(?!\d)", fname)
+    if m:
+        return 2018 + int(m.group(1))
+    return None
+
+
+class CrimeStore:
+    """URLごとの集計の索引（manifest.json）"""
+
+    def __init__(self, root=STORE_DIR, sources=None):
+        self.root = root
+        self.sources = sources or {}
+
+    @classmethod
+    def load(cls, root=STORE_DIR):
+        """manifest.json を読み込む。なければ空のストアを返す"""
+        try:
+            with open(os.path.join(root, MANIFEST_NAME), encoding="utf-8") as f:
+                return cls(root, json.load(f)["sources"])
+        except FileNotFoundError:
+            return cls(root)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def years(self):
+        return sorted({s["year"] for s in self.sources.values()})
+
+    def latest_year(self):
+        """すべての取得元（group、府県のコード）がそろう最新の年（大阪府警だけ翌年が出ている場合はその前の年）"""
+        newest = {}
+        for s in self.sources.values():
+            newest[s["group"]] = max(newest.get(s["group"], s["year"]), s["year"])
+        return min(newest.values()) if newest else None
+
+    def needs_check(self, url, refresh=False):
+        """url を再検証する必要があるか（新しいURL・取得元の最新の年。refresh なら保存済みのすべて）"""
+        source = self.sources.get(url)
+        if source is None or refresh:
+            return True
+        newest = max(s["year"] for s in self.sources.values() if s["group"] == source["group"])
+        return source["year"] >= newest
+
+    def is_current(self, url, sha256):
+        source = self.sources.get(url)
+        return source is not None and source["sha256"] == sha256
+
+    def add(self, url, year, group, sha256, counts, towns, rows):
+        """URL の集計（{(市区町村, 手口, 月, 時間帯): 件数} と {(市区町村, 町丁目): 件数}）を追加する"""
+        os.makedirs(self.root, exist_ok=True)
+        stem = f"{year}_{sha256[:16]}"
+        cube_name, towns_name = f"{stem}.cube", f"{stem}.towns.json"
+        if not os.path.exists(os.path.join(self.root, cube_name)):
+            Cube.from_counts(counts).save(os.path.join(self.root, cube_name))
+        if not os.path.exists(os.path.join(self.root, towns_name)):
+            by_town = {}
+            for (city, town), n in sorted(towns.items()):
+                by_town.setdefault(city, {})[town] = n
+            with open(os.path.join(self.root, towns_name), "w", encoding="utf-8") as f:
+                json.dump(by_town, f, ensure_ascii=False)
+        self.sources[url] = {"year": year, "group": group, "sha256": sha256, "rows": rows,
+                             "cube": cube_name, "towns": towns_name}
+
+    def save(self):
+        """manifest.json を書き換え、どの URL からも参照されなくなった集計ファイルを消す"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, MANIFEST_NAME)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"sources": dict(sorted(self.sources.items()))}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        used = {s[k] for s in self.sources.values() for k in ("cube", "towns")}
+        for name in os.listdir(self.root):
+            if name != MANIFEST_NAME and name not in used:
+                os.remove(os.path.join(self.root, name))
+
+    @classmethod
+    def combine(cls, stores):
+        """府県ごとのストアを1つにまとめる（読み込み専用。集計ファイル名は各ストアからのパスにする）"""
+        sources = {}
+        for store in stores:
+            for url, s in store.sources.items():
+                sources[url] = dict(s, cube=os.path.join(store.root, s["cube"]),
+                                    towns=os.path.join(store.root, s["towns"]))
+        return cls("", sources)
+
+    def _of_year(self, year):
+        return [s for s in self.sources.values() if s["year"] == year]
+
+    def cube(self, year):
+        """year の集計キューブ（その年のURLの集計の合計）"""
+        counts = {}
+        for s in self._of_year(year):
+            for key, n in Cube.load(os.path.join(self.root, s["cube"])).items():
+                counts[key] = counts.get(key, 0) + n
+        return Cube.from_counts(counts)
+
+    def towns(self, year):
+        """year の町丁目別の件数 {市区町村: {町丁目: 件数}}"""
+        by_town = {}
+        for s in self._of_year(year):
+            with open(os.path.join(self.root, s["towns"]), encoding="utf-8") as f:
+                for city, towns in json.load(f).items():
+                    row = by_town.setdefault(city, {})
+                    for town, n in towns.items():
+                        row[town] = row.get(town, 0) + n
+        return {city: dict(sorted(towns.items())) for city, towns in sorted(by_town.items())}
+
+    def city_history(self, **filters):
+        """{年: {市区町村: 件数}}（filters は Cube.sum_by と同じ）"""
+        return {year: self.cube(year).sum_by("city", **filters) for year in self.years()}
+
+
+def region_root(region):
+    """府県のストアのディレクトリ（shards/<コード>/crime_years）"""
+    return region.shard(STORE_DIR)
+
+
+def load_store(targets=None):
+    """対象の府県（省略時は regions.enabled()）の年ごとの集計をまとめて読み込む。
+    何も保存されていなければ None を返す"""
+    stores = [CrimeStore.load(region_root(r)) for r in (targets or regions.enabled())]
+    store = CrimeStore.combine(stores)
+    return store if len(store) else None
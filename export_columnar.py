@@ -0,0 +1,205 @@
+"""統合済みの stations.json と city_stats.json を、地図ページ向けの列指向バイナリ（stations.bin.gz）に変換する
+
+stations.json は駅ごとにキーを繰り返している。ここでは駅ごとの値を型付き配列に、
+路線・市区町村・府県を辞書（番号）に置き換え、市区町村単位の値（犯罪件数・犯罪率・前年比・治安）は
+city_stats.json から市区町村表に1回だけ持たせる。gzip で圧縮して保存する。
+
+ファイル形式（リトルエンディアン）:
+    マジック "STNC" + ヘッダ長(uint32) + JSONヘッダ + 8バイト境界に揃えた各列の配列
+    JSONヘッダの "columns" に各列の型・バイト位置・要素数を記録する。
+    位置はヘッダ末尾の8バイト境界（data_offset）からの相対位置。
+    間取り別の家賃（rent_plans）がある場合は、"floor_plans" に間取りのラベルを持ち、
+    "rent_plans" 列に 駅数 × 間取り数 の家賃を駅ごとに並べる。
+    "crime_stats" には色分けに使う駅単位の犯罪率の統計（city_stats.json の station_stats）を持つ。
+    crime_density.json がある場合は、駅周辺の犯罪密度を "crime_density" 列（件/km²）に持つ。
+
+stations.json はデバッグ用にそのまま残す。
+"""
+import array
+import gzip
+import json
+import struct
+import sys
+
+from city_stats import NO_SAFETY, load_city_stats
+from crime_density import attach_density, load_density
+
+STATIONS_PATH = "stations.json"
+OUTPUT_PATH = "stations.bin.gz"
+
+MAGIC = b"STNC"
+HEADER = struct.Struct("<4sI")
+
+NULL_U16 = 0xFFFF
+COORD_SCALE = 1_000_000  # 緯度経度は 1e-6 度単位の整数
+RENT_SCALE = 10          # 家賃は 0.1万円単位の整数
+
+TYPECODES = {"int32": "i", "uint32": "I", "uint16": "H", "uint8": "B", "float32": "f"}
+
+
+def _dictionary(values):
+    """値の一覧（出現順）と、値→番号の辞書を返す"""
+    labels = list(dict.fromkeys(v for v in values if v is not None))
+    return labels, {v: i for i, v in enumerate(labels)}
+
+
+def encode(stations, city_stats=None):
+    """駅データのリストと市区町村の治安の表（city_stats.json）を列指向バイナリ（非圧縮）に変換する"""
+    prefectures, pref_ids = _dictionary(s["prefecture"] for s in stations)
+    lines, line_ids = _dictionary(l for s in stations for l in s["lines"])
+    city_names, city_ids = _dictionary(s.get("city") for s in stations)
+    floor_plans, _ = _dictionary(p for s in stations for p in s.get("rent_plans", ()))
+
+    # 市区町村表（治安の表にない市区町村はデータなし）
+    rows = city_stats["cities"] if city_stats else {}
+    city_rows = {c: rows.get(c, NO_SAFETY) for c in city_names}
+    nan = float("nan")
+
+    line_offsets = [0]
+    line_values = []
+    for s in stations:
+        line_values.extend(line_ids[l] for l in s["lines"])
+        line_offsets.append(len(line_values))
+
+    columns = {
+        "lat": ("int32", [round(s["lat"] * COORD_SCALE) for s in stations]),
+        "lng": ("int32", [round(s["lng"] * COORD_SCALE) for s in stations]),
+        "postal": ("uint32", [int(s["postal"]) if s.get("postal") else 0 for s in stations]),
+        "prefecture": ("uint8", [pref_ids[s["prefecture"]] for s in stations]),
+        "city": ("uint16", [city_ids[s["city"]] if s.get("city") else NULL_U16 for s in stations]),
+        "rent": ("uint16", [round(s["rent_avg"] * RENT_SCALE) if s.get("rent_avg") else NULL_U16
+                            for s in stations]),
+        "line_offsets": ("uint32", line_offsets),
+        "line_ids": ("uint16", line_values),
+        "city_crime_count": ("uint32", [city_rows[c].get("crime_count") or 0 for c in city_names]),
+        "city_crime_rate": ("float32", [city_rows[c]["crime_rate"] if city_rows[c]["crime_rate"] is not None
+                                        else nan for c in city_names]),
+        "city_crime_ci_low": ("float32", [city_rows[c]["crime_rate_ci"][0] if city_rows[c]["crime_rate_ci"]
+                                          else nan for c in city_names]),
+        "city_crime_ci_high": ("float32", [city_rows[c]["crime_rate_ci"][1] if city_rows[c]["crime_rate_ci"]
+                                           else nan for c in city_names]),
+        "city_crime_z": ("float32", [city_rows[c]["crime_z"] if city_rows[c]["crime_z"] is not None
+                                     else nan for c in city_names]),
+        "city_crime_yoy": ("float32", [city_rows[c]["crime_yoy"] if city_rows[c]["crime_yoy"] is not None
+                                       else nan for c in city_names]),
+        "city_crime_rolling": ("float32", [city_rows[c]["crime_rolling_rate"]
+                                           if city_rows[c]["crime_rolling_rate"] is not None
+                                           else nan for c in city_names]),
+    }
+    if any("crime_density" in s for s in stations):
+        columns["crime_density"] = ("float32", [s["crime_density"] if s.get("crime_density") is not None
+                                                else nan for s in stations])
+    if floor_plans:
+        columns["rent_plans"] = ("uint16", [
+            round(s["rent_plans"][p] * RENT_SCALE) if s.get("rent_plans", {}).get(p) else NULL_U16
+            for s in stations for p in floor_plans
+        ])
+
+    blobs = []
+    layout = {}
+    pos = 0
+    for name, (typ, values) in columns.items():
+        arr = array.array(TYPECODES[typ], values)
+        if sys.byteorder != "little":
+            arr.byteswap()
+        data = arr.tobytes()
+        layout[name] = {"type": typ, "offset": pos, "length": len(values)}
+        blobs.append(data + b"\0" * (-len(data) % 8))
+        pos += len(blobs[-1])
+
+    header = {
+        "count": len(stations),
+        "coord_scale": COORD_SCALE,
+        "rent_scale": RENT_SCALE,
+        "names": [s["name"] for s in stations],
+        "prefectures": prefectures,
+        "lines": lines,
+        "cities": city_names,
+        # 治安の分類は市区町村ごとに1回だけ持つ
+        "city_safety": [city_rows[c]["safety"] if c in rows else None for c in city_names],
+        "city_safety_class": [city_rows[c]["safety_class"] if c in rows else None for c in city_names],
+        "crime_stats": city_stats.get("station_stats") if city_stats else None,
+        "columns": layout,
+    }
+    if floor_plans:
+        header["floor_plans"] = floor_plans
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(HEADER.size + len(header_bytes)) % 8)
+    return HEADER.pack(MAGIC, len(header_bytes)) + header_bytes + b"".join(blobs)
+
+
+def decode(raw):
+    """列指向バイナリを駅データのリストに戻す（stations.json に治安の値を付けた形: city_stats.attach と同じ）"""
+    magic, header_len = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("列指向の駅データではありません")
+    header = json.loads(raw[HEADER.size:HEADER.size + header_len].decode("utf-8"))
+    base = HEADER.size + header_len
+
+    cols = {}
+    for name, c in header["columns"].items():
+        arr = array.array(TYPECODES[c["type"]])
+        start = base + c["offset"]
+        arr.frombytes(raw[start:start + arr.itemsize * c["length"]])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        cols[name] = arr
+
+    stations = []
+    for i, name in enumerate(header["names"]):
+        ci = cols["city"][i]
+        rent = cols["rent"][i]
+        start, end = cols["line_offsets"][i], cols["line_offsets"][i + 1]
+        s = {
+            "name": name,
+            "prefecture": header["prefectures"][cols["prefecture"][i]],
+            "lat": cols["lat"][i] / header["coord_scale"],
+            "lng": cols["lng"][i] / header["coord_scale"],
+            "lines": [header["lines"][j] for j in cols["line_ids"][start:end]],
+            "postal": f"{cols['postal'][i]:07d}" if cols["postal"][i] else "",
+            "rent_avg": rent / header["rent_scale"] if rent != NULL_U16 else None,
+            "city": header["cities"][ci] if ci != NULL_U16 else None,
+        }
+        plans = header.get("floor_plans")
+        if plans:
+            row = cols["rent_plans"][i * len(plans):(i + 1) * len(plans)]
+            s["rent_plans"] = {p: v / header["rent_scale"] for p, v in zip(plans, row) if v != NULL_U16}
+        if "crime_density" in cols:
+            d = cols["crime_density"][i]
+            s["crime_density"] = round(d, 1) if d == d else None
+        if ci != NULL_U16 and header["city_safety"][ci] is not None:
+            rate = cols["city_crime_rate"][ci]
+            low, high = cols["city_crime_ci_low"][ci], cols["city_crime_ci_high"][ci]
+            s["crime_count"] = cols["city_crime_count"][ci] if rate == rate else None
+            s["crime_rate"] = round(rate, 2) if rate == rate else None
+            s["crime_rate_ci"] = [round(low, 2), round(high, 2)] if low == low else None
+            s["crime_z"] = round(cols["city_crime_z"][ci], 3) if rate == rate else None
+            yoy, rolling = cols["city_crime_yoy"][ci], cols["city_crime_rolling"][ci]
+            s["crime_yoy"] = round(yoy, 3) if yoy == yoy else None
+            s["crime_rolling_rate"] = round(rolling, 2) if rolling == rolling else None
+            s["safety"] = header["city_safety"][ci]
+            s["safety_class"] = header["city_safety_class"][ci]
+        else:
+            s.update(NO_SAFETY)
+        stations.append(s)
+    return stations
+
+
+def load_columnar(path=OUTPUT_PATH):
+    with open(path, "rb") as f:
+        return decode(gzip.decompress(f.read()))
+
+
+if __name__ == "__main__":
+    with open(STATIONS_PATH, encoding="utf-8") as f:
+        stations = json.load(f)
+    city_stats = load_city_stats()
+    if city_stats is None:
+        print("city_stats.json がないため治安はデータなしになります（city_stats.py を実行してください）")
+    if not attach_density(stations, load_density()):
+        print("crime_density.json がないか駅の並びが違うため、犯罪密度は含めません（crime_density.py を実行してください）")
+    raw = encode(stations, city_stats)
+    packed = gzip.compress(raw, compresslevel=9, mtime=0)
+    with open(OUTPUT_PATH, "wb") as f:
+        f.write(packed)
+    print(f"{OUTPUT_PATH} に保存しました（{len(stations)}駅, {len(raw):,} → {len(packed):,} バイト）")
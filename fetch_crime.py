@@ -1,108 +1,239 @@
-"""大阪府警・兵庫県警の犯罪オープンデータCSVをダウンロードし、市区町村別の件数を集計する"""
+"""府県警の犯罪オープンデータCSVをダウンロードし、市区町村 × 手口 × 月 × 時間帯 と町丁目別の件数を集計する
+
+CSVの一覧は府県のアダプタ（regions.py）から受け取る。CSVごとの集計は府県ごとに
+shards/<コード>/crime_years/ に年ごとに追記し（crime_store.py）、新しいCSVと最新の年のCSVだけを
+取得・集計する。crime_cube.bin・crime_by_city.json・crime_by_town.json（全府県がそろう最新の年）は
+combine_shards.py が作る。
+
+    python3 fetch_crime.py                   # 対象の府県すべて
+    python3 fetch_crime.py --region osaka    # 指定した府県だけ
+    python3 fetch_crime.py --refresh-years   # 確定とみなした過去の年のCSVも再検証する
+"""
+import argparse
+import codecs
+import collections
 import csv
-import io
-import json
-import time
-import urllib.request
-import re
-
-# --- 大阪府警 ---
-OSAKA_BASE = "https://www.police.pref.osaka.lg.jp"
-
-def get_osaka_csv_urls():
-    url = f"{OSAKA_BASE}/seikatsu/21247.html"
-    with urllib.request.urlopen(url) as res:
-        html = res.read().decode("utf-8")
-    return [f"https:{m}" for m in re.findall(r'href="(//.*?\.csv)"', html)]
-
-# --- 兵庫県警 ---
-# 兵庫県のオープンデータは兵庫県オープンデータサイトから取得
-HYOGO_CSV_URLS = [
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogo_2024hittakuri.csv",
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogo_2024syazyounerai.csv",
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogp_2024buhinnerai.csv",
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogo_2024zidouhanbaikinerai.csv",
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogo_2024zidousyatou.csv",
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogo_2024ootobaitou.csv",
-    "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents/hyogo_2024zitensyatou.csv",
-]
+import itertools
+import sys
+
+import crime_cube
+import crime_store
+import fetcher
+import http_cache
+import regions
+import telemetry
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# 文字コード・デリミタの判定に使う先頭部分のバイト数
+SNIFF_BYTES = 64 * 1024
+# BOM付きUTF-8 or Shift-JIS（cp932 は shift_jis の上位互換）
+ENCODINGS = ["utf-8-sig", "cp932"]
+
+def detect_encoding(prefix):
+    """先頭部分のバイト列から文字コードを判定する（判定できなければ None）"""
+    for enc in ENCODINGS:
+        try:
+            # 末尾で途切れたマルチバイト文字はエラーにしない
+            codecs.getincrementaldecoder(enc)().decode(prefix, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return None
+
+def iter_lines(chunks):
+    """バイト列のチャンクを逐次デコードし、改行付きの行単位で返す"""
+    chunks = iter(chunks)
+    prefix = b""
+    for chunk in chunks:
+        prefix += chunk
+        if len(prefix) >= SNIFF_BYTES:
+            break
+    enc = detect_encoding(prefix)
+    if enc is None:
+        raise ValueError("文字コードを判定できません")
+    decoder = codecs.getincrementaldecoder(enc)()
+
+    pending = decoder.decode(prefix)
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    *lines, pending = pending.split("\n")
+    for line in lines:
+        yield line + "\n"
+    if pending:
+        yield pending
 
 def download_csv(url):
-    """CSVをダウンロードし、行リストで返す"""
-    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    try:
-        with urllib.request.urlopen(req, timeout=30) as res:
-            raw = res.read()
-            # BOM付きUTF-8 or Shift-JIS
-            for enc in ["utf-8-sig", "shift_jis", "cp932"]:
-                try:
-                    text = raw.decode(enc)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            else:
-                return []
-            # デリミタ自動判定（タブ or カンマ）
-            first_line = text.split("\n")[0]
-            delimiter = "\t" if "\t" in first_line else ","
-            reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
-            return list(reader)
-    except Exception as e:
-        print(f"    ダウンロード失敗: {e}")
-        return []
-
-def count_by_city(rows):
-    """市区町村（発生地）ごとの件数をカウント"""
+    """CSVをストリーミングでダウンロードし、行（リスト）を順に返す。先頭行はヘッダ"""
+    chunks = http_cache.iter_chunks(url, "police", headers=HEADERS)
+    lines = iter_lines(chunks)
+    first_line = next(lines, "")
+    # デリミタ自動判定（タブ or カンマ）
+    delimiter = "\t" if "\t" in first_line else ","
+    return csv.reader(itertools.chain([first_line], lines), delimiter=delimiter)
+
+# カラム名が微妙に違う場合に対応（候補を先頭から順に探す）
+COLUMNS = {
+    "city": ["市区町村（発生地）", "市区町村(発生地)", "市区町村"],
+    "town": ["町丁目（発生地）", "町丁目(発生地)", "町丁目"],
+    "offence": ["手口"],
+    "date": ["発生年月日（始期）", "発生年月日(始期)", "発生年月日"],
+    "hour": ["発生時（始期）", "発生時(始期)", "発生時"],
+}
+
+# 「手口」列がないCSVはファイル名から手口を補う
+OFFENCE_BY_FILENAME = {
+    "hittakuri": "ひったくり",
+    "syazyounerai": "車上ねらい",
+    "buhinnerai": "部品ねらい",
+    "zidouhanbaikinerai": "自販機ねらい",
+    "zidousyatou": "自動車盗",
+    "ootobaitou": "オートバイ盗",
+    "zitensyatou": "自転車盗",
+}
+
+def offence_from_url(url):
+    fname = url.split("/")[-1]
+    for key, offence in OFFENCE_BY_FILENAME.items():
+        if key in fname:
+            return offence
+    return crime_cube.UNKNOWN
+
+def find_columns(header):
+    """ヘッダから各項目の列番号を求める（見つからない項目は None）"""
+    cols = {}
+    for name, candidates in COLUMNS.items():
+        cols[name] = next((header.index(c) for c in candidates if c in header), None)
+    return cols
+
+# counts: {(市区町村, 手口, 月, 時間帯): 件数}, towns: {(市区町村, 町丁目): 件数},
+# years: {発生年: 件数}（ファイル名に年がない場合に使う）, rows: 行数
+CsvCounts = collections.namedtuple("CsvCounts", ["counts", "towns", "years", "rows"])
+
+def count_by_city(rows, default_offence=crime_cube.UNKNOWN):
+    """(市区町村, 手口, 月, 時間帯) ごとの件数と (市区町村, 町丁目) ごとの件数をカウントし、CsvCounts を返す"""
+    header = next(rows, None)
+    if header is None:
+        return CsvCounts({}, {}, {}, 0)
+    cols = find_columns(header)
+    if cols["city"] is None:
+        return CsvCounts({}, {}, {}, 0)
+
+    def cell(row, name):
+        i = cols[name]
+        return row[i] if i is not None and i < len(row) else ""
+
     counts = {}
+    towns = {}
+    years = {}
+    n = 0
     for row in rows:
-        # カラム名が微妙に違う場合に対応
-        city = None
-        for key in ["市区町村（発生地）", "市区町村(発生地)", "市区町村"]:
-            if key in row:
-                city = row[key]
-                break
-        if city:
-            counts[city] = counts.get(city, 0) + 1
-    return counts
+        if not row:
+            continue
+        n += 1
+        city = cell(row, "city")
+        if not city:
+            continue
+        date = cell(row, "date")
+        key = (
+            city,
+            cell(row, "offence") or default_offence,
+            crime_cube.month_label(date),
+            crime_cube.hour_band_label(cell(row, "hour")),
+        )
+        counts[key] = counts.get(key, 0) + 1
+        year = date[:4]
+        years[year] = years.get(year, 0) + 1
+        town = cell(row, "town")
+        if town:
+            towns[(city, town)] = towns.get((city, town), 0) + 1
+    return CsvCounts(counts, towns, years, n)
+
+def file_year(url, result):
+    """CSVの年（認知年）。ファイル名になければ、最も多い発生年月日の年"""
+    year = crime_store.year_from_url(url)
+    if year is None:
+        known = {y: n for y, n in result.years.items() if y.isdigit()}
+        if known:
+            year = int(max(known, key=known.get))
+    return year
+
+def aggregate_csv(url):
+    """CSVを受信しながら1行ずつ集計する（全行をメモリに保持しない）"""
+    return count_by_city(download_csv(url), offence_from_url(url))
 
 # --- メイン処理 ---
-print("=== 大阪府警 犯罪オープンデータ ===")
-osaka_urls = get_osaka_csv_urls()
-print(f"  CSVファイル数: {len(osaka_urls)}")
+def update_region(region, refresh_years=False):
+    """府県のCSVのうち新しいもの・変わったものを集計して、府県のストアに追記する。
+    取得・集計できなかったCSVの数を返す"""
+    print(f"=== {region.police} 犯罪オープンデータ ===")
+    urls = region.crime_csv_urls()
+    print(f"  CSVファイル数: {len(urls)}")
 
-all_counts = {}
+    store = crime_store.CrimeStore.load(crime_store.region_root(region))
+    check = [url for url in urls if store.needs_check(url, refresh_years)]
+    print(f"  保存済みの年: {', '.join(map(str, store.years())) or 'なし'}"
+          f"（確定した年のCSV {len(urls) - len(check)}件は取得しない）")
 
-for url in osaka_urls:
-    fname = url.split("/")[-1]
-    print(f"  ダウンロード中: {fname}")
-    rows = download_csv(url)
-    print(f"    {len(rows)}件")
-    counts = count_by_city(rows)
-    for city, cnt in counts.items():
-        all_counts[city] = all_counts.get(city, 0) + cnt
-    time.sleep(0.5)
-
-print(f"\n=== 兵庫県警 犯罪オープンデータ ===")
-for url in HYOGO_CSV_URLS:
-    fname = url.split("/")[-1]
-    print(f"  ダウンロード中: {fname}")
-    rows = download_csv(url)
+    # 新しいCSV・最新の年のCSVは条件付きリクエストで再検証し、内容が変わったものだけ集計する
+    changed = {}
+    failed = errors = 0
+    for url, sha256, e in fetcher.map_ordered(
+            lambda u: http_cache.digest(u, "police", headers=HEADERS), check):
+        if e is not None:
+            print(f"  {url.split('/')[-1]}: ダウンロード失敗: {e}")
+            telemetry.error("download_csv", e, url=url)
+            failed += 1
+            errors += 1
+        elif not store.is_current(url, sha256):
+            changed[url] = sha256
+    print(f"  確認 {len(check)}件, 新規・変更 {len(changed)}件")
+
+    # 本文は上でキャッシュ済み
+    rows = with_city = 0
+    for url, result, e in fetcher.map_ordered(aggregate_csv, changed):
+        fname = url.split("/")[-1]
+        if e is not None:
+            print(f"  {fname}: 集計失敗: {e}")
+            telemetry.error("aggregate_csv", e, url=url)
+            failed += 1
+            errors += 1
+            continue
+        # 市区町村の列が空の行は集計に入らない
+        located = sum(result.counts.values())
+        telemetry.event("rows", name=fname, url=url, rows=result.rows, with_city=located)
+        rows += result.rows
+        with_city += located
+        year = file_year(url, result)
+        if result.rows and year is not None:
+            print(f"  {fname}: {year}年 {result.rows}件")
+            store.add(url, year, region.code, changed[url], result.counts, result.towns, result.rows)
+        else:
+            print(f"  {fname}: スキップ（取得不可・年が不明）")
+            telemetry.event("error", op="aggregate_csv", type="NoRows", message="行または年がありません", url=url)
+            failed += 1
+    store.save()
+    telemetry.join(f"{region.code}:CSV", len(urls) - failed, len(urls))
     if rows:
-        print(f"    {len(rows)}件")
-        counts = count_by_city(rows)
-        for city, cnt in counts.items():
-            all_counts[city] = all_counts.get(city, 0) + cnt
-    else:
-        print("    スキップ（取得不可）")
-    time.sleep(0.5)
-
-# ソートして出力
-result = dict(sorted(all_counts.items(), key=lambda x: -x[1]))
-print(f"\n合計: {len(result)}市区町村, {sum(result.values())}件")
-print("\nトップ10:")
-for city, cnt in list(result.items())[:10]:
-    print(f"  {city}: {cnt}件")
-
-with open("crime_by_city.json", "w", encoding="utf-8") as f:
-    json.dump(result, f, ensure_ascii=False, indent=2)
-print("\ncrime_by_city.json に保存しました")
+        telemetry.join(f"{region.code}:市区町村あり", with_city, rows)
+    print(f"  {store.root}/ に保存しました（{', '.join(map(str, store.years())) or 'なし'}年）\n")
+    return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    regions.add_argument(parser)
+    parser.add_argument("--refresh-years", action="store_true",
+                        help="確定とみなした過去の年のCSVも再検証する")
+    args = parser.parse_args()
+
+    # 府県警はホストが異なるが、府県ごとの並行実行は pipeline.py が行う
+    # 取得できなかったCSVがあれば失敗として終了し、pipeline.py が欠けた件数で combine しないようにする
+    # （集計できたCSVはストアに追記済みなので、再実行で取得し直すのは失敗したCSVだけ）
+    errors = sum(update_region(region, args.refresh_years) for region in regions.selected(parser, args))
+    if errors:
+        print(f"取得・集計できなかったCSV: {errors}件")
+        sys.exit(1)
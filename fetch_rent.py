@@ -1,147 +1,246 @@
-"""SUUMOの路線ページから駅別の平均家賃を取得する"""
+"""SUUMOの路線ページから駅別の平均家賃を取得する
+
+路線ページのHTMLは html.parser によるイベント駆動の抽出器（RentTableParser）に
+チャンク単位で渡し、表の行ごとに駅名・家賃相場・間取り別の家賃相場を取り出す。
+ページ全体を文字列にして正規表現で探すことはしない。
+
+取得はスレッド（fetcher.map_ordered）で並行して行い、受信したチャンクはその都度キュー
+（multiprocessing.Manager）でプロセスプールの抽出器に渡す。ページ全体を受信し終えるのを待たずに
+抽出が進み、その間も次の路線の取得は進む。
+
+路線ページは府県（regions.py）ごとに取得し、駅 × 間取りの家賃（掲載件数付き、路線間の重複は件数で
+重み付けした平均）を shards/<コード>/rent_matrix.bin に、間取りを問わない全体の相場を
+shards/<コード>/rent_by_station.json に保存する（府県をまたぐ駅は combine_shards.py でまとめる）。
+
+    python3 fetch_rent.py                  # 対象の府県すべて
+    python3 fetch_rent.py --region hyogo   # 指定した府県だけ
+"""
+import argparse
+import codecs
+import concurrent.futures
 import json
+import multiprocessing
+import os
 import re
-import time
-import urllib.request
+import sys
+import unicodedata
+from html.parser import HTMLParser
 
-SUUMO_BASE = "https://suumo.jp"
+import fetcher
+import http_cache
+import regions
+import telemetry
+from rent_matrix import ALL, MATRIX_PATH, RentMatrix
 
-# 大阪府・兵庫県の路線URL
-ROUTE_URLS = {
-    "osaka": [
-        "/chintai/soba/osaka/en_JRosakakanjosen/",
-        "/chintai/soba/osaka/en_JRtokaidohonsen/",
-        "/chintai/soba/osaka/en_JRkatamachisen/",
-        "/chintai/soba/osaka/en_JRsakurajimasen/",
-        "/chintai/soba/osaka/en_JRkansaihonsen/",
-        "/chintai/soba/osaka/en_JRhanwasen/",
-        "/chintai/soba/osaka/en_JRkansaikukosen/",
-        "/chintai/soba/osaka/en_JRfukuchiyamasen/",
-        "/chintai/soba/osaka/en_JRtozaisen/",
-        "/chintai/soba/osaka/en_JRosakahigashisen/",
-        "/chintai/soba/osaka/en_chikatetsumidosujisen/",
-        "/chintai/soba/osaka/en_chikatetsutanimachisen/",
-        "/chintai/soba/osaka/en_chikatetsuyotsubashisen/",
-        "/chintai/soba/osaka/en_chikatetsuchuosen/",
-        "/chintai/soba/osaka/en_chikatetsusennichimaesen/",
-        "/chintai/soba/osaka/en_chikatetsusakaisujisen/",
-        "/chintai/soba/osaka/en_nagahoritsurumiryokuchisen/",
-        "/chintai/soba/osaka/en_chikatetsuimazatosujisen/",
-        "/chintai/soba/osaka/en_kitaosakakyuko/",
-        "/chintai/soba/osaka/en_nankaihonsen/",
-        "/chintai/soba/osaka/en_nankaikoyasen/",
-        "/chintai/soba/osaka/en_nankaisembokusen/",
-        "/chintai/soba/osaka/en_hankyukobesen/",
-        "/chintai/soba/osaka/en_hankyutakarazukasen/",
-        "/chintai/soba/osaka/en_hankyuminosen/",
-        "/chintai/soba/osaka/en_hankyusenrisen/",
-        "/chintai/soba/osaka/en_hankyukyotosen/",
-        "/chintai/soba/osaka/en_hanshinhonsen/",
-        "/chintai/soba/osaka/en_hanshindentetsuhanshinnambasen/",
-        "/chintai/soba/osaka/en_keihanhonsen/",
-        "/chintai/soba/osaka/en_keihankatanosen/",
-        "/chintai/soba/osaka/en_keihannakanoshimasen/",
-        "/chintai/soba/osaka/en_kintetsunarasen/",
-        "/chintai/soba/osaka/en_kintetsuosakasen/",
-        "/chintai/soba/osaka/en_kintetsuminamiosakasen/",
-        "/chintai/soba/osaka/en_kintetsukeihanna/",
-        "/chintai/soba/osaka/en_osakamonorail/",
-        "/chintai/soba/osaka/en_nankoporttownsen/",
-        "/chintai/soba/osaka/en_nosedentetsumyokensen/",
-    ],
-    "hyogo": [
-        "/chintai/soba/hyogo/en_JRtokaidohonsen/",
-        "/chintai/soba/hyogo/en_JRsanyohonsen/",
-        "/chintai/soba/hyogo/en_JRakosen/",
-        "/chintai/soba/hyogo/en_JRkakogawasen/",
-        "/chintai/soba/hyogo/en_JRfukuchiyamasen/",
-        "/chintai/soba/hyogo/en_JRsaninhonsen/",
-        "/chintai/soba/hyogo/en_JRbantansen/",
-        "/chintai/soba/hyogo/en_JRtozaisen/",
-        "/chintai/soba/hyogo/en_hankyukobesen/",
-        "/chintai/soba/hyogo/en_hankyuitamisen/",
-        "/chintai/soba/hyogo/en_hankyuimazusen/",
-        "/chintai/soba/hyogo/en_hankyukoyosen/",
-        "/chintai/soba/hyogo/en_hankyutakarazukasen/",
-        "/chintai/soba/hyogo/en_hanshinhonsen/",
-        "/chintai/soba/hyogo/en_hanshindentetsuhanshinnambasen/",
-        "/chintai/soba/hyogo/en_hanshimmukogawasen/",
-        "/chintai/soba/hyogo/en_kobedentetsuarimasen/",
-        "/chintai/soba/hyogo/en_kobedentetsusandasen/",
-        "/chintai/soba/hyogo/en_kobedentetsukoentoshisen/",
-        "/chintai/soba/hyogo/en_kobedentetsuaosen/",
-        "/chintai/soba/hyogo/en_seishinyamatesen/",
-        "/chintai/soba/hyogo/en_kobeshieichikatetsukaigansen/",
-        "/chintai/soba/hyogo/en_sanyodentetsuhonsen/",
-        "/chintai/soba/hyogo/en_portislandsen/",
-        "/chintai/soba/hyogo/en_rokkoislandsen/",
-        "/chintai/soba/hyogo/en_nosedentetsumyokensen/",
-    ],
+SUUMO_BASE = "https://suumo.jp"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
 }
+PARSE_WORKERS = os.cpu_count() or 1
+
+# 表の見出しのうち間取りとみなすもの（「ワンルーム」「1K」「2LDK」「3LDK/4K〜」など）
+FLOOR_PLAN_RE = re.compile(r"^(ワンルーム|\d+S?L?D?K〜?)$")
+RENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*万円")
+LISTINGS_RE = re.compile(r"(\d[\d,]*)\s*件")
+
+def floor_plan_label(text):
+    """見出しの文字列が間取りなら正規化したラベルを、そうでなければ None を返す"""
+    label = re.sub(r"\s+", "", unicodedata.normalize("NFKC", text)).replace("~", "〜")
+    parts = re.split(r"[/・]", label)
+    if label and all(FLOOR_PLAN_RE.match(p) for p in parts):
+        return label
+    return None
+
+
+class RentTableParser(HTMLParser):
+    """路線ページの表から駅ごとの家賃相場を取り出す
+
+    <tr> の中の最初の <a> を駅名、「X.X万円」を含むセルを家賃、「N件」を掲載件数とする。
+    見出し行（<a> がなく間取りの見出しを持つ行）があれば、同じ列の家賃・件数をその間取りのものとする。
+    全体の相場（rent_avg）は間取りの列でないセルの家賃とし、そのセルがなければ間取り別の家賃を
+    掲載件数で重み付けした平均とする（rent_matrix.RentMatrix.mean_over と同じ重み）。
+    抽出結果は stations に {"name", "rent_avg", "listings", "floor_plans": {間取り: 家賃},
+    "plan_listings": {間取り: 件数}} として溜まる（件数が載っていなければ None / 空）。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stations = []
+        self.columns = []    # 列番号 → 間取り（間取りの列でなければ None）
+        self._row = None     # 行内のセルの文字列
+        self._cell = None    # セル内の文字列の断片
+        self._link = None    # 最初の <a> の文字列の断片
+        self._name = None
+        self._in_link = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row, self._cell, self._name, self._link = [], None, None, None
+        elif self._row is None:
+            return
+        elif tag in ("td", "th"):
+            self._cell = []
+        elif tag == "a" and self._name is None and self._link is None:
+            self._link = []
+            self._in_link = True
+
+    def handle_endtag(self, tag):
+        if self._row is None:
+            return
+        if tag == "a" and self._in_link:
+            self._in_link = False
+            self._name = "".join(self._link).strip() or None
+        elif tag in ("td", "th") and self._cell is not None:
+            self._row.append("".join(self._cell).strip())
+            self._cell = None
+        elif tag == "tr":
+            self._end_row()
+            self._row = None
 
-def fetch_route_page(path):
-    """路線ページをスクレイピングし、駅名と家賃相場を返す"""
-    url = SUUMO_BASE + path
-    req = urllib.request.Request(url, headers={
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    })
-    with urllib.request.urlopen(req, timeout=30) as res:
-        html = res.read().decode("utf-8")
-
-    stations = []
-    # SUUMOのテーブル行から駅名と家賃を抽出
-    # <tr>内: <a href="...">駅名</a> ... <span ...>X.X</span>万円
-    tr_blocks = re.findall(r'<tr[^>]*>(.*?)</tr>', html, re.DOTALL)
-    for tr in tr_blocks:
-        name_match = re.search(r'<a[^>]+>([^<]+)</a>', tr)
-        rent_match = re.search(r'<span[^>]*>([\d.]+)</span>\s*万円', tr)
-        if name_match and rent_match:
-            name = name_match.group(1).strip()
-            stations.append({
-                "name": name,
-                "rent_avg": float(rent_match.group(1)),
+    def handle_data(self, data):
+        if self._row is None:
+            return
+        if self._in_link:
+            self._link.append(data)
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _end_row(self):
+        if self._cell is not None:
+            self._row.append("".join(self._cell).strip())
+        if self._name is None:
+            labels = [floor_plan_label(c) for c in self._row]
+            if any(labels):
+                self.columns = labels
+            return
+
+        rent_avg = listings = None
+        floor_plans, plan_listings = {}, {}
+        for j, cell in enumerate(self._row):
+            plan = self.columns[j] if j < len(self.columns) else None
+            count = LISTINGS_RE.search(cell)
+            if count:
+                n = int(count.group(1).replace(",", ""))
+                if plan:
+                    plan_listings[plan] = n
+                elif listings is None:
+                    listings = n
+            m = RENT_RE.search(cell)
+            if not m:
+                continue
+            value = float(m.group(1))
+            if plan:
+                floor_plans[plan] = value
+            elif rent_avg is None:
+                rent_avg = value
+        if rent_avg is None and floor_plans:
+            weights = {p: plan_listings.get(p) or 1 for p in floor_plans}
+            rent_avg = round(sum(floor_plans[p] * w for p, w in weights.items()) / sum(weights.values()), 1)
+        if rent_avg is not None:
+            if listings is None and plan_listings:
+                listings = sum(plan_listings.values())
+            self.stations.append({
+                "name": self._name,
+                "rent_avg": rent_avg,
+                "listings": listings,
+                "floor_plans": floor_plans,
+                "plan_listings": plan_listings,
             })
-    return stations
 
-# --- メイン処理 ---
-all_rents = {}  # key: 駅名, value: {"rent_avg": X.X, ...}
 
-for pref, routes in ROUTE_URLS.items():
-    print(f"\n=== {pref} ===")
-    for route_path in routes:
+def extract_rents(chunks):
+    """HTMLのバイト列のチャンクを順に抽出器に渡し、駅ごとの家賃のリストを返す"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = RentTableParser()
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.stations
+
+
+def extract_queued(queue):
+    """キューに届いたチャンクを届いた順に抽出器に渡す（プロセスプールで実行する。None で終わり）"""
+    return extract_rents(iter(queue.get, None))
+
+
+def stream_route_page(path, pool, manager):
+    """路線ページを受信しながらチャンクをプロセスプールの抽出器に渡し、抽出の Future を返す"""
+    queue = manager.Queue()
+    future = pool.submit(extract_queued, queue)
+    try:
+        # SUUMOへの間隔は fetcher.HOST_INTERVALS で制御し、負荷をかけない
+        for chunk in http_cache.iter_chunks(SUUMO_BASE + path, "suumo", headers=HEADERS):
+            queue.put(chunk)
+    finally:
+        # 受信に失敗しても抽出器を終わらせる（途中までの抽出結果は呼び出し側で捨てる）
+        queue.put(None)
+    return future
+
+
+# --- メイン処理 ---
+def fetch_region(region, pool, manager):
+    """府県の路線ページを取得・抽出し、(駅名, 間取り, 家賃, 掲載件数) の行のリストと
+    取得・抽出できなかったページ数を返す"""
+    print(f"\n=== {region.prefecture} ===")
+    rows = []  # 同じ駅の重複は RentMatrix が重み付き平均にまとめる
+    paths = list(region.suumo_routes)
+    parsed = fetcher.map_ordered(lambda path: stream_route_page(path, pool, manager), paths)
+    pages = 0
+    for route_path, future, e in parsed:
         route_name = route_path.split("/")[-2]
-        print(f"  [{route_name}] ", end="", flush=True)
-        try:
-            stations = fetch_route_page(route_path)
-            print(f"{len(stations)}駅")
-            for s in stations:
-                name = s["name"]
-                if name in all_rents:
-                    existing = all_rents[name]
-                    existing["rent_sum"] += s["rent_avg"]
-                    existing["rent_count"] += 1
-                    existing["rent_avg"] = round(existing["rent_sum"] / existing["rent_count"], 1)
-                else:
-                    all_rents[name] = {
-                        "name": name,
-                        "rent_avg": s["rent_avg"],
-                        "rent_sum": s["rent_avg"],
-                        "rent_count": 1,
-                    }
-        except Exception as e:
-            print(f"エラー: {e}")
-        time.sleep(1)  # SUUMOに負荷をかけない
-
-# 出力用に整形
-result = {}
-for name, data in sorted(all_rents.items()):
-    result[name] = data["rent_avg"]
-
-print(f"\n合計: {len(result)}駅の家賃データ取得")
-print("\nサンプル（最初の10件）:")
-for name, rent in list(result.items())[:10]:
-    print(f"  {name}: {rent}万円")
-
-with open("rent_by_station.json", "w", encoding="utf-8") as f:
-    json.dump(result, f, ensure_ascii=False, indent=2)
-print("\nrent_by_station.json に保存しました")
+        if e is None:
+            try:
+                stations = future.result()
+            except Exception as parse_error:
+                e = parse_error
+        if e is not None:
+            print(f"  [{route_name}] エラー: {e}")
+            telemetry.error("route_page", e, url=SUUMO_BASE + route_path)
+            continue
+        with_plans = sum(1 for s in stations if s["floor_plans"])
+        print(f"  [{route_name}] {len(stations)}駅（間取り別 {with_plans}駅）")
+        telemetry.event("rows", name=route_name, url=SUUMO_BASE + route_path, rows=len(stations),
+                        with_plans=with_plans)
+        if stations:
+            pages += 1
+        for s in stations:
+            rows.append((s["name"], ALL, s["rent_avg"], s["listings"]))
+            for plan, rent in s["floor_plans"].items():
+                rows.append((s["name"], plan, rent, s["plan_listings"].get(plan)))
+    # 駅が1つも取れないページ（HTMLの構造が変わったなど）も取得できなかったものとして数える
+    telemetry.join(f"{region.code}:路線ページ", pages, len(paths))
+    return rows, len(paths) - pages
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    regions.add_argument(parser)
+    args = parser.parse_args()
+
+    with multiprocessing.Manager() as manager, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=PARSE_WORKERS) as pool:
+        incomplete = []
+        for region in regions.selected(parser, args):
+            rows, failed = fetch_region(region, pool, manager)
+            if failed:
+                # 駅が欠けたシャードを書くと、combine_shards.py が最上位の家賃データを欠けたまま上書きする
+                print(f"\n{region.prefecture}: {failed}ページを取得・抽出できなかったため保存しません")
+                incomplete.append(region.code)
+                continue
+            matrix = RentMatrix.from_rows(rows)
+            os.makedirs(region.shard_dir(), exist_ok=True)
+            matrix_path = region.shard(MATRIX_PATH)
+            matrix.save(matrix_path)
+            result = matrix.column(ALL)
+
+            print(f"\n合計: {len(result)}駅の家賃データ取得（間取り: {'・'.join(matrix.plans[1:]) or 'なし'}）")
+            print("\nサンプル（最初の10件）:")
+            for name, rent in list(result.items())[:10]:
+                print(f"  {name}: {rent}万円")
+
+            result_path = region.shard("rent_by_station.json")
+            with open(result_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"\n{result_path}, {matrix_path} に保存しました")
+    if incomplete:
+        sys.exit(1)
@@ -1,35 +1,57 @@
-"""阪神圏（大阪府・兵庫県）の全駅データをHeartRails Express APIから取得してJSONに保存する"""
+"""府県ごとの全駅データをHeartRails Express APIから取得してJSONに保存する
+（府県ごとに shards/<コード>/stations_raw.json に保存し、combine_shards.py でまとめる。統合は merge_data.py）
+路線ごとの駅の並び（APIが返す路線の順、他の府県の駅も含む）は shards/<コード>/line_routes.json に保存し、
+まとめたものを commute.py で使う
+
+    python3 fetch_stations.py                  # 対象の府県すべて（regions.py）
+    python3 fetch_stations.py --region osaka   # 指定した府県だけ
+"""
+import argparse
 import json
-import time
-import urllib.request
+import os
+import sys
 import urllib.parse
 
+import fetcher
+import http_cache
+import regions
+import telemetry
+
 API_BASE = "http://express.heartrails.com/api/json"
-PREFECTURES = ["大阪府", "兵庫県"]
 
 def api_get(params):
     url = f"{API_BASE}?{urllib.parse.urlencode(params)}"
-    with urllib.request.urlopen(url) as res:
-        return json.loads(res.read())
-
-# 1. 大阪府+兵庫県の全路線を取得（重複排除）
-print("路線一覧を取得中...")
-lines = set()
-for pref in PREFECTURES:
-    data = api_get({"method": "getLines", "prefecture": pref})
-    lines.update(data["response"]["line"])
-    time.sleep(0.3)
-lines = sorted(lines)
-print(f"  {len(lines)}路線")
-
-# 2. 各路線の駅を取得（重複は駅名+座標で排除、路線情報は配列で保持）
-stations = {}  # key: "駅名_lat_lng"
-for i, line in enumerate(lines):
-    print(f"  [{i+1}/{len(lines)}] {line}")
-    try:
-        data = api_get({"method": "getStations", "line": line})
+    return json.loads(http_cache.fetch(url, "heartrails").body)
+
+def get_lines(pref):
+    return api_get({"method": "getLines", "prefecture": pref})
+
+def get_stations(line):
+    return api_get({"method": "getStations", "line": line})
+
+def fetch_region(region):
+    """府県の駅（名前順）と {路線: [[駅名, 緯度, 経度, 都道府県], ...]}（路線の順）と取得できなかった路線のリストを返す"""
+    # 1. 府県の全路線を取得
+    print(f"=== {region.prefecture} ===")
+    print("路線一覧を取得中...")
+    lines = sorted(get_lines(region.prefecture)["response"]["line"])
+    print(f"  {len(lines)}路線")
+
+    # 2. 各路線の駅を取得（重複は駅名+座標で排除、路線情報は配列で保持）
+    stations = {}  # key: "駅名_lat_lng"
+    routes = {}    # 路線 → [[駅名, 緯度, 経度, 都道府県], ...]（路線の順）
+    for i, (line, data, e) in enumerate(fetcher.map_ordered(get_stations, lines)):
+        print(f"  [{i+1}/{len(lines)}] {line}")
+        if e is not None:
+            print(f"    エラー: {e}")
+            telemetry.error("get_stations", e, line=line)
+            continue
+        telemetry.event("rows", name=line, rows=len(data["response"]["station"]))
+        # 府県をまたぐ路線の並びは combine_shards.py で対象の府県の駅に絞るので、他の府県の駅も残す
+        routes[line] = [[s["name"], float(s["y"]), float(s["x"]), s["prefecture"]]
+                        for s in data["response"]["station"]]
         for s in data["response"]["station"]:
-            if s["prefecture"] not in PREFECTURES:
+            if s["prefecture"] != region.prefecture:
                 continue
             key = f"{s['name']}_{s['y']}_{s['x']}"
             if key in stations:
@@ -44,16 +66,35 @@ for i, line in enumerate(lines):
                     "lines": [line],
                     "postal": s.get("postal", ""),
                 }
-    except Exception as e:
-        print(f"    エラー: {e}")
-    time.sleep(0.3)
 
-# 3. リストに変換して名前順ソート
-result = sorted(stations.values(), key=lambda s: s["name"])
-print(f"\n合計: {len(result)}駅（大阪府+兵庫県・重複排除済み）")
+    telemetry.join(f"{region.code}:路線", len(routes), len(lines))
+
+    # 3. リストに変換して名前順ソート
+    failed = [line for line in lines if line not in routes]
+    return sorted(stations.values(), key=lambda s: s["name"]), routes, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    regions.add_argument(parser)
+    args = parser.parse_args()
 
-# 4. JSON保存
-with open("stations.json", "w", encoding="utf-8") as f:
-    json.dump(result, f, ensure_ascii=False, indent=2)
+    incomplete = []
+    for region in regions.selected(parser, args):
+        result, routes, failed = fetch_region(region)
+        if failed:
+            # 駅が欠けたシャードを書くと、combine_shards.py が最上位の stations_raw.json を欠けたまま上書きする
+            print(f"\n{region.prefecture}: {len(failed)}路線を取得できなかったため保存しません（{'、'.join(failed)}）\n")
+            incomplete.append(region.code)
+            continue
+        print(f"\n合計: {len(result)}駅（{region.prefecture}・重複排除済み）")
 
-print("stations.json に保存しました")
+        # 4. JSON保存
+        os.makedirs(region.shard_dir(), exist_ok=True)
+        stations_path, routes_path = region.shard("stations_raw.json"), region.shard("line_routes.json")
+        with open(stations_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        with open(routes_path, "w", encoding="utf-8") as f:
+            json.dump(routes, f, ensure_ascii=False, indent=1)
+        print(f"{stations_path}, {routes_path} に保存しました\n")
+    if incomplete:
+        sys.exit(1)
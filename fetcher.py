@@ -0,0 +1,113 @@
+"""取得スクリプト共通の並行取得エンジン
+
+ホストごとのトークンバケットでリクエスト間隔を制御しつつ、スレッドプールで並行に取得する。
+異なるホストへのリクエストは並行に進み、同じホストへは HOST_INTERVALS の間隔が守られる。
+一時的なエラー（接続失敗・タイムアウト・429/5xx）は指数バックオフで再試行する。
+リクエストごとの応答時間・再試行回数・失敗は telemetry.py に request イベントとして記録する。
+"""
+import concurrent.futures
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import telemetry
+
+# ホストごとの最小リクエスト間隔（秒）。従来の time.sleep の値を引き継ぐ
+HOST_INTERVALS = {
+    "suumo.jp": 1.0,
+    "express.heartrails.com": 0.3,
+    "www.police.pref.osaka.lg.jp": 0.5,
+    "web.pref.hyogo.lg.jp": 0.5,
+    "zipcloud.ibsnet.co.jp": 0.05,
+}
+DEFAULT_INTERVAL = 0.5
+
+MAX_WORKERS = 8
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0  # 再試行の待ち時間: 1秒, 2秒, 4秒...
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """トークンバケット。acquire() はトークンが得られるまで待つ"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 先にトークンを予約し（負になり得る）、足りない分だけロックの外で待つ
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def throttle(url):
+    """URLのホストに対するリクエスト枠が空くまで待つ"""
+    host = urllib.parse.urlsplit(url).hostname or ""
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(1 / HOST_INTERVALS.get(host, DEFAULT_INTERVAL))
+    bucket.acquire()
+
+
+def _is_retryable(e):
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code in RETRY_STATUS
+    return isinstance(e, (urllib.error.URLError, socket.timeout, ConnectionError))
+
+
+def open_url(req, timeout=30):
+    """レート制限と再試行つきで urlopen する"""
+    url = req.full_url if isinstance(req, urllib.request.Request) else req
+    host = urllib.parse.urlsplit(url).hostname or ""
+    for attempt in range(MAX_RETRIES + 1):
+        throttle(url)
+        # 応答ヘッダまでの時間（レート制限の待ち時間は含めない）
+        start = time.monotonic()
+        try:
+            res = urllib.request.urlopen(req, timeout=timeout)
+        except Exception as e:
+            status = e.code if isinstance(e, urllib.error.HTTPError) else None
+            ms = round((time.monotonic() - start) * 1000, 1)
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                # 304 は http_cache が再検証の結果として扱うので失敗にしない
+                telemetry.event("request", host=host, url=url, status=status, ms=ms, retries=attempt,
+                                error=None if status == 304 else f"{type(e).__name__}: {e}")
+                raise
+            time.sleep(BACKOFF_BASE * 2 ** attempt)
+        else:
+            ms = round((time.monotonic() - start) * 1000, 1)
+            telemetry.event("request", host=host, url=url, status=res.status, ms=ms, retries=attempt, error=None)
+            return res
+
+
+def map_ordered(func, items, max_workers=MAX_WORKERS):
+    """func を items に並行適用し、(item, 結果, 例外) を items の順に返す
+
+    完了順に関係なく結果は入力順に並ぶ。失敗した item は結果が None、例外が入る。
+    """
+    items = list(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(func, item) for item in items]
+        for item, future in zip(items, futures):
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
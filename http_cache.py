@@ -0,0 +1,238 @@
+"""fetch_* スクリプト共通のHTTPレスポンスキャッシュ
+
+レスポンス本文は内容のSHA-256をファイル名としてディスクに保存し（同じ内容は1つだけ保持）、
+URLごとのメタデータ（ETag / Last-Modified / 取得時刻）から参照する。
+取得元（source）ごとのTTL内はキャッシュをそのまま返し、TTLを過ぎたら
+条件付きリクエスト（If-None-Match / If-Modified-Since）で再検証する。
+取得ごとにキャッシュの利用結果（hit / revalidated / fetched）とバイト数を telemetry.py に記録する。
+
+環境変数:
+    HTTP_CACHE_DIR=...     キャッシュの保存先（既定: .http_cache）
+    HTTP_CACHE_OFFLINE=1   ネットワークに接続せずキャッシュのみを使う
+"""
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import fetcher
+import telemetry
+
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", ".http_cache")
+OFFLINE = os.environ.get("HTTP_CACHE_OFFLINE") == "1"
+
+DAY = 24 * 60 * 60
+# 取得元ごとのTTL（秒）
+TTL = {
+    "heartrails": 7 * DAY,
+    "suumo": 1 * DAY,
+    "police": 7 * DAY,
+    "zipcloud": 365 * DAY,
+    "japanpost": 30 * DAY,
+}
+DEFAULT_TTL = 1 * DAY
+
+# body: レスポンス本文, network: 今回ネットワークにリクエストしたか
+Response = collections.namedtuple("Response", ["body", "network"])
+
+
+class CacheMissError(Exception):
+    """オフラインモードでキャッシュに存在しないURLを要求した"""
+
+
+def _key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _meta_path(url):
+    k = _key(url)
+    return os.path.join(CACHE_DIR, "meta", k[:2], k + ".json")
+
+
+def _body_path(digest):
+    return os.path.join(CACHE_DIR, "bodies", digest[:2], digest)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _load_meta(url):
+    try:
+        with open(_meta_path(url), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not os.path.exists(_body_path(meta["sha256"])):
+        return None
+    return meta
+
+
+def _save_meta(url, meta):
+    _write_atomic(_meta_path(url), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+
+def _read_body(meta):
+    with open(_body_path(meta["sha256"]), "rb") as f:
+        return f.read()
+
+
+def _record(url, digest, etag, last_modified):
+    _save_meta(url, {
+        "url": url,
+        "sha256": digest,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+    })
+
+
+def store(url, body, etag=None, last_modified=None):
+    """本文をキャッシュに保存する"""
+    digest = hashlib.sha256(body).hexdigest()
+    path = _body_path(digest)
+    if not os.path.exists(path):
+        _write_atomic(path, body)
+    _record(url, digest, etag, last_modified)
+
+
+def _note(url, source, result, nbytes, start):
+    """取得1回の結果を記録する（result: hit=TTL内のキャッシュ, revalidated=304, fetched=本文を受信）"""
+    telemetry.event("cache", source=source, url=url, result=result, bytes=nbytes,
+                    ms=round((time.monotonic() - start) * 1000, 1))
+
+
+def _is_fresh(meta, source):
+    return OFFLINE or time.time() - meta["fetched_at"] < TTL.get(source, DEFAULT_TTL)
+
+
+def _conditional_request(url, meta, headers):
+    req_headers = dict(headers or {})
+    if meta is not None:
+        if meta.get("etag"):
+            req_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            req_headers["If-Modified-Since"] = meta["last_modified"]
+    return urllib.request.Request(url, headers=req_headers)
+
+
+def _revalidated(url, meta):
+    """304 Not Modified: キャッシュの取得時刻だけ更新する"""
+    meta["fetched_at"] = time.time()
+    _save_meta(url, meta)
+
+
+def fetch(url, source, headers=None, timeout=30):
+    """URLの本文を返す（キャッシュ優先）。
+
+    TTL内ならキャッシュを返し、期限切れなら条件付きリクエストで再検証する。
+    """
+    start = time.monotonic()
+    meta = _load_meta(url)
+    if meta is not None:
+        if _is_fresh(meta, source):
+            body = _read_body(meta)
+            _note(url, source, "hit", len(body), start)
+            return Response(body, False)
+    elif OFFLINE:
+        raise CacheMissError(f"キャッシュにありません（オフライン）: {url}")
+
+    try:
+        with fetcher.open_url(_conditional_request(url, meta, headers), timeout=timeout) as res:
+            body = res.read()
+            store(url, body, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+            _note(url, source, "fetched", len(body), start)
+            return Response(body, True)
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or meta is None:
+            raise
+    _revalidated(url, meta)
+    body = _read_body(meta)
+    _note(url, source, "revalidated", len(body), start)
+    return Response(body, True)
+
+
+def digest(url, source, headers=None, timeout=30):
+    """URLの本文の SHA-256 を返す（キャッシュ優先）。
+
+    TTL内ならキャッシュのハッシュをそのまま返し、期限切れなら条件付きリクエストで再検証する
+    （変わっていればキャッシュに保存する）。本文はメモリに読み込まない。
+    """
+    start = time.monotonic()
+    meta = _load_meta(url)
+    if meta is None or not _is_fresh(meta, source):
+        for _ in iter_chunks(url, source, headers, timeout):
+            pass
+        return _load_meta(url)["sha256"]
+    _note(url, source, "hit", os.path.getsize(_body_path(meta["sha256"])), start)
+    return meta["sha256"]
+
+
+def _iter_file(path, chunk_size):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_chunks(url, source, headers=None, timeout=30, chunk_size=64 * 1024):
+    """URLの本文を chunk_size ごとに返すジェネレータ（キャッシュ優先）。
+
+    ネットワークから取得する場合は、受信したチャンクをそのまま返しながら
+    一時ファイルに書き出し、最後まで読み終えた時点でキャッシュに登録する。
+    """
+    start = time.monotonic()
+    meta = _load_meta(url)
+    if meta is not None:
+        if _is_fresh(meta, source):
+            path = _body_path(meta["sha256"])
+            _note(url, source, "hit", os.path.getsize(path), start)
+            yield from _iter_file(path, chunk_size)
+            return
+    elif OFFLINE:
+        raise CacheMissError(f"キャッシュにありません（オフライン）: {url}")
+
+    try:
+        res = fetcher.open_url(_conditional_request(url, meta, headers), timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or meta is None:
+            raise
+        _revalidated(url, meta)
+        path = _body_path(meta["sha256"])
+        _note(url, source, "revalidated", os.path.getsize(path), start)
+        yield from _iter_file(path, chunk_size)
+        return
+
+    tmp = os.path.join(CACHE_DIR, "bodies", f"{os.getpid()}.{threading.get_ident()}.tmp")
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    digest = hashlib.sha256()
+    nbytes = 0
+    try:
+        with res, open(tmp, "wb") as f:
+            while True:
+                chunk = res.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                nbytes += len(chunk)
+                yield chunk
+        path = _body_path(digest.hexdigest())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _record(url, digest.hexdigest(), res.headers.get("ETag"), res.headers.get("Last-Modified"))
+    # ms は受信しながら呼び出し側が処理した時間も含む
+    _note(url, source, "fetched", nbytes, start)
@@ -1,45 +1,20 @@
-"""stations.json に犯罪データ（治安）と家賃データを統合する"""
+"""stations_raw.json に家賃データと駅の所在市区町村を統合し、stations.json に保存する
+（元データは書き換えないので、何度実行しても同じ結果になる）
+
+治安（犯罪率・分類）は市区町村ごとに city_stats.py が city_stats.json に出力し、
+駅データは市区町村名（city）でそれを参照する。
+
+市区町村を判定できた駅が今の stations.json より少ない場合（zipcloud に接続できず、
+行政区域ポリゴンも郵便番号索引もない場合など）は、stations.json を上書きせずに失敗として終了する。"""
 import json
+import sys
 
-# データ読み込み
-with open("stations.json", encoding="utf-8") as f:
-    stations = json.load(f)
-with open("crime_by_city.json", encoding="utf-8") as f:
-    crime = json.load(f)
-with open("rent_by_station.json", encoding="utf-8") as f:
-    rent = json.load(f)
-with open("population_by_city.json", encoding="utf-8") as f:
-    population = json.load(f)
-
-# --- 犯罪率（人口千人あたり）を算出し、3段階に分類 ---
-# まず全市区町村の犯罪率を計算して統計値を求める
-crime_rates = {}
-for city, count in crime.items():
-    pop = population.get(city)
-    if pop and pop > 0:
-        crime_rates[city] = count / pop * 1000
-
-# 犯罪率の統計（三分位数で分類）
-sorted_rates = sorted(crime_rates.values())
-n = len(sorted_rates)
-q1_rate = sorted_rates[n // 3]
-q2_rate = sorted_rates[2 * n // 3]
-print(f"犯罪率（人口千人あたり）: 下位1/3={q1_rate:.2f}, 上位1/3={q2_rate:.2f}")
-
-def get_safety(city_name):
-    """市区町村名から治安レベルを返す（人口千人あたりの犯罪率ベース）"""
-    count = crime.get(city_name, None)
-    pop = population.get(city_name, None)
-    if count is None or pop is None or pop == 0:
-        return {"crime_count": None, "crime_rate": None, "safety": "データなし", "safety_class": "unknown"}
-    rate = round(count / pop * 1000, 2)
-    if rate <= q1_rate:
-        level, cls = "良好", "good"
-    elif rate <= q2_rate:
-        level, cls = "普通", "normal"
-    else:
-        level, cls = "注意", "caution"
-    return {"crime_count": count, "crime_rate": rate, "safety": level, "safety_class": cls}
+from rent_matrix import load_matrix
+from station_names import match_all, summary
+
+# 間取りで家賃を絞り込む場合に指定する（空なら間取りを問わない全体の相場）
+# 例: ["ワンルーム", "1K"]（複数指定すると掲載件数で重み付けした平均）
+RENT_FLOOR_PLANS = []
 
 # --- 駅名→市区町村のマッピング（郵便番号から市区町村を特定するのは難しいので、犯罪データのキーと直接マッチング） ---
 # 犯罪データのキーは「大阪市北区」「尼崎市」などの市区町村名
@@ -59,89 +34,170 @@ def get_safety(city_name):
 # 全市区町村のリストを駅データに付与できるようにする
 
 # =============================
-# 実用アプローチ: 郵便番号APIで市区町村名を取得
+# 実用アプローチ: 駅の座標→市区町村の判定
 # =============================
-import urllib.request
-import time
-
+# 行政区域ポリゴン（国土数値情報 N03、boundaries/ に配置）に対する点の内外判定で決める。
+# ポリゴンがない・どのポリゴンにも含まれない駅だけ、郵便番号から市区町村を引く。
+# 郵便番号は日本郵便のKEN_ALL.CSVから作成したローカル索引（postal_index.py）で引き、
+# 索引にない郵便番号のみ、ZIPCLOUD_FALLBACK が有効なら zipcloud API で補う
+import fetcher
+import http_cache
+import regions
+import telemetry
+from city_boundaries import load_boundaries
+from postal_index import load_index
+
+ZIPCLOUD_FALLBACK = True
+ZIPCLOUD_URL = "https://zipcloud.ibsnet.co.jp/api/search"
+TARGET_PREFECTURES = regions.prefectures()
+
+boundaries = load_boundaries()
+postal_index = load_index()
 postal_to_city_cache = {}
 
+def resolved_count(path="stations.json"):
+    """保存済みの駅データで市区町村を判定できている駅数（ファイルがなければ 0）"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return sum(1 for s in json.load(f) if s.get("city"))
+    except FileNotFoundError:
+        return 0
+
+def zipcloud_lookup(postal):
+    """郵便番号から (都道府県, 市区町村) を返す（zipcloud API使用）"""
+    try:
+        url = f"{ZIPCLOUD_URL}?zipcode={postal}"
+        data = json.loads(http_cache.fetch(url, "zipcloud", timeout=10).body)
+        if data["results"]:
+            r = data["results"][0]
+            return r["address1"], r["address2"]
+    except Exception as e:
+        # 引けなかった郵便番号は市区町村なしとして続ける（失敗は記録して集計で見えるようにする）
+        telemetry.error("zipcloud_lookup", e, postal=postal)
+    return None
+
 def postal_to_city(postal):
-    """郵便番号から市区町村名を返す（zipcloud API使用）"""
+    """郵便番号から市区町村名を返す（大阪府・兵庫県以外は None）"""
     if not postal or len(postal) < 7:
         return None
     postal = postal.replace("-", "")[:7]
     if postal in postal_to_city_cache:
         return postal_to_city_cache[postal]
 
-    try:
-        url = f"https://zipcloud.ibsnet.co.jp/api/search?zipcode={postal}"
-        with urllib.request.urlopen(url, timeout=10) as res:
-            data = json.loads(res.read())
-        if data["results"]:
-            r = data["results"][0]
-            city = r["address2"]  # 市区町村
-            # 大阪市X区 → 「大阪市X区」、「尼崎市」等
-            if r["address1"] in ("大阪府", "兵庫県"):
-                result = city
-            else:
-                result = None
-        else:
-            result = None
-    except Exception:
+    found = postal_index.lookup(postal) if postal_index is not None else None
+    if found is None and ZIPCLOUD_FALLBACK:
+        found = zipcloud_lookup(postal)
+    # 大阪市X区 → 「大阪市X区」、「尼崎市」等
+    if found and found[0] in TARGET_PREFECTURES:
+        result = found[1]
+    else:
         result = None
 
     postal_to_city_cache[postal] = result
     return result
 
-# --- 統合処理 ---
-print("駅データに家賃・治安を統合中...")
-
-rent_matched = 0
-crime_matched = 0
-postal_lookups = 0
-
-# まずユニークな郵便番号のみ一括で取得
-unique_postals = set(s.get("postal", "") for s in stations if s.get("postal"))
-print(f"  郵便番号→市区町村の変換: {len(unique_postals)}件")
-
-for i, postal in enumerate(sorted(unique_postals)):
-    if i % 50 == 0 and i > 0:
-        print(f"    {i}/{len(unique_postals)}...")
-    postal_to_city(postal)
-    time.sleep(0.05)  # API負荷軽減
-
-print(f"  変換完了")
-
-for s in stations:
-    # 家賃データの統合
-    r = rent.get(s["name"])
-    s["rent_avg"] = r if r else None
-
-    if r:
-        rent_matched += 1
-
-    # 犯罪データの統合（郵便番号→市区町村→犯罪件数）
-    city = postal_to_city(s.get("postal", ""))
-    s["city"] = city
-    if city:
-        safety_info = get_safety(city)
-        s.update(safety_info)
-        if safety_info["crime_count"] is not None:
-            crime_matched += 1
+def point_to_city(lat, lng):
+    """座標から市区町村名を返す（大阪府・兵庫県以外、またはポリゴン外は None）"""
+    if boundaries is None:
+        return None
+    found = boundaries.lookup(lat, lng)
+    if found and found[0] in TARGET_PREFECTURES:
+        return found[1]
+    return None
+
+def resolve_cities(stations):
+    """駅ごとの市区町村名のリストを返す（座標で判定し、できなければ郵便番号から引く）"""
+    # まず座標から市区町村を判定
+    station_cities = [point_to_city(s["lat"], s["lng"]) for s in stations]
+    if boundaries is not None:
+        located = sum(1 for c in station_cities if c)
+        print(f"  座標→市区町村の判定: {located}/{len(stations)}駅（ポリゴン {len(boundaries)}件）")
+        telemetry.join("座標→市区町村", located, len(stations))
+    else:
+        print("  行政区域ポリゴンなし: boundaries/ に N03 の GeoJSON を置くと座標から判定します")
+
+    # 判定できなかった駅の郵便番号のみ一括で変換
+    unique_postals = set(
+        s.get("postal", "") for s, c in zip(stations, station_cities) if not c and s.get("postal")
+    )
+    if postal_index is not None:
+        print(f"  郵便番号→市区町村の変換: {len(unique_postals)}件（索引 {len(postal_index)}件）")
     else:
-        s["crime_count"] = None
-        s["crime_rate"] = None
-        s["safety"] = "データなし"
-        s["safety_class"] = "unknown"
+        print(f"  郵便番号→市区町村の変換: {len(unique_postals)}件（索引なし: postal_index.py で作成してください）")
 
-print(f"\n結果:")
-print(f"  全駅数: {len(stations)}")
-print(f"  家賃マッチ: {rent_matched}駅")
-print(f"  治安マッチ: {crime_matched}駅")
+    # 索引にない郵便番号を zipcloud で引く場合も、API負荷は fetcher のレート制限で抑える
+    found = 0
+    for postal, city, e in fetcher.map_ordered(postal_to_city, sorted(unique_postals)):
+        if e is not None:
+            telemetry.error("postal_to_city", e, postal=postal)
+        elif city:
+            found += 1
+    telemetry.join("郵便番号→市区町村", found, len(unique_postals))
 
-# 保存
-with open("stations.json", "w", encoding="utf-8") as f:
-    json.dump(stations, f, ensure_ascii=False, indent=2)
+    print(f"  変換完了")
+    return [c or postal_to_city(s.get("postal", "")) for s, c in zip(stations, station_cities)]
 
-print("stations.json を更新しました")
+# --- 統合処理 ---
+def merge_stations(stations, station_cities, rent, rent_matches, rent_matrix=None):
+    """駅データ（stations を書き換える）に家賃と所在市区町村を統合する"""
+    for s, city, m in zip(stations, station_cities, rent_matches):
+        # 家賃データの統合
+        r = rent.get(m.name) if m.name else None
+        s["rent_avg"] = r if r else None
+        # 地図ページで間取りを切り替えられるよう、間取り別の家賃も持たせる
+        if rent_matrix is not None:
+            s["rent_plans"] = rent_matrix.row(m.name) if m.name else {}
+
+        # 治安は市区町村名で city_stats.json を引く（座標 or 郵便番号→市区町村）
+        s["city"] = city
+
+
+if __name__ == "__main__":
+    # データ読み込み
+    with open("stations_raw.json", encoding="utf-8") as f:
+        stations = json.load(f)
+    with open("rent_by_station.json", encoding="utf-8") as f:
+        rent = json.load(f)
+
+    rent_matrix = load_matrix()
+    if RENT_FLOOR_PLANS:
+        if rent_matrix is None:
+            print("rent_matrix.bin がないため全体の家賃相場を使います（fetch_rent.py を実行してください）")
+        else:
+            rent = rent_matrix.mean_over(RENT_FLOOR_PLANS)
+            print(f"家賃を間取りで絞り込み: {RENT_FLOOR_PLANS}")
+
+    print("駅データに家賃・所在市区町村を統合中...")
+
+    # 駅名の表記揺れ（「JR俊徳道」「三国ケ丘」など）を吸収して家賃データとまとめて照合
+    rent_matches = match_all(stations, rent)
+    station_cities = resolve_cities(stations)
+    merge_stations(stations, station_cities, rent, rent_matches, rent_matrix)
+
+    print(f"\n結果:")
+    print(f"  全駅数: {len(stations)}")
+    rent_counts = summary(rent_matches)
+    print(f"  家賃マッチ: {len(stations) - rent_counts[None]}駅"
+          f"（完全一致 {rent_counts['exact']}, 表記揺れ {rent_counts['base']}）")
+    print(f"  市区町村の判定: {sum(1 for c in station_cities if c)}駅（治安は city_stats.py で集計）")
+    telemetry.join("家賃マッチ", len(stations) - rent_counts[None], len(stations),
+                   exact=rent_counts["exact"], base=rent_counts["base"])
+    telemetry.join("市区町村の判定", sum(1 for c in station_cities if c), len(stations))
+    unmatched = sorted({s["name"] for s, m in zip(stations, rent_matches) if m.name is None})
+    if unmatched:
+        print(f"  家賃データのない駅: {len(unmatched)}駅（一覧は python3 station_names.py）")
+        print("    " + "、".join(unmatched[:20]) + ("、..." if len(unmatched) > 20 else ""))
+
+    # 判定できた駅が減った結果で上書きすると、下流のステージも治安なしで作り直されてしまう
+    located = sum(1 for c in station_cities if c)
+    previous = resolved_count()
+    if located < previous:
+        print(f"市区町村の判定が前回より少ないため stations.json を保存しません（{located}駅 < 前回 {previous}駅）")
+        print("  boundaries/ のポリゴンか postal_index.bin を用意するか、zipcloud に接続できる状態で再実行してください")
+        sys.exit(1)
+
+    # 保存
+    with open("stations.json", "w", encoding="utf-8") as f:
+        json.dump(stations, f, ensure_ascii=False, indent=2)
+
+    print("stations.json に保存しました")
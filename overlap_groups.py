@@ -0,0 +1,92 @@
+"""地図上で重なるマーカーのグループを、ズームレベル・マーカーサイズごとに事前計算する
+
+index.html の updateColors() は、重なるマーカー同士を Union-Find でまとめて平均色を付けている。
+ここでは同じ判定（画面上の距離 < サイズ×1.2px かつ 緯度経度の距離 < サイズ×0.001度）を
+ズームレベル×サイズの全組み合わせについて格子バケットの近傍探索で計算し、
+2駅以上のグループだけを overlap_groups.json に保存する。ページは表を引くだけでよい。
+"""
+import json
+import math
+
+STATIONS_PATH = "stations.json"
+OUTPUT_PATH = "overlap_groups.json"
+
+ZOOMS = range(8, 19)   # Leaflet のズームレベル（maxZoom 18）
+RADII = range(2, 17)   # index.html のサイズスライダーの範囲（px）
+TILE_SIZE = 256
+
+
+def project(lat, lng, zoom):
+    """緯度経度を Web メルカトルのピクセル座標に変換する
+
+    Leaflet の latLngToLayerPoint と同じく EPSG:3857 で投影し、整数に丸める。
+    """
+    scale = TILE_SIZE * 2 ** zoom
+    x = scale * (lng + 180) / 360
+    phi = math.radians(lat)
+    y = scale * (0.5 - math.log(math.tan(math.pi / 4 + phi / 2)) / (2 * math.pi))
+    return math.floor(x + 0.5), math.floor(y + 0.5)
+
+
+def find_groups(stations, zoom, radius):
+    """重なるマーカーのグループ（駅番号のリスト、2駅以上のみ）を返す"""
+    threshold = radius * 1.2
+    max_geo = radius * 0.001
+    points = [project(s["lat"], s["lng"], zoom) for s in stations]
+
+    parent = list(range(len(stations)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    # セルの大きさをしきい値にすると、重なり得る相手は周囲3×3セルにしかいない
+    grid = {}
+    for i, (x, y) in enumerate(points):
+        grid.setdefault((int(x // threshold), int(y // threshold)), []).append(i)
+
+    for (cx, cy), members in grid.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                others = grid.get((cx + dx, cy + dy))
+                if not others:
+                    continue
+                for i in members:
+                    si, (xi, yi) = stations[i], points[i]
+                    for j in others:
+                        if j <= i:
+                            continue
+                        dlat = si["lat"] - stations[j]["lat"]
+                        dlng = si["lng"] - stations[j]["lng"]
+                        if dlat * dlat + dlng * dlng > max_geo * max_geo:
+                            continue
+                        px = xi - points[j][0]
+                        py = yi - points[j][1]
+                        if px * px + py * py < threshold * threshold:
+                            parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(stations)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(g for g in groups.values() if len(g) > 1)
+
+
+def build(stations, zooms=ZOOMS, radii=RADII):
+    """{"ズーム,サイズ": [[駅番号, ...], ...]} の表を返す"""
+    return {
+        f"{z},{r}": find_groups(stations, z, r)
+        for z in zooms
+        for r in radii
+    }
+
+
+if __name__ == "__main__":
+    with open(STATIONS_PATH, encoding="utf-8") as f:
+        stations = json.load(f)
+    table = build(stations)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump({"count": len(stations), "groups": table}, f, separators=(",", ":"))
+    n_groups = sum(len(g) for g in table.values())
+    print(f"{OUTPUT_PATH} に保存しました（{len(table)}通り, {n_groups}グループ）")
@@ -0,0 +1,314 @@
+"""データ取得〜統合の各スクリプトを依存関係に沿って実行する
+
+各ステージの入力・出力ファイルを定義し、入力（スクリプト自身を含む）のハッシュが
+前回成功時から変わっていないステージはスキップする。依存関係のないステージは並行に実行する。
+ネットワークから取得するステージは入力ファイルを持たないため、スクリプトが変わったときか
+--refresh を指定したときだけ再実行する（取得結果は http_cache により TTL の間キャッシュされる）。
+
+取得ステージは対象の府県（regions.py）ごとに「stations:osaka」のように作り、
+府県ごとの結果（shards/<コード>/）を combine ステージが最上位のファイルにまとめる。
+府県のアダプタ（region_<コード>.py）を変えても取得し直すのはその府県だけで済む。
+同じホストに取得する取得ステージは、リクエスト間隔（fetcher.py のホストごとの
+トークンバケットはプロセスごと）を守るため、府県が違っても同時には実行しない
+（ホストの違う crime:osaka と crime:hyogo は並行に進む）。
+shards/ はリポジトリに含めないので、どの府県の取得結果もない種類の取得ステージ（チェックアウト直後など）は、
+コミット済みの最上位のファイル（stations_raw.json など）を取得済みとみなして再取得しない
+（combine_shards.py は取得結果のない種類のファイルを書き換えない）。取得し直すときは --refresh を付ける。
+
+各ステージには同じ実行ID（TELEMETRY_RUN）を渡し、ステージが記録した計測イベント（telemetry.py）と
+ステージごとの所要時間を最後にまとめて表示する（あとから python3 telemetry.py でも見られる）。
+
+使い方:
+    python3 pipeline.py                 # 変更のあったステージだけ実行
+    python3 pipeline.py merge           # merge とその上流だけ実行
+    python3 pipeline.py crime:hyogo     # 兵庫県の犯罪データだけ取得（crime なら全府県）
+    python3 pipeline.py --refresh       # 取得ステージも再実行
+    python3 pipeline.py --force merge   # 指定ステージを無条件に実行
+    python3 pipeline.py --dry-run       # 実行予定のステージを表示するだけ
+"""
+import argparse
+import collections
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import regions
+import telemetry
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(ROOT, ".pipeline_state.json")
+
+# 取得スクリプトが共通で使うモジュール
+FETCH_MODULES = ["fetcher.py", "http_cache.py"]
+# 行政区域ポリゴン（国土数値情報 N03）
+BOUNDARY_FILES = sorted(glob.glob("boundaries/N03*.geojson", root_dir=ROOT))
+# 町丁目の代表点（国土交通省 位置参照情報 大字・町丁目レベル）
+TOWN_POINT_FILES = sorted(glob.glob("town_points/*.csv", root_dir=ROOT))
+
+# name: ステージ名, script: 実行するスクリプト, inputs: 入力ファイル, outputs: 出力ファイル,
+# network: ネットワークから取得するステージか, args: スクリプトの引数,
+# committed: 府県ごとの取得結果がないときに取得済みとみなす、コミット済みの最上位のファイル,
+# hosts: 取得先のホスト（同じホストに取得するステージは同時に実行しない）
+Stage = collections.namedtuple("Stage",
+                               ["name", "script", "inputs", "outputs", "network", "args", "committed", "hosts"],
+                               defaults=[(), (), ()])
+# 取得元のホスト（fetcher.HOST_INTERVALS のキー）
+HEARTRAILS_HOST = "express.heartrails.com"
+SUUMO_HOST = "suumo.jp"
+TARGETS = regions.enabled()
+
+
+def region_stages(region):
+    """府県ごとの取得ステージ（出力は shards/<コード>/ の下）"""
+    code = region.code
+    common = ["regions.py", f"region_{code}.py"]
+    shard = lambda name: f"{regions.SHARDS_DIR}/{code}/{name}"
+    args = ("--region", code)
+    police_host = urllib.parse.urlsplit(region.police_url or "").hostname
+    return [
+        Stage(f"stations:{code}", "fetch_stations.py", FETCH_MODULES + common,
+              [shard("stations_raw.json"), shard("line_routes.json")], True, args, ["stations_raw.json"],
+              [HEARTRAILS_HOST]),
+        Stage(f"crime:{code}", "fetch_crime.py", FETCH_MODULES + common + ["crime_cube.py", "crime_store.py"],
+              [shard("crime_years/manifest.json")], True, args, ["crime_by_city.json"],
+              [police_host] if police_host else []),
+        Stage(f"rent:{code}", "fetch_rent.py", FETCH_MODULES + common + ["rent_matrix.py"],
+              [shard("rent_matrix.bin")], True, args, ["rent_by_station.json"], [SUUMO_HOST]),
+        Stage(f"population:{code}", "fetch_population.py", common + ["ssdse.py", "SSDSE-A-2025.csv"],
+              [shard("population_by_city.json")], False, args),
+    ]
+
+
+REGION_STAGES = [stage for region in TARGETS for stage in region_stages(region)]
+CRIME_MANIFESTS = [o for s in REGION_STAGES if s.name.startswith("crime:") for o in s.outputs]
+
+STAGES = REGION_STAGES + [
+    Stage("combine", "combine_shards.py",
+          ["regions.py", "crime_cube.py", "crime_store.py", "rent_matrix.py"]
+          + [o for s in REGION_STAGES for o in s.outputs],
+          ["stations_raw.json", "line_routes.json", "rent_by_station.json", "rent_matrix.bin",
+           "crime_by_city.json", "crime_by_town.json", "crime_cube.bin", "population_by_city.json"], False),
+    Stage("merge", "merge_data.py",
+          FETCH_MODULES + ["regions.py", "telemetry.py", "postal_index.py", "postal_index.bin", "rent_matrix.py", "city_boundaries.py",
+                           "station_names.py", "stations_raw.json", "rent_matrix.bin", "rent_by_station.json"]
+          + BOUNDARY_FILES,
+          ["stations.json"], False),
+    Stage("citystats", "city_stats.py",
+          ["crime_cube.py", "crime_store.py", "regions.py", "stations.json", "crime_by_city.json",
+           "crime_cube.bin", "population_by_city.json"] + CRIME_MANIFESTS,
+          ["city_stats.json"], False),
+    Stage("commute", "commute.py", ["station_names.py", "stations.json", "line_routes.json"],
+          ["commute_matrix.bin"], False),
+    Stage("density", "crime_density.py", ["stations.json", "crime_by_town.json"] + TOWN_POINT_FILES,
+          ["crime_density.json"], False),
+    Stage("overlap", "overlap_groups.py", ["stations.json"], ["overlap_groups.json"], False),
+    Stage("columnar", "export_columnar.py",
+          ["city_stats.py", "crime_density.py", "stations.json", "city_stats.json", "crime_density.json"],
+          ["stations.bin.gz"], False),
+    Stage("tiles", "build_tiles.py",
+          ["city_stats.py", "crime_density.py", "stations.json", "city_stats.json", "crime_density.json"],
+          ["tiles/meta.json"], False),
+]
+
+
+def file_hash(path):
+    """ファイルのSHA-256を返す（存在しなければ None）"""
+    h = hashlib.sha256()
+    try:
+        with open(os.path.join(ROOT, path), "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def fingerprint(paths):
+    return {p: file_hash(p) for p in paths}
+
+
+def load_state():
+    try:
+        with open(STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state):
+    with open(STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+
+def dependencies(stages):
+    """ステージ名→依存する（入力を出力する）ステージ名の集合"""
+    producer = {out: s.name for s in stages for out in s.outputs}
+    return {
+        s.name: {producer[i] for i in s.inputs if i in producer and producer[i] != s.name}
+        for s in stages
+    }
+
+
+def select(stages, targets):
+    """指定ステージとその上流のステージだけを返す"""
+    if not targets:
+        return stages
+    deps = dependencies(stages)
+    wanted = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in wanted]
+
+
+def expand(stages, names):
+    """指定されたステージ名ごとに、該当するステージ名のリストを返す
+    （府県ごとのステージは「crime」で全府県、「crime:osaka」で1府県を指定できる）"""
+    return [[s.name for s in stages if s.name == name or s.name.split(":")[0] == name] for name in names]
+
+
+def uses_committed(stage):
+    """取得ステージが、コミット済みの最上位のファイルを取得結果の代わりに使うか
+
+    同じ種類（「stations:osaka」の「stations」）のどの府県の取得結果もなく、最上位のファイルがある場合。
+    1府県でも取得結果があれば、combine で府県がそろうよう残りの府県も取得する。
+    """
+    if not stage.committed or not all(fingerprint(stage.committed).values()):
+        return False
+    kind = stage.name.split(":")[0]
+    return not any(
+        os.path.exists(os.path.join(ROOT, out))
+        for s in STAGES if s.name.split(":")[0] == kind for out in s.outputs
+    )
+
+
+def is_up_to_date(stage, state, refresh):
+    """前回成功時から入力・出力が変わっていなければ True"""
+    prev = state.get(stage.name)
+    if stage.network and refresh:
+        return False
+    if stage.network and uses_committed(stage):
+        return True
+    if prev is None:
+        # 取得ステージは出力が揃っていれば、手動で取得済みのものとして扱う
+        return stage.network and all(fingerprint(stage.outputs).values())
+    if prev["inputs"] != fingerprint([stage.script] + stage.inputs):
+        return False
+    return prev["outputs"] == fingerprint(stage.outputs) and all(prev["outputs"].values())
+
+
+def record(stage, state):
+    state[stage.name] = {
+        "inputs": fingerprint([stage.script] + stage.inputs),
+        "outputs": fingerprint(stage.outputs),
+    }
+    save_state(state)
+
+
+def run_stage(stage):
+    """スクリプトを別プロセスで実行し、(終了コード, 出力, 所要秒数) を返す"""
+    start = time.monotonic()
+    env = dict(os.environ, TELEMETRY_RUN=telemetry.RUN, TELEMETRY_STAGE=stage.name)
+    proc = subprocess.run(
+        [sys.executable, stage.script, *stage.args],
+        cwd=ROOT, capture_output=True, text=True, env=env,
+    )
+    elapsed = time.monotonic() - start
+    telemetry.event("stage", name=stage.name, ms=round(elapsed * 1000, 1), code=proc.returncode)
+    return proc.returncode, proc.stdout + proc.stderr, elapsed
+
+
+def run(stages, force=(), refresh=False, dry_run=False, jobs=4):
+    """依存関係に沿ってステージを実行し、すべて成功すれば True を返す"""
+    state = load_state()
+    deps = dependencies(stages)
+    names = {s.name for s in stages}
+    done, failed = set(), set()
+    planned = set()  # dry-run で実行予定になったステージ
+    pending = list(stages)
+    running = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for stage in list(pending):
+                upstream = deps[stage.name] & names
+                if upstream & failed:
+                    print(f"[{stage.name}] 上流のステージが失敗したためスキップ")
+                    failed.add(stage.name)
+                    pending.remove(stage)
+                elif upstream <= done:
+                    if not dry_run and any(not set(stage.hosts).isdisjoint(r.hosts) for r in running.values()):
+                        continue  # 同じホストへの同時実行を避ける
+                    pending.remove(stage)
+                    if (stage.name not in force and not upstream & planned
+                            and is_up_to_date(stage, state, refresh)):
+                        if stage.network and uses_committed(stage):
+                            print(f"[{stage.name}] 取得結果なし: {', '.join(stage.committed)} を使う（スキップ）")
+                        else:
+                            print(f"[{stage.name}] 変更なし（スキップ）")
+                        if stage.name not in state and not dry_run:
+                            record(stage, state)
+                        done.add(stage.name)
+                    elif dry_run:
+                        print(f"[{stage.name}] 実行予定: {stage.script}")
+                        planned.add(stage.name)
+                        done.add(stage.name)
+                    else:
+                        print(f"[{stage.name}] 実行中: {stage.script}")
+                        running[pool.submit(run_stage, stage)] = stage
+            if not running:
+                continue
+
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                code, output, elapsed = future.result()
+                for line in output.rstrip().splitlines():
+                    print(f"  [{stage.name}] {line}")
+                if code == 0:
+                    print(f"[{stage.name}] 完了 ({elapsed:.1f}秒)")
+                    record(stage, state)
+                    done.add(stage.name)
+                else:
+                    print(f"[{stage.name}] 失敗（終了コード {code}）")
+                    failed.add(stage.name)
+
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="データ取得〜統合のパイプラインを実行する")
+    parser.add_argument("stages", nargs="*",
+                        help="実行するステージ（省略時はすべて。上流のステージも対象になる）")
+    parser.add_argument("--force", action="store_true", help="指定したステージを変更の有無にかかわらず実行する")
+    parser.add_argument("--refresh", action="store_true", help="ネットワーク取得ステージも再実行する")
+    parser.add_argument("--dry-run", action="store_true", help="実行せずに予定だけ表示する")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="同時に実行するステージ数")
+    args = parser.parse_args()
+    targets = expand(STAGES, args.stages)
+    unknown = {name for name, found in zip(args.stages, targets) if not found}
+    if unknown:
+        parser.error(f"不明なステージ: {', '.join(sorted(unknown))}")
+    targets = {name for found in targets for name in found}
+
+    stages = select(STAGES, targets)
+    force = {s.name for s in stages if s.name in targets or not targets} if args.force else set()
+    ok = run(stages, force=force, refresh=args.refresh, dry_run=args.dry_run, jobs=args.jobs)
+    events = telemetry.load() if telemetry.PATH and not args.dry_run else []
+    if telemetry.RUN in telemetry.runs(events):
+        print()
+        print("\n".join(telemetry.report(events, telemetry.RUN)))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
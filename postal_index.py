@@ -0,0 +1,121 @@
+"""日本郵便の郵便番号データ（KEN_ALL.CSV）から郵便番号→市区町村のローカル索引を作成・検索する
+
+索引はソート済みの郵便番号配列と市区町村名テーブルへの添字配列からなるバイナリファイルで、
+検索は二分探索（O(log n)）で行う。
+
+使い方:
+    python3 postal_index.py                # ken_all.zip をダウンロードして索引を作成
+    python3 postal_index.py KEN_ALL.CSV    # 手元のCSV（またはzip）から索引を作成
+"""
+import array
+import bisect
+import csv
+import io
+import struct
+import sys
+import zipfile
+
+import http_cache
+
+KEN_ALL_URL = "https://www.post.japanpost.jp/zipcode/dl/kogaki/zip/ken_all.zip"
+INDEX_PATH = "postal_index.bin"
+
+MAGIC = b"PIDX"
+# ヘッダ: マジック, 郵便番号数, 市区町村名テーブルのバイト長
+HEADER = struct.Struct("<4sII")
+
+
+def _read_ken_all(source):
+    """KEN_ALL.CSV（またはそれを含むzip）を開き、行のイテレータを返す"""
+    if source.lower().endswith(".zip"):
+        with zipfile.ZipFile(source) as zf:
+            name = next(n for n in zf.namelist() if n.upper().endswith(".CSV"))
+            raw = zf.read(name)
+    else:
+        with open(source, "rb") as f:
+            raw = f.read()
+    return csv.reader(io.StringIO(raw.decode("cp932")))
+
+
+def build_index(source, out_path=INDEX_PATH):
+    """KEN_ALL.CSV から索引ファイルを作成し、登録した郵便番号数を返す"""
+    codes = {}
+    for r in _read_ken_all(source):
+        # 2列目: 郵便番号(7桁), 6列目: 都道府県名, 7列目: 市区町村名
+        postal, pref, city = r[2], r[6], r[7]
+        # 1つの郵便番号が複数行に分かれる場合（町域名が長い等）は先頭行を採用
+        if postal not in codes:
+            codes[postal] = (pref, city)
+
+    names = sorted(set(codes.values()))
+    name_ids = {name: i for i, name in enumerate(names)}
+    keys = sorted(codes)
+    code_arr = array.array("I", (int(k) for k in keys))
+    idx_arr = array.array("H", (name_ids[codes[k]] for k in keys))
+    if sys.byteorder != "little":
+        code_arr.byteswap()
+        idx_arr.byteswap()
+
+    blob = "\n".join(f"{p}\t{c}" for p, c in names).encode("utf-8")
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys), len(blob)))
+        f.write(blob)
+        f.write(code_arr.tobytes())
+        f.write(idx_arr.tobytes())
+    return len(keys)
+
+
+class PostalIndex:
+    """郵便番号→(都道府県, 市区町村) の索引"""
+
+    def __init__(self, path=INDEX_PATH):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, n, blob_len = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} は郵便番号索引ファイルではありません")
+        pos = HEADER.size
+        self.names = [tuple(line.split("\t")) for line in data[pos:pos + blob_len].decode("utf-8").split("\n")]
+        pos += blob_len
+        self.codes = array.array("I")
+        self.codes.frombytes(data[pos:pos + 4 * n])
+        pos += 4 * n
+        self.name_idx = array.array("H")
+        self.name_idx.frombytes(data[pos:pos + 2 * n])
+        if sys.byteorder != "little":
+            self.codes.byteswap()
+            self.name_idx.byteswap()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, postal):
+        """郵便番号（ハイフン有無は問わない）から (都道府県, 市区町村) を返す。見つからなければ None"""
+        postal = postal.replace("-", "")[:7]
+        if len(postal) != 7 or not postal.isdigit():
+            return None
+        code = int(postal)
+        i = bisect.bisect_left(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            return self.names[self.name_idx[i]]
+        return None
+
+
+def load_index(path=INDEX_PATH):
+    """索引ファイルを読み込む。ファイルがなければ None を返す"""
+    try:
+        return PostalIndex(path)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        source = sys.argv[1]
+    else:
+        source = "ken_all.zip"
+        print(f"ダウンロード中: {KEN_ALL_URL}")
+        with open(source, "wb") as f:
+            f.write(http_cache.fetch(KEN_ALL_URL, "japanpost").body)
+    n = build_index(source)
+    print(f"{INDEX_PATH} に保存しました（{n}件の郵便番号）")
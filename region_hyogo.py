@@ -0,0 +1,70 @@
+"""兵庫県のアダプタ（regions.py）"""
+from regions import Region, register
+
+# 兵庫県のオープンデータは兵庫県オープンデータサイトから取得
+HYOGO_BASE = "https://web.pref.hyogo.lg.jp/kk26/johoseisaku/documents"
+# 取得する年（新しい年が公開されたら追加する。保存済みの過去の年は再取得しない）
+HYOGO_YEARS = [2024]
+HYOGO_FILES = [
+    "hyogo_{year}hittakuri.csv",
+    "hyogo_{year}syazyounerai.csv",
+    "hyogp_{year}buhinnerai.csv",  # 県のファイル名のまま（hyogp）
+    "hyogo_{year}zidouhanbaikinerai.csv",
+    "hyogo_{year}zidousyatou.csv",
+    "hyogo_{year}ootobaitou.csv",
+    "hyogo_{year}zitensyatou.csv",
+]
+
+
+@register
+class Hyogo(Region):
+    code = "hyogo"
+    prefecture = "兵庫県"
+    pref_code = "28"
+    police = "兵庫県警"
+    police_url = HYOGO_BASE
+    suumo_routes = (
+        "/chintai/soba/hyogo/en_JRtokaidohonsen/",
+        "/chintai/soba/hyogo/en_JRsanyohonsen/",
+        "/chintai/soba/hyogo/en_JRakosen/",
+        "/chintai/soba/hyogo/en_JRkakogawasen/",
+        "/chintai/soba/hyogo/en_JRfukuchiyamasen/",
+        "/chintai/soba/hyogo/en_JRsaninhonsen/",
+        "/chintai/soba/hyogo/en_JRbantansen/",
+        "/chintai/soba/hyogo/en_JRtozaisen/",
+        "/chintai/soba/hyogo/en_hankyukobesen/",
+        "/chintai/soba/hyogo/en_hankyuitamisen/",
+        "/chintai/soba/hyogo/en_hankyuimazusen/",
+        "/chintai/soba/hyogo/en_hankyukoyosen/",
+        "/chintai/soba/hyogo/en_hankyutakarazukasen/",
+        "/chintai/soba/hyogo/en_hanshinhonsen/",
+        "/chintai/soba/hyogo/en_hanshindentetsuhanshinnambasen/",
+        "/chintai/soba/hyogo/en_hanshimmukogawasen/",
+        "/chintai/soba/hyogo/en_kobedentetsuarimasen/",
+        "/chintai/soba/hyogo/en_kobedentetsusandasen/",
+        "/chintai/soba/hyogo/en_kobedentetsukoentoshisen/",
+        "/chintai/soba/hyogo/en_kobedentetsuaosen/",
+        "/chintai/soba/hyogo/en_seishinyamatesen/",
+        "/chintai/soba/hyogo/en_kobeshieichikatetsukaigansen/",
+        "/chintai/soba/hyogo/en_sanyodentetsuhonsen/",
+        "/chintai/soba/hyogo/en_portislandsen/",
+        "/chintai/soba/hyogo/en_rokkoislandsen/",
+        "/chintai/soba/hyogo/en_nosedentetsumyokensen/",
+    )
+    # 政令指定都市の区別人口（国勢調査2020年）
+    wards = {
+        "神戸市": {
+            "神戸市東灘区": 214389,
+            "神戸市灘区": 136012,
+            "神戸市兵庫区": 108807,
+            "神戸市長田区": 93538,
+            "神戸市須磨区": 156821,
+            "神戸市垂水区": 213759,
+            "神戸市北区": 209023,
+            "神戸市中央区": 149655,
+            "神戸市西区": 243148,
+        },
+    }
+
+    def crime_csv_urls(self):
+        return [f"{HYOGO_BASE}/{name.format(year=year)}" for year in HYOGO_YEARS for name in HYOGO_FILES]
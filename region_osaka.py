@@ -0,0 +1,101 @@
+"""大阪府のアダプタ（regions.py）"""
+import re
+
+import http_cache
+from regions import Region, register
+
+OSAKA_POLICE_BASE = "https://www.police.pref.osaka.lg.jp"
+
+
+@register
+class Osaka(Region):
+    code = "osaka"
+    prefecture = "大阪府"
+    pref_code = "27"
+    police = "大阪府警"
+    police_url = OSAKA_POLICE_BASE
+    suumo_routes = (
+        "/chintai/soba/osaka/en_JRosakakanjosen/",
+        "/chintai/soba/osaka/en_JRtokaidohonsen/",
+        "/chintai/soba/osaka/en_JRkatamachisen/",
+        "/chintai/soba/osaka/en_JRsakurajimasen/",
+        "/chintai/soba/osaka/en_JRkansaihonsen/",
+        "/chintai/soba/osaka/en_JRhanwasen/",
+        "/chintai/soba/osaka/en_JRkansaikukosen/",
+        "/chintai/soba/osaka/en_JRfukuchiyamasen/",
+        "/chintai/soba/osaka/en_JRtozaisen/",
+        "/chintai/soba/osaka/en_JRosakahigashisen/",
+        "/chintai/soba/osaka/en_chikatetsumidosujisen/",
+        "/chintai/soba/osaka/en_chikatetsutanimachisen/",
+        "/chintai/soba/osaka/en_chikatetsuyotsubashisen/",
+        "/chintai/soba/osaka/en_chikatetsuchuosen/",
+        "/chintai/soba/osaka/en_chikatetsusennichimaesen/",
+        "/chintai/soba/osaka/en_chikatetsusakaisujisen/",
+        "/chintai/soba/osaka/en_nagahoritsurumiryokuchisen/",
+        "/chintai/soba/osaka/en_chikatetsuimazatosujisen/",
+        "/chintai/soba/osaka/en_kitaosakakyuko/",
+        "/chintai/soba/osaka/en_nankaihonsen/",
+        "/chintai/soba/osaka/en_nankaikoyasen/",
+        "/chintai/soba/osaka/en_nankaisembokusen/",
+        "/chintai/soba/osaka/en_hankyukobesen/",
+        "/chintai/soba/osaka/en_hankyutakarazukasen/",
+        "/chintai/soba/osaka/en_hankyuminosen/",
+        "/chintai/soba/osaka/en_hankyusenrisen/",
+        "/chintai/soba/osaka/en_hankyukyotosen/",
+        "/chintai/soba/osaka/en_hanshinhonsen/",
+        "/chintai/soba/osaka/en_hanshindentetsuhanshinnambasen/",
+        "/chintai/soba/osaka/en_keihanhonsen/",
+        "/chintai/soba/osaka/en_keihankatanosen/",
+        "/chintai/soba/osaka/en_keihannakanoshimasen/",
+        "/chintai/soba/osaka/en_kintetsunarasen/",
+        "/chintai/soba/osaka/en_kintetsuosakasen/",
+        "/chintai/soba/osaka/en_kintetsuminamiosakasen/",
+        "/chintai/soba/osaka/en_kintetsukeihanna/",
+        "/chintai/soba/osaka/en_osakamonorail/",
+        "/chintai/soba/osaka/en_nankoporttownsen/",
+        "/chintai/soba/osaka/en_nosedentetsumyokensen/",
+    )
+    # 政令指定都市の区別人口（国勢調査2020年）
+    wards = {
+        "大阪市": {
+            "大阪市都島区": 107517,
+            "大阪市福島区": 79204,
+            "大阪市此花区": 65606,
+            "大阪市西区": 103772,
+            "大阪市港区": 77979,
+            "大阪市大正区": 60254,
+            "大阪市天王寺区": 83236,
+            "大阪市浪速区": 75543,
+            "大阪市西淀川区": 96539,
+            "大阪市東淀川区": 177055,
+            "大阪市東成区": 82820,
+            "大阪市生野区": 126697,
+            "大阪市旭区": 88953,
+            "大阪市城東区": 168399,
+            "大阪市阿倍野区": 112832,
+            "大阪市住吉区": 152741,
+            "大阪市東住吉区": 127003,
+            "大阪市西成区": 106011,
+            "大阪市淀川区": 183444,
+            "大阪市鶴見区": 112951,
+            "大阪市住之江区": 119729,
+            "大阪市平野区": 190060,
+            "大阪市北区": 141267,
+            "大阪市中央区": 107274,
+        },
+        "堺市": {
+            "堺市堺区": 148247,
+            "堺市中区": 123733,
+            "堺市東区": 84609,
+            "堺市西区": 134768,
+            "堺市南区": 144453,
+            "堺市北区": 158117,
+            "堺市美原区": 37234,
+        },
+    }
+
+    def crime_csv_urls(self):
+        """犯罪オープンデータのページに載っているCSV（ページに載る年のもの）"""
+        url = f"{OSAKA_POLICE_BASE}/seikatsu/21247.html"
+        html = http_cache.fetch(url, "police").body.decode("utf-8")
+        return [f"https:{m}" for m in re.findall(r'href="(//.*?\.csv)"', html)]
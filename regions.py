@@ -0,0 +1,101 @@
+"""対象の府県（リージョン）ごとの取得元のアダプタ
+
+府県ごとに異なる取得元（HeartRails の府県名、SUUMO の路線ページ、警察の犯罪オープンデータ、
+政令指定都市の区別人口）は Region のサブクラスにまとめ、region_<コード>.py に1府県ずつ置く。
+このディレクトリの region_*.py は読み込まれるときに register() で登録される。
+
+取得スクリプト（fetch_stations.py・fetch_rent.py・fetch_crime.py・fetch_population.py）は
+--region で府県を受け取り、府県ごとの結果を shards/<コード>/ に書く。combine_shards.py が
+それをまとめて、これまでと同じ最上位のファイル（stations_raw.json など）を作る。
+pipeline.py は府県ごとに取得ステージを作るので、府県を追加しても取得し直すのはその府県だけで済む。
+
+府県を追加するには region_osaka.py にならって region_<コード>.py を書く。
+環境変数 REGIONS=osaka,hyogo で対象の府県を絞り込める（既定: 登録されているすべて）。
+"""
+import glob
+import importlib
+import os
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SHARDS_DIR = "shards"
+
+REGIONS = {}  # コード → Region
+
+
+class Region:
+    """府県のアダプタ。サブクラスでクラス属性と crime_csv_urls を定義し、@register を付ける"""
+
+    code = None          # シャードのディレクトリ名・ステージ名（"osaka"）
+    prefecture = None    # 都道府県名（HeartRails・SSDSE・行政区域データ・郵便番号データの表記）
+    pref_code = None     # 都道府県コード（"27"。対象の府県はこの順に並べる）
+    police = None        # 犯罪オープンデータの公開元（表示用）
+    police_url = None    # 犯罪オープンデータのCSVを置いているサイト（pipeline.py がホストごとに取得を直列にする）
+    suumo_routes = ()    # SUUMO の路線別家賃相場ページのパス
+    wards = {}           # 政令指定都市 → {"大阪市北区" などの区: 人口}（市全体の代わりに区別の人口を使う）
+
+    def crime_csv_urls(self):
+        """犯罪オープンデータのCSVのURLのリスト"""
+        raise NotImplementedError
+
+    def shard_dir(self):
+        """府県ごとの出力のディレクトリ（shards/<コード>。書き出す側が作る）"""
+        return os.path.join(SHARDS_DIR, self.code)
+
+    def shard(self, name):
+        """府県ごとの出力ファイルのパス（shards/<コード>/<name>）"""
+        return os.path.join(self.shard_dir(), name)
+
+    def __repr__(self):
+        return f"<Region {self.code} {self.prefecture}>"
+
+
+def register(cls):
+    """Region のサブクラスを登録するデコレータ"""
+    REGIONS[cls.code] = cls()
+    return cls
+
+
+def region_modules():
+    """region_*.py のモジュール名（コード順）"""
+    return sorted(os.path.basename(p)[:-3] for p in glob.glob(os.path.join(ROOT, "region_*.py")))
+
+
+def _load_plugins():
+    for name in region_modules():
+        importlib.import_module(name)
+
+
+def enabled():
+    """対象の府県の Region のリスト（都道府県コード順。環境変数 REGIONS で絞り込める）"""
+    _load_plugins()
+    codes = os.environ.get("REGIONS")
+    found = list(REGIONS.values()) if not codes else [get(code) for code in codes.split(",")]
+    return sorted(found, key=lambda r: r.pref_code)
+
+
+def get(code):
+    _load_plugins()
+    if code not in REGIONS:
+        raise KeyError(f"不明な府県のコード: {code}（{', '.join(REGIONS)}）")
+    return REGIONS[code]
+
+
+def prefectures():
+    """対象の都道府県名のタプル"""
+    return tuple(r.prefecture for r in enabled())
+
+
+def add_argument(parser):
+    """--region（複数指定可、省略時は対象のすべて）を argparse に加える"""
+    parser.add_argument("--region", action="append", metavar="CODE",
+                        help="対象の府県のコード（osaka など。省略時は対象のすべて）")
+
+
+def selected(parser, args):
+    """--region の指定から Region のリストを返す"""
+    if not args.region:
+        return enabled()
+    try:
+        return [get(code) for code in args.region]
+    except KeyError as e:
+        parser.error(e.args[0])
@@ -0,0 +1,153 @@
+"""駅 × 間取りの家賃相場の行列（掲載件数付き）
+
+fetch_rent.py が路線ページから取り出した家賃を rent_matrix.bin に保存し、
+merge_data.py などが間取りで絞り込んで使う（SUUMOを再取得しなくてよい）。
+
+同じ駅が複数の路線ページに出る場合は、掲載件数で重み付けした平均にする
+（件数が取れなかった値は重み1として扱う）。間取りを問わない全体の相場は ALL の列に入れる。
+
+ファイル形式: マジック "RENT" + ヘッダ長(uint32) + JSONヘッダ（駅名・間取りのラベル）
+              + 家賃（万円）の float32 配列（未掲載は NaN）+ 掲載件数の uint32 配列
+              （いずれもリトルエンディアン、駅 × 間取りのC順）
+"""
+import array
+import json
+import math
+import re
+import struct
+import sys
+
+MATRIX_PATH = "rent_matrix.bin"
+
+MAGIC = b"RENT"
+HEADER = struct.Struct("<4sI")
+
+ALL = "全体"
+
+
+class RentMatrix:
+    """駅名・間取りのラベルと、家賃・掲載件数の平坦な配列からなる行列"""
+
+    def __init__(self, stations, plans, rent, listings):
+        self.stations = stations
+        self.plans = plans
+        self.rent = rent          # array("f")、未掲載は NaN
+        self.listings = listings  # array("I")、件数不明は 0
+        self._station_index = {s: i for i, s in enumerate(stations)}
+        self._plan_index = {p: j for j, p in enumerate(plans)}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """(駅名, 間取り, 家賃, 掲載件数) の並びから行列を作る（重複は重み付き平均）
+
+        掲載件数が None または 0 の行は重み1で平均する。
+        """
+        sums = {}  # (駅名, 間取り) → [家賃×重み の合計, 重みの合計, 掲載件数の合計]
+        for station, plan, rent, listings in rows:
+            weight = listings or 1
+            acc = sums.setdefault((station, plan), [0.0, 0, 0])
+            acc[0] += rent * weight
+            acc[1] += weight
+            acc[2] += listings or 0
+
+        stations = sorted({k[0] for k in sums})
+        plans = [ALL] + sorted({k[1] for k in sums if k[1] != ALL}, key=plan_order)
+        matrix = cls(
+            stations, plans,
+            array.array("f", [math.nan]) * (len(stations) * len(plans)),
+            array.array("I", bytes(4 * len(stations) * len(plans))),
+        )
+        for (station, plan), (total, weight, listings) in sums.items():
+            k = matrix._offset(station, plan)
+            matrix.rent[k] = total / weight
+            matrix.listings[k] = listings
+        return matrix
+
+    def __len__(self):
+        return len(self.stations)
+
+    def _offset(self, station, plan):
+        return self._station_index[station] * len(self.plans) + self._plan_index[plan]
+
+    def column(self, plan=ALL):
+        """{駅名: 家賃（0.1万円単位に丸める）} を返す（未掲載の駅は除く）"""
+        return self.mean_over([plan])
+
+    def mean_over(self, plans):
+        """指定した間取りの家賃を掲載件数で重み付けした平均 {駅名: 家賃} を返す"""
+        cols = [self._plan_index[p] for p in plans if p in self._plan_index]
+        width = len(self.plans)
+        result = {}
+        for i, station in enumerate(self.stations):
+            total = weight = 0.0
+            for j in cols:
+                rent = self.rent[i * width + j]
+                if rent == rent:
+                    w = self.listings[i * width + j] or 1
+                    total += rent * w
+                    weight += w
+            if weight:
+                result[station] = round(total / weight, 1)
+        return result
+
+    def row(self, station):
+        """駅の {間取り: 家賃} を返す（全体の列と未掲載の間取りは除く）"""
+        i = self._station_index.get(station)
+        if i is None:
+            return {}
+        width = len(self.plans)
+        return {
+            p: round(self.rent[i * width + j], 1)
+            for j, p in enumerate(self.plans)
+            if p != ALL and self.rent[i * width + j] == self.rent[i * width + j]
+        }
+
+    def save(self, path=MATRIX_PATH):
+        header = json.dumps({"stations": self.stations, "plans": self.plans},
+                            ensure_ascii=False).encode("utf-8")
+        rent = array.array("f", self.rent)
+        listings = array.array("I", self.listings)
+        if sys.byteorder != "little":
+            rent.byteswap()
+            listings.byteswap()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(rent.tobytes())
+            f.write(listings.tobytes())
+
+    @classmethod
+    def load(cls, path=MATRIX_PATH):
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, header_len = HEADER.unpack_from(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{path} は家賃行列のファイルではありません")
+        pos = HEADER.size
+        header = json.loads(raw[pos:pos + header_len].decode("utf-8"))
+        size = len(header["stations"]) * len(header["plans"])
+        pos += header_len
+        rent = array.array("f")
+        rent.frombytes(raw[pos:pos + 4 * size])
+        listings = array.array("I")
+        listings.frombytes(raw[pos + 4 * size:pos + 8 * size])
+        if sys.byteorder != "little":
+            rent.byteswap()
+            listings.byteswap()
+        return cls(header["stations"], header["plans"], rent, listings)
+
+
+def plan_order(plan):
+    """間取りの並び順（ワンルーム → 1K → 1DK → 1LDK → 2K …）のキー"""
+    if plan.startswith("ワンルーム"):
+        return (0, 0, "")
+    m = re.match(r"\d+", plan)
+    return (1, int(m.group()) if m else 99, len(plan), plan)
+
+
+def load_matrix(path=MATRIX_PATH):
+    """家賃行列を読み込む。ファイルがなければ None を返す"""
+    try:
+        return RentMatrix.load(path)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,183 @@
+"""SSDSE（教育用標準データセット）市区町村データの読み込み
+
+1行目の項目コード（A1101 = 総人口 など）で列を指定して読み込む。CSVは1行ずつ読み、
+対象外の都道府県の行は数値に変換する前に捨てる。
+
+use_cache=True（既定）の場合は、初回に全列を解析して列ごとの float64 配列として
+.ssdse_cache/ に保存し、2回目以降は必要な列だけをそこから読む（CSVは再解析しない）。
+キャッシュは元ファイルのサイズと更新時刻が変わると作り直す。
+
+例:
+    table = ssdse.load(["A1101", "A7101"], prefectures=("大阪府", "兵庫県"))
+    table.by_city("A1101")  # {"豊中市": 401558, ...}
+"""
+import array
+import csv
+import json
+import math
+import os
+import struct
+import sys
+
+SSDSE_PATH = "SSDSE-A-2025.csv"
+CACHE_DIR = ".ssdse_cache"
+ENCODING = "cp932"
+
+# 先頭3列: 地域コード, 都道府県, 市区町村
+KEY_COLUMNS = 3
+
+MAGIC = b"SSDC"
+HEADER = struct.Struct("<4sI")
+
+
+class Table:
+    """SSDSE の表（行: 市区町村, 列: 項目コード）"""
+
+    def __init__(self, region_codes, prefectures, municipalities, columns, labels, years):
+        self.region_codes = region_codes
+        self.prefectures = prefectures
+        self.municipalities = municipalities
+        self.columns = columns  # 項目コード → array("d")（欠損は NaN）
+        self.labels = labels    # 項目コード → 項目名
+        self.years = years      # 項目コード → 年度
+
+    def __len__(self):
+        return len(self.municipalities)
+
+    def column(self, code):
+        return self.columns[code]
+
+    def by_city(self, code):
+        """{市区町村: 値} を返す（欠損は除く）。都道府県で絞り込んだ表で使う"""
+        return {
+            city: value
+            for city, value in zip(self.municipalities, self.columns[code])
+            if not math.isnan(value)
+        }
+
+    def subset(self, indices):
+        return Table(
+            [self.region_codes[i] for i in indices],
+            [self.prefectures[i] for i in indices],
+            [self.municipalities[i] for i in indices],
+            {c: array.array("d", (col[i] for i in indices)) for c, col in self.columns.items()},
+            self.labels,
+            self.years,
+        )
+
+
+def _number(text):
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return math.nan
+
+
+def parse(path=SSDSE_PATH, codes=None, prefectures=None):
+    """CSVを1行ずつ読み、指定した項目コードの列だけを持つ表を返す（codes=None なら全列）"""
+    with open(path, encoding=ENCODING, newline="") as f:
+        reader = csv.reader(f)
+        # 先頭3行: 項目コード, 年度, 項目名
+        code_row = next(reader)
+        year_row = next(reader)
+        label_row = next(reader)
+
+        all_codes = code_row[KEY_COLUMNS:]
+        wanted = all_codes if codes is None else list(codes)
+        missing = [c for c in wanted if c not in all_codes]
+        if missing:
+            raise KeyError(f"SSDSEに存在しない項目コード: {', '.join(missing)}")
+        positions = [code_row.index(c) for c in wanted]
+
+        region_codes, prefs, cities = [], [], []
+        columns = {c: array.array("d") for c in wanted}
+        for r in reader:
+            if len(r) < KEY_COLUMNS:
+                continue
+            if prefectures is not None and r[1] not in prefectures:
+                continue
+            region_codes.append(r[0])
+            prefs.append(r[1])
+            cities.append(r[2])
+            for c, pos in zip(wanted, positions):
+                columns[c].append(_number(r[pos]) if pos < len(r) else math.nan)
+
+    labels = {c: label_row[p] for c, p in zip(wanted, positions)}
+    years = {c: year_row[p] for c, p in zip(wanted, positions)}
+    return Table(region_codes, prefs, cities, columns, labels, years)
+
+
+def _cache_path(path):
+    st = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}.{st.st_size}.{int(st.st_mtime)}.bin")
+
+
+def _write_cache(table, cache_path, source_path):
+    codes = list(table.columns)
+    header = json.dumps({
+        "codes": codes,
+        "labels": table.labels,
+        "years": table.years,
+        "region_codes": table.region_codes,
+        "prefectures": table.prefectures,
+        "municipalities": table.municipalities,
+    }, ensure_ascii=False).encode("utf-8")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = cache_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(header)))
+        f.write(header)
+        for c in codes:
+            col = array.array("d", table.columns[c])
+            if sys.byteorder != "little":
+                col.byteswap()
+            f.write(col.tobytes())
+    os.replace(tmp, cache_path)
+    # 元ファイルが更新される前の古いキャッシュを消す
+    prefix = os.path.splitext(os.path.basename(source_path))[0] + "."
+    for name in os.listdir(CACHE_DIR):
+        old = os.path.join(CACHE_DIR, name)
+        if name.startswith(prefix) and name.endswith(".bin") and old != cache_path:
+            os.remove(old)
+
+
+def _read_cache(cache_path, codes):
+    """キャッシュから指定列だけを読む"""
+    with open(cache_path, "rb") as f:
+        magic, header_len = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{cache_path} はSSDSEのキャッシュではありません")
+        meta = json.loads(f.read(header_len).decode("utf-8"))
+        base = HEADER.size + header_len
+        n = len(meta["municipalities"])
+        wanted = meta["codes"] if codes is None else list(codes)
+        missing = [c for c in wanted if c not in meta["codes"]]
+        if missing:
+            raise KeyError(f"SSDSEに存在しない項目コード: {', '.join(missing)}")
+        columns = {}
+        for c in wanted:
+            f.seek(base + meta["codes"].index(c) * 8 * n)
+            col = array.array("d")
+            col.frombytes(f.read(8 * n))
+            if sys.byteorder != "little":
+                col.byteswap()
+            columns[c] = col
+    return Table(
+        meta["region_codes"], meta["prefectures"], meta["municipalities"], columns,
+        {c: meta["labels"][c] for c in wanted}, {c: meta["years"][c] for c in wanted},
+    )
+
+
+def load(codes=None, prefectures=None, path=SSDSE_PATH, use_cache=True):
+    """SSDSE の表を返す。codes: 項目コードのリスト（None なら全列）, prefectures: 対象の都道府県名"""
+    if not use_cache:
+        return parse(path, codes, prefectures)
+
+    cache_path = _cache_path(path)
+    if not os.path.exists(cache_path):
+        _write_cache(parse(path), cache_path, path)
+    table = _read_cache(cache_path, codes)
+    if prefectures is not None:
+        table = table.subset([i for i, p in enumerate(table.prefectures) if p in prefectures])
+    return table
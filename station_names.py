@@ -0,0 +1,151 @@
+"""駅名の正規化と、表記の揺れを吸収した駅名の照合
+
+HeartRails（駅座標）と SUUMO（家賃）では同じ駅でも表記が異なることがある。
+  例: 「JR俊徳道」と「ＪＲ俊徳道」、「三国ヶ丘」と「三国ケ丘」、「長田」と「長田（長田神社前）」
+
+照合は次の順に行い、最初に見つかった段階の結果を使う。
+  1. exact: 正規化した名前（全角→半角、「ケ/ヵ」→「ヶ」、末尾の「駅」を除く）が一致
+  2. base:  さらに括弧書きと事業者の接頭辞（JR）を除いた名前が一致
+
+SUUMO の駅名には座標がないため、exact で照合できた駅の座標を照合先の位置とみなす。
+base の候補が複数ある場合は 同じ府県の候補 → 近い候補 の順に選ぶ。
+どちらでも照合できない駅は家賃データなしとする。残りの駅で名前が似ている候補は
+「北天下茶屋」と「天下茶屋」、「石津」と「石津川」、「天王寺駅前」と「天王寺」のような別の駅なので、
+文字の類似度では照合しない。
+
+    python3 station_names.py   # stations_raw.json と rent_by_station.json の照合結果を表示
+"""
+import json
+import math
+import re
+import unicodedata
+
+# 同名駅の区別のために付く事業者名（除いても同じ駅を指すもの）
+OPERATOR_PREFIXES = ("JR",)
+
+_SMALL_KE = re.compile(r"(?<=[一-鿿])[ケヵ](?=[一-鿿])")
+_BRACKETS = re.compile(r"[(（\[［].*?[)）\]］]")
+
+
+def normalize(name):
+    """照合用の正規化した駅名を返す"""
+    name = unicodedata.normalize("NFKC", name)
+    name = re.sub(r"\s+", "", name)
+    # 「三国ケ丘」「三国ヵ丘」→「三国ヶ丘」（カタカナ語の「ケーブル」などは変えない）
+    name = _SMALL_KE.sub("ヶ", name)
+    if len(name) > 1 and name.endswith("駅"):
+        name = name[:-1]
+    return name
+
+
+def base_key(name):
+    """括弧書きと事業者の接頭辞を除いた駅名を返す（normalize 済みの名前を渡す）"""
+    name = _BRACKETS.sub("", name) or name
+    for prefix in OPERATOR_PREFIXES:
+        if name.startswith(prefix) and len(name) > len(prefix):
+            name = name[len(prefix):]
+    return name
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """2点間の距離（km、正距円筒近似。近い候補の比較にだけ使う）"""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371 * math.hypot(x, y)
+
+
+class NameIndex:
+    """照合先の駅名の索引（exact / base の辞書）"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.exact = {}     # 正規化名 → [名前番号]
+        self.base = {}      # base_key → [名前番号]
+        for i, name in enumerate(self.names):
+            key = normalize(name)
+            self.exact.setdefault(key, []).append(i)
+            bases = {base_key(key)}
+            # 「長田（長田神社前）」は括弧内の名前でも引けるようにする
+            bases.update(normalize(b) for b in re.findall(r"[(（](.*?)[)）]", key))
+            for b in bases:
+                self.base.setdefault(b, []).append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class Match:
+    __slots__ = ("name", "method")
+
+    def __init__(self, name, method):
+        self.name = name      # 照合先の駅名（見つからなければ None）
+        self.method = method  # "exact" / "base" / None
+
+
+NO_MATCH = Match(None, None)
+
+def match_all(stations, names):
+    """駅データのリスト（name, prefecture, lat, lng）を照合先の駅名 names とまとめて照合する
+
+    駅ごとの Match のリストを返す。
+    """
+    index = NameIndex(names)
+    keys = [normalize(s["name"]) for s in stations]
+
+    # 1. exact: 一致した駅の座標を照合先の位置として記録する
+    anchors = {}  # 名前番号 → [(府県, 緯度, 経度)]
+    results = [None] * len(stations)
+    for k, (s, key) in enumerate(zip(stations, keys)):
+        hits = index.exact.get(key)
+        if hits:
+            results[k] = Match(index.names[hits[0]], "exact")
+            for i in hits:
+                anchors.setdefault(i, []).append((s.get("prefecture"), s["lat"], s["lng"]))
+
+    def rank(s, i):
+        near = anchors.get(i)
+        if not near:
+            return (1, math.inf, index.names[i])
+        same_pref = any(p == s.get("prefecture") for p, _, _ in near)
+        dist = min(distance_km(s["lat"], s["lng"], lat, lng) for _, lat, lng in near)
+        return (0 if same_pref else 1, dist, index.names[i])
+
+    # 2. base
+    for k, (s, key) in enumerate(zip(stations, keys)):
+        if results[k] is not None:
+            continue
+        hits = index.base.get(base_key(key))
+        if hits:
+            best = min(hits, key=lambda i: rank(s, i))
+            results[k] = Match(index.names[best], "base")
+        else:
+            results[k] = NO_MATCH
+    return results
+
+
+def summary(matches):
+    """照合方法ごとの件数 {"exact": n, "base": n, None: n} を返す"""
+    counts = {"exact": 0, "base": 0, None: 0}
+    for m in matches:
+        counts[m.method] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    with open("stations_raw.json", encoding="utf-8") as f:
+        stations = json.load(f)
+    with open("rent_by_station.json", encoding="utf-8") as f:
+        rent = json.load(f)
+
+    matches = match_all(stations, rent)
+    counts = summary(matches)
+    print(f"{len(stations)}駅 / 家賃データ {len(rent)}駅")
+    print(f"  exact: {counts['exact']}  base: {counts['base']}  未照合: {counts[None]}")
+    print("\n表記揺れで照合した駅:")
+    for s, m in zip(stations, matches):
+        if m.method == "base":
+            print(f"  {s['name']}（{s['prefecture']}） → {m.name}")
+    print("\n未照合の駅:")
+    for s, m in zip(stations, matches):
+        if m.name is None:
+            print(f"  {s['name']}（{s['prefecture']}, {'・'.join(s['lines'])}）")
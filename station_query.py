@@ -0,0 +1,354 @@
+"""統合済みの駅データに対する最寄り駅・半径検索
+
+「職場から2km以内で治安が良好、家賃7万円以下の駅」のような問い合わせに答える。
+駅の緯度経度を格子状のセル（GRID_DEG 四方）に登録しておき、
+  - nearest: 問い合わせ点のセルから外側へ1周ずつ広げ、まだ見ていないセルの駅が
+             k 番目の候補より近くなり得なくなったところで打ち切る（k 近傍）
+  - within:  半径にかかるセルの駅だけを調べる
+条件（治安の分類・家賃の範囲・路線・主要駅までの所要時間）は距離を計算する前に駅ごとに判定する。
+
+駅データは stations.bin.gz（なければ stations.json と city_stats.json）から読み、
+commute_matrix.bin（commute.py が出力）があれば主要駅までの所要時間を付ける。
+stations.json から読む場合は crime_density.json があれば駅周辺の犯罪密度も付ける。
+
+使い方:
+    python3 station_query.py 梅田 --radius 2 --safety 良好 --rent-max 7
+    python3 station_query.py 34.7024,135.4959 -k 5 --line 阪急神戸本線
+    python3 station_query.py 西宮北口 --radius 5 --commute 梅田=30 --commute 三宮=30
+    python3 station_query.py --serve 8081   # ローカルの HTTP サーバー（下記）
+
+HTTP:
+    GET  /nearest?lat=34.70&lng=135.50&k=5&safety=良好,普通&rent_max=7
+    GET  /within?lat=34.70&lng=135.50&radius_km=2&line=大阪御堂筋線&commute=梅田:20
+    POST /batch  [{"lat": 34.70, "lng": 135.50, "radius_km": 2, "safety": ["良好"], "commute": {"梅田": 20}}, ...]
+                 （radius_km があれば半径検索、なければ k 近傍。結果は問い合わせと同じ順のリスト）
+"""
+import argparse
+import http.server
+import json
+import math
+import time
+import urllib.parse
+
+from city_stats import attach, load_city_stats
+from commute import load_commute
+from crime_density import attach_density, load_density
+from export_columnar import load_columnar
+from station_names import distance_km, normalize
+
+GRID_DEG = 0.02        # 格子セルの大きさ（度）。緯度方向に約2km
+KM_PER_DEG = 6371 * math.pi / 180
+DEFAULT_K = 5
+MAX_K = 100
+
+# 検索結果に含める駅の属性
+RESULT_FIELDS = ("name", "prefecture", "lat", "lng", "lines", "city", "rent_avg",
+                 "crime_rate", "crime_yoy", "crime_density", "safety", "safety_class", "commute")
+
+
+def load_stations():
+    """治安の値（と主要駅までの所要時間）を付けた駅データを読み込む
+
+    stations.bin.gz を優先し、なければ stations.json を読む。
+    """
+    try:
+        stations = load_columnar()
+    except FileNotFoundError:
+        with open("stations.json", encoding="utf-8") as f:
+            stations = attach(json.load(f), load_city_stats())
+        attach_density(stations, load_density())
+    commute = load_commute()
+    if commute is not None and not commute.attach(stations):
+        print("commute_matrix.bin の駅が駅データと一致しないため使いません（commute.py を実行してください）")
+    return stations
+
+
+def make_filter(safety=None, rent_min=None, rent_max=None, line=None, commute=None):
+    """駅の条件の判定関数を返す（条件がなければ None）
+
+    safety: 治安のラベル（"良好"）または CSS クラス（"good"）のリスト
+    rent_min, rent_max: 家賃（万円）の範囲。指定すると家賃データのない駅は除く
+    line: 路線名のリスト（いずれかを通る駅）
+    commute: {主要駅: 分} 各主要駅まで指定の時間以内の駅（所要時間のない駅は除く）
+    """
+    checks = []
+    if safety:
+        wanted = set(safety)
+        checks.append(lambda s: s.get("safety") in wanted or s.get("safety_class") in wanted)
+    if rent_min is not None or rent_max is not None:
+        low = -math.inf if rent_min is None else rent_min
+        high = math.inf if rent_max is None else rent_max
+        checks.append(lambda s: s.get("rent_avg") is not None and low <= s["rent_avg"] <= high)
+    if line:
+        lines = set(line)
+        checks.append(lambda s: not lines.isdisjoint(s["lines"]))
+    if commute:
+        limits = list(commute.items())
+        checks.append(lambda s: all(s.get("commute", {}).get(hub, math.inf) <= m for hub, m in limits))
+    if not checks:
+        return None
+    return lambda s: all(check(s) for check in checks)
+
+
+def _str_list(q, key):
+    """問い合わせの key が文字列のリストであることを確かめて返す（なければ None）"""
+    value = q.get(key)
+    if value is not None and (not isinstance(value, list) or not all(isinstance(v, str) for v in value)):
+        raise ValueError(f"{key} は文字列の配列で指定してください: {value!r}")
+    return value
+
+
+def _commute_limits(q):
+    """問い合わせの commute（{主要駅: 分}）を確かめて返す（なければ None）"""
+    value = q.get("commute")
+    if value is None:
+        return None
+    if not isinstance(value, dict) or not all(
+            isinstance(m, (int, float)) and not isinstance(m, bool) for m in value.values()):
+        raise ValueError(f"commute は {{主要駅: 分}} のオブジェクトで指定してください: {value!r}")
+    return {hub: float(m) for hub, m in value.items()}
+
+
+class StationIndex:
+    """駅の格子インデックス"""
+
+    def __init__(self, stations):
+        self.stations = stations
+        self.grid = {}  # (セルx, セルy) → [駅番号]
+        for i, s in enumerate(stations):
+            self.grid.setdefault(self._cell(s["lat"], s["lng"]), []).append(i)
+        self._by_name = {}
+        for i, s in enumerate(stations):
+            self._by_name.setdefault(normalize(s["name"]), []).append(i)
+        # セル1つ分の距離の下限（東西方向は最も高緯度の駅で縮む分を見込む）
+        max_lat = max((abs(s["lat"]) for s in stations), default=0)
+        self._cell_km = GRID_DEG * KM_PER_DEG * math.cos(math.radians(max_lat))
+        cells = self.grid.keys()
+        self._extent = (
+            (min((c[0] for c in cells), default=0), max((c[0] for c in cells), default=0)),
+            (min((c[1] for c in cells), default=0), max((c[1] for c in cells), default=0)),
+        )
+
+    def __len__(self):
+        return len(self.stations)
+
+    @staticmethod
+    def _cell(lat, lng):
+        return math.floor(lng / GRID_DEG), math.floor(lat / GRID_DEG)
+
+    def _ring(self, cx, cy, r):
+        """セル (cx, cy) からチェビシェフ距離 r のセルの駅番号を返す"""
+        if r == 0:
+            yield from self.grid.get((cx, cy), ())
+            return
+        for x in range(cx - r, cx + r + 1):
+            for y in (cy - r, cy + r):
+                yield from self.grid.get((x, y), ())
+        for y in range(cy - r + 1, cy + r):
+            for x in (cx - r, cx + r):
+                yield from self.grid.get((x, y), ())
+
+    def _max_ring(self, cx, cy):
+        (x0, x1), (y0, y1) = self._extent
+        return max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+
+    def locate(self, name):
+        """駅名（表記揺れは normalize で吸収）から最初に見つかった駅の (緯度, 経度) を返す"""
+        hits = self._by_name.get(normalize(name))
+        if not hits:
+            return None
+        s = self.stations[hits[0]]
+        return s["lat"], s["lng"]
+
+    def nearest(self, lat, lng, k=DEFAULT_K, **filters):
+        """条件に合う駅を近い順に k 件（1〜MAX_K）、[(距離km, 駅)] で返す"""
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k は 1〜{MAX_K} で指定してください: {k}")
+        match = make_filter(**filters)
+        cx, cy = self._cell(lat, lng)
+        found = []
+        last = self._max_ring(cx, cy)
+        for r in range(last + 1):
+            for i in self._ring(cx, cy, r):
+                s = self.stations[i]
+                if match is None or match(s):
+                    found.append((distance_km(lat, lng, s["lat"], s["lng"]), i))
+            # 外側のセルの駅は r × セル幅 より近くならない
+            if len(found) >= k:
+                found.sort()
+                del found[k:]
+                if found[-1][0] <= r * self._cell_km:
+                    break
+        found.sort()
+        return [(d, self.stations[i]) for d, i in found[:k]]
+
+    def within(self, lat, lng, radius_km, **filters):
+        """半径 radius_km 以内で条件に合う駅を近い順に [(距離km, 駅)] で返す"""
+        match = make_filter(**filters)
+        cx, cy = self._cell(lat, lng)
+        reach = min(math.ceil(radius_km / self._cell_km), self._max_ring(cx, cy))
+        found = []
+        for r in range(reach + 1):
+            for i in self._ring(cx, cy, r):
+                s = self.stations[i]
+                if match is not None and not match(s):
+                    continue
+                d = distance_km(lat, lng, s["lat"], s["lng"])
+                if d <= radius_km:
+                    found.append((d, i))
+        found.sort()
+        return [(d, self.stations[i]) for d, i in found]
+
+    def query(self, q):
+        """辞書形式の問い合わせ（HTTP の /batch と同じ形）を実行し、結果の辞書のリストを返す"""
+        filters = {
+            "safety": _str_list(q, "safety"),
+            "rent_min": None if q.get("rent_min") is None else float(q["rent_min"]),
+            "rent_max": None if q.get("rent_max") is None else float(q["rent_max"]),
+            "line": _str_list(q, "line"),
+            "commute": _commute_limits(q),
+        }
+        lat, lng = float(q["lat"]), float(q["lng"])
+        if q.get("radius_km") is not None:
+            hits = self.within(lat, lng, float(q["radius_km"]), **filters)
+        else:
+            hits = self.nearest(lat, lng, int(q.get("k", DEFAULT_K)), **filters)
+        return [dict({k: s.get(k) for k in RESULT_FIELDS}, distance_km=round(d, 3)) for d, s in hits]
+
+
+# --- ローカルの HTTP サーバー ---
+def _split(value):
+    return [v for v in value.split(",") if v] if value else None
+
+
+def _number(value):
+    return float(value) if value not in (None, "") else None
+
+
+def _limits(values, sep):
+    """["梅田:30", ...] → {"梅田": 30.0}"""
+    limits = {}
+    for v in values or ():
+        hub, _, minutes = v.rpartition(sep)
+        if not hub:
+            raise ValueError(f"主要駅{sep}分 の形式で指定してください: {v}")
+        limits[hub] = float(minutes)
+    return limits or None
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    """/nearest・/within・/batch の問い合わせに JSON で答える（self.server.index を使う）"""
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if url.path not in ("/nearest", "/within"):
+            self.send_error(404)
+            return
+        try:
+            q = {
+                "lat": params["lat"],
+                "lng": params["lng"],
+                "k": params.get("k", DEFAULT_K),
+                "radius_km": params.get("radius_km") if url.path == "/within" else None,
+                "safety": _split(params.get("safety")),
+                "rent_min": _number(params.get("rent_min")),
+                "rent_max": _number(params.get("rent_max")),
+                "line": _split(params.get("line")),
+                "commute": _limits(_split(params.get("commute")), ":"),
+            }
+            if url.path == "/within" and q["radius_km"] is None:
+                raise KeyError("radius_km")
+            self._send(self.server.index.query(q))
+        except (KeyError, ValueError) as e:
+            self._send({"error": f"不正な問い合わせ: {e}"}, 400)
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/batch":
+            self.send_error(404)
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            queries = json.loads(body)
+            if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+                raise ValueError("問い合わせ（オブジェクト）の配列を送ってください")
+            self._send([self.server.index.query(q) for q in queries])
+        except (KeyError, ValueError, TypeError) as e:
+            self._send({"error": f"不正な問い合わせ: {e}"}, 400)
+
+    def _send(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(index, port, host="127.0.0.1"):
+    server = http.server.ThreadingHTTPServer((host, port), QueryHandler)
+    server.index = index
+    print(f"http://{host}:{port}/ で待ち受けます（{len(index)}駅、Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="最寄り駅・半径検索")
+    parser.add_argument("origin", nargs="?", help="起点（「緯度,経度」または駅名）")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="k 近傍の件数")
+    parser.add_argument("--radius", type=float, help="半径（km）。指定すると半径検索")
+    parser.add_argument("--safety", action="append", help="治安（良好・普通・注意 など。複数指定可）")
+    parser.add_argument("--rent-min", type=float, help="家賃の下限（万円）")
+    parser.add_argument("--rent-max", type=float, help="家賃の上限（万円）")
+    parser.add_argument("--line", action="append", help="路線名（複数指定可）")
+    parser.add_argument("--commute", action="append", metavar="主要駅=分",
+                        help="主要駅までの所要時間の上限（例: 梅田=30。複数指定可）")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="HTTP サーバーとして起動する")
+    args = parser.parse_args()
+
+    index = StationIndex(load_stations())
+    if args.serve:
+        serve(index, args.serve)
+        return
+    if not args.origin:
+        parser.error("起点（緯度,経度 または駅名）を指定してください")
+
+    try:
+        lat, lng = (float(v) for v in args.origin.split(","))
+    except ValueError:
+        found = index.locate(args.origin)
+        if found is None:
+            parser.error(f"駅が見つかりません: {args.origin}")
+        lat, lng = found
+
+    try:
+        commute = _limits(args.commute, "=")
+    except ValueError as e:
+        parser.error(str(e))
+    q = {"lat": lat, "lng": lng, "k": args.k, "radius_km": args.radius, "safety": args.safety,
+         "rent_min": args.rent_min, "rent_max": args.rent_max, "line": args.line, "commute": commute}
+    start = time.perf_counter()
+    try:
+        results = index.query(q)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        rent = f"{r['rent_avg']}万円" if r["rent_avg"] else "-"
+        commute = " ".join(f"{hub}{m}分" for hub, m in (r["commute"] or {}).items())
+        print(f"{r['distance_km']:6.2f}km  {r['name']}（{r['city'] or '-'}）  {r['safety']}  {rent}"
+              f"  {'・'.join(r['lines'])}  {commute}".rstrip())
+    print(f"{len(results)}駅（{elapsed * 1e6:.0f}µs）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""取得〜統合の各スクリプトの計測イベントを JSON Lines で記録し、実行ごとの集計を表示する
+
+各スクリプトは event() などで1行1イベントの JSON を TELEMETRY_PATH に追記する。
+イベントには実行ID（run）・ステージ名（stage）・時刻（ts）・種類（event）が付く。
+
+    request  HTTPリクエスト1回（host, status, ms: 応答ヘッダまでの時間, retries, error）
+    cache    http_cache の取得1回（source, result: hit/revalidated/fetched, bytes, ms）
+    rows     ファイル・ページ1つから読み取った行数（name, rows）
+    join     照合・判定の結果（name, hit, total）。前回の実行より率が下がったら集計で「!」を付ける
+    error    握りつぶさずに記録した失敗（op, type, message）
+    stage    pipeline.py が実行したステージ（name, ms, code）
+
+pipeline.py は1回の実行で同じ実行IDを各ステージに渡し、最後にその実行の集計を表示する。
+スクリプトを個別に実行した場合はプロセスごとに実行IDが付く。
+
+環境変数:
+    TELEMETRY_PATH=...   イベントの書き出し先（既定: .telemetry.jsonl、空にすると記録しない）
+    TELEMETRY_RUN=...    実行ID（既定: 開始時刻とプロセスID）
+    TELEMETRY_STAGE=...  ステージ名（既定: スクリプト名）
+
+    python3 telemetry.py              # 最新の実行の集計
+    python3 telemetry.py --run ID     # 指定した実行の集計
+    python3 telemetry.py --list       # 記録されている実行の一覧
+"""
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+PATH = os.environ.get("TELEMETRY_PATH", ".telemetry.jsonl")
+RUN = os.environ.get("TELEMETRY_RUN") or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+STAGE = os.environ.get("TELEMETRY_STAGE") or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+
+# 照合率がこれより下がったら集計で「!」を付ける
+JOIN_DROP = 0.01
+# エラーの種類ごとに表示する例の数
+ERROR_EXAMPLES = 3
+
+_lock = threading.Lock()
+_file = None
+
+
+def _close():
+    if _file is not None:
+        _file.close()
+
+
+def event(kind, **fields):
+    """イベントを1行追記する（行単位で書き出すので、並行するステージのイベントも行が混ざらない）"""
+    global _file
+    if not PATH:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "run": RUN, "stage": STAGE, "event": kind, **fields},
+                      ensure_ascii=False) + "\n"
+    with _lock:
+        if _file is None:
+            _file = open(PATH, "a", encoding="utf-8", buffering=1)
+            atexit.register(_close)
+        _file.write(line)
+
+
+def join(name, hit, total, **fields):
+    """照合・判定の件数（total 件中 hit 件）を記録する"""
+    event("join", name=name, hit=hit, total=total, **fields)
+
+
+def error(op, exc, **fields):
+    """処理を続けるために捕まえた例外を記録する"""
+    event("error", op=op, type=type(exc).__name__, message=str(exc), **fields)
+
+
+# --- 集計 ---
+def load(path=PATH):
+    """記録されているイベントのリスト（ファイルがなければ空）"""
+    events = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # 書き込み途中で止まった行
+    except FileNotFoundError:
+        pass
+    return events
+
+
+def runs(events):
+    """実行IDのリスト（最初のイベントの順）"""
+    return list(dict.fromkeys(e["run"] for e in events))
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0
+
+
+def _rate(hit, total):
+    return hit / total if total else 0.0
+
+
+def _joins(events):
+    """{(ステージ, 名前): (hit, total)}（同じ名前は最後のもの）"""
+    return {(e["stage"], e["name"]): (e["hit"], e["total"]) for e in events if e["event"] == "join"}
+
+
+def report(events, run):
+    """run の集計を表す行のリスト（照合率は run より前の実行の最後の値と比べる）"""
+    order = runs(events)
+    mine = [e for e in events if e["run"] == run]
+    previous = {}
+    for r in order[:order.index(run)]:
+        previous.update(_joins([e for e in events if e["run"] == r]))
+    by_kind = {}
+    for e in mine:
+        by_kind.setdefault(e["event"], []).append(e)
+
+    out = [f"実行 {run}（{len(mine)}件のイベント）"]
+
+    stages = by_kind.get("stage", [])
+    if stages:
+        out.append("\nステージ:")
+        for e in sorted(stages, key=lambda e: -e["ms"]):
+            status = "" if e["code"] == 0 else f"  失敗（終了コード {e['code']}）"
+            out.append(f"  {e['name']:<22} {e['ms'] / 1000:8.1f}秒{status}")
+
+    requests = by_kind.get("request", [])
+    if requests:
+        out.append("\nHTTPリクエスト（ホスト別）:")
+        out.append(f"  {'ホスト':<30} {'件数':>6} {'失敗':>5} {'再試行':>6} {'p50':>8} {'p95':>8} {'合計':>8}")
+        hosts = {}
+        for e in requests:
+            hosts.setdefault(e["host"], []).append(e)
+        for host, es in sorted(hosts.items(), key=lambda x: -sum(e["ms"] for e in x[1])):
+            ms = [e["ms"] for e in es]
+            out.append(f"  {host:<30} {len(es):>6} {sum(1 for e in es if e.get('error')):>5}"
+                       f" {sum(e['retries'] for e in es):>6} {_percentile(ms, 0.5):>6.0f}ms"
+                       f" {_percentile(ms, 0.95):>6.0f}ms {sum(ms) / 1000:>7.1f}秒")
+
+    cache = by_kind.get("cache", [])
+    if cache:
+        out.append("\nHTTPキャッシュ（取得元別）:")
+        sources = {}
+        for e in cache:
+            sources.setdefault(e["source"], []).append(e)
+        for source, es in sorted(sources.items()):
+            counts = {r: sum(1 for e in es if e["result"] == r) for r in ("hit", "revalidated", "fetched")}
+            fetched = sum(e["bytes"] for e in es if e["result"] != "hit")
+            out.append(f"  {source:<12} {len(es):>6}件  キャッシュ {counts['hit']}, 再検証 {counts['revalidated']},"
+                       f" 取得 {counts['fetched']}  受信 {fetched / 1024 / 1024:.1f}MiB"
+                       f" / 全体 {sum(e['bytes'] for e in es) / 1024 / 1024:.1f}MiB")
+
+    rows = by_kind.get("rows", [])
+    if rows:
+        out.append("\n読み取った行数（ステージ別）:")
+        stages_rows = {}
+        for e in rows:
+            n, files = stages_rows.get(e["stage"], (0, 0))
+            stages_rows[e["stage"]] = (n + e["rows"], files + 1)
+        for stage, (n, files) in sorted(stages_rows.items()):
+            out.append(f"  {stage:<22} {n:>9}行（{files}ファイル・ページ）")
+
+    joins = _joins(mine)
+    if joins:
+        out.append("\n照合率:")
+        for (stage, name), (hit, total) in sorted(joins.items()):
+            line = f"  {stage + '/' + name:<30} {hit:>6}/{total:<6} {_rate(hit, total):6.1%}"
+            prev = previous.get((stage, name))
+            if prev is not None:
+                drop = _rate(*prev) - _rate(hit, total)
+                line += f"  （前回 {_rate(*prev):.1%}）" + (" !" if drop > JOIN_DROP else "")
+            out.append(line)
+
+    errors = by_kind.get("error", [])
+    if errors:
+        out.append(f"\nエラー（{len(errors)}件）:")
+        groups = {}
+        for e in errors:
+            groups.setdefault((e["stage"], e["op"], e["type"]), []).append(e)
+        for (stage, op, kind), es in sorted(groups.items(), key=lambda x: -len(x[1])):
+            out.append(f"  [{stage}] {op}: {kind} {len(es)}件")
+            for e in es[:ERROR_EXAMPLES]:
+                out.append(f"    {e['message']}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="計測イベント（JSON Lines）の集計を表示する")
+    parser.add_argument("--path", default=PATH or ".telemetry.jsonl", help="イベントのファイル")
+    parser.add_argument("--run", help="集計する実行ID（省略時は最新）")
+    parser.add_argument("--list", action="store_true", help="記録されている実行の一覧を表示する")
+    args = parser.parse_args()
+
+    events = load(args.path)
+    order = runs(events)
+    if not order:
+        print(f"{args.path} にイベントがありません")
+        return
+    if args.list:
+        for r in order:
+            stages = sorted({e["stage"] for e in events if e["run"] == r})
+            print(f"{r}  {', '.join(stages)}")
+        return
+    run = args.run or order[-1]
+    if run not in order:
+        parser.error(f"不明な実行ID: {run}")
+    print("\n".join(report(events, run)))
+
+
+if __name__ == "__main__":
+    main()